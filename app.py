@@ -3,8 +3,15 @@ app.py (Versión 7.0 - Vistas con Lógica de Negocio)
 --------------------------------------------------------------------------------
 Controlador principal de la aplicación Flask.
 Coordina la interacción entre el Frontend (Tabulator) y los Módulos de Lógica.
+
+Punto de entrada: `create_app()` (fábrica de aplicación). pandas/numpy se
+importan en el primer uso, así las rutas ligeras responden sin cargarlos.
+    Desarrollo: python app.py
+    Producción: gunicorn "app:create_app()"
 """
 
+from __future__ import annotations
+
 # ==============================================================================
 # 1. IMPORTACIONES & CONFIGURACIÓN
 # ==============================================================================
@@ -12,44 +19,128 @@ import os
 import io
 import uuid
 import json
+import threading
+from collections import defaultdict
 from datetime import datetime
 
-import pandas as pd
-import numpy as np
-from flask import Flask, request, jsonify, render_template, send_file, session
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, render_template, send_file, session
 from flask_cors import CORS
 from flask_session import Session
 
 # --- Módulos Propios ---
-from modules.loader import cargar_datos
+from modules.lazy_import import lazy_import
+from modules.loader import cargar_datos, leer_excel
 from modules.filters import aplicar_filtros_dinamicos
+from modules.search_index import SEARCH_LIMIT
+from modules.sort_index import sort_spec
 from modules.translator import get_text, LANGUAGES
 from modules.json_manager import guardar_json, cargar_json, USER_LISTS_FILE
 from modules.autocomplete import get_autocomplete_options
+from modules.dataset_store import store
+from modules.events import bus, PROGRESS_CHANNEL
+from modules.storage import create_storage
+from modules.janitor import Janitor
+from modules.memory_budget import MemoryBudget
+from modules.assets import IMMUTABLE_MAX_AGE, StaticManifest, TranslationBundles
+from modules.column_types import allow_values, compact_frame, concat_rows, is_categorical
+from modules.bulk_edit import EXACT, assign, match_mask, patch_cells, replaced_values, revert_patch, select_rows, undo_patch
+from modules.refresh import SOURCE_HASH, merge_extract
+from modules.data_quality import COMPLETO, INCOMPLETO, row_status
+from modules.saved_views import load_views, get_view, save_view, delete_view, materialized, group_totals
+from modules.column_profile import parse_amounts
 # ATENCIÓN: Se añadió replace_all_rules a las importaciones
 from modules.priority_manager import (
     save_rule, load_rules, delete_rule, apply_priority_rules,
-    load_settings, save_settings, toggle_rule, replace_all_rules
+    load_settings, save_settings, toggle_rule, replace_all_rules, preview_rules,
+    normalize_rule, validate_rule, merge_rule, rules_hash, cached_priorities, remember_priorities,
+    rule_conditions
 )
 
+# pandas/numpy diferidos: se importan en la primera ruta que los use
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
 # --- Constantes ---
 UNDO_STACK_LIMIT = 15
+# Filas por página de /api/sorted_page (por defecto y máximo)
+PAGE_SIZE, MAX_PAGE_SIZE = 100, 1000
 UPLOAD_FOLDER = 'temp_uploads'
+# Columnas que recalcula el servidor tras cada cambio (viajan en los deltas)
+DERIVED_COLUMNS = ('_priority', '_priority_reason', '_row_status')
+# Rutas de edición bloqueadas mientras el dataset es solo una vista previa
+PREVIEW_BLOCKED_ENDPOINTS = {
+    'main.update_cell', 'main.update_cells_batch', 'main.add_row', 'main.delete_row', 'main.bulk_update',
+    'main.find_replace', 'main.bulk_delete', 'main.cleanup_duplicates', 'main.undo_change',
+}
 
-# --- Configuración Flask ---
-app = Flask(__name__, template_folder='templates', static_folder='static')
-CORS(app)
+# Todas las rutas viven en este blueprint; `create_app` lo registra.
+bp = Blueprint('main', __name__)
 
-app.config['SECRET_KEY'] = 'mi-llave-secreta-para-el-buscador-12345'
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-app.config["SESSION_FILE_DIR"] = os.path.join(UPLOAD_FOLDER, 'flask_session')
 
-# Asegurar directorios
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(app.config["SESSION_FILE_DIR"], exist_ok=True)
+def create_app(config: dict | None = None) -> Flask:
+    """
+    Fábrica de la aplicación Flask.
 
-Session(app)
+    Args:
+        config (dict, optional): Valores que sobrescriben la configuración por
+            defecto (p. ej. en pruebas: {'STAGING_BACKEND': 'memory', 'STAGING_RESTORE': 0}).
+
+    Returns:
+        Flask: Aplicación configurada.
+    """
+    app = Flask(__name__, template_folder='templates', static_folder='static')
+    CORS(app)
+
+    app.config['SECRET_KEY'] = 'mi-llave-secreta-para-el-buscador-12345'
+    app.config["SESSION_PERMANENT"] = False
+    app.config["SESSION_TYPE"] = "filesystem"
+    app.config["SESSION_FILE_DIR"] = os.path.join(UPLOAD_FOLDER, 'flask_session')
+    # Backend del borrador: 'sqlite' (persistente, compartido entre workers),
+    # 'snapshot' (snapshot + WAL) o 'memory'
+    app.config["STAGING_BACKEND"] = os.environ.get('STAGING_BACKEND', 'sqlite')
+    # Datasets recientes a restaurar en memoria al arrancar (0 = ninguno)
+    app.config["STAGING_RESTORE"] = int(os.environ.get('STAGING_RESTORE', 5))
+    # Limpieza de temporales: edad máxima, presupuesto de disco y frecuencia (0 = desactivada)
+    app.config["JANITOR_MAX_AGE_HOURS"] = float(os.environ.get('JANITOR_MAX_AGE_HOURS', 72))
+    app.config["JANITOR_MAX_MB"] = float(os.environ.get('JANITOR_MAX_MB', 2048))
+    app.config["JANITOR_INTERVAL_MIN"] = float(os.environ.get('JANITOR_INTERVAL_MIN', 15))
+    # Vista previa de archivos grandes: filas a servir mientras se lee el resto (0 = desactivada)
+    app.config["PREVIEW_ROWS"] = int(os.environ.get('PREVIEW_ROWS', 1000))
+    app.config["PREVIEW_MIN_MB"] = float(os.environ.get('PREVIEW_MIN_MB', 2))
+    # Presupuesto de memoria de los datasets cargados (0 = sin límite) y segundos entre comprobaciones
+    app.config["MEMORY_BUDGET_MB"] = float(os.environ.get('MEMORY_BUDGET_MB', 1024))
+    app.config["MEMORY_CHECK_SEC"] = float(os.environ.get('MEMORY_CHECK_SEC', 30))
+    app.config.update(config or {})
+
+    # Asegurar directorios
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(app.config["SESSION_FILE_DIR"], exist_ok=True)
+
+    Session(app)
+    app.register_blueprint(bp)
+
+    # Recursos cacheables: traducciones serializadas una vez y estáticos versionados por hash
+    app.extensions['translations'] = TranslationBundles(LANGUAGES)
+    app.extensions['static_manifest'] = StaticManifest(app.static_folder)
+
+    store.set_storage(create_storage(app.config["STAGING_BACKEND"], UPLOAD_FOLDER))
+
+    # Restaurar en segundo plano (no retrasa el arranque ni las rutas ligeras)
+    if app.config["STAGING_RESTORE"]:
+        threading.Thread(target=store.restore, args=(app.config["STAGING_RESTORE"],), daemon=True).start()
+
+    janitor = Janitor(UPLOAD_FOLDER, app.config["SESSION_FILE_DIR"],
+                      max_age_hours=app.config["JANITOR_MAX_AGE_HOURS"], max_mb=app.config["JANITOR_MAX_MB"])
+    app.extensions['janitor'] = janitor
+    if app.config["JANITOR_INTERVAL_MIN"]:
+        janitor.start(app.config["JANITOR_INTERVAL_MIN"])
+
+    budget = MemoryBudget(max_mb=app.config["MEMORY_BUDGET_MB"])
+    app.extensions['memory_budget'] = budget
+    if app.config["MEMORY_BUDGET_MB"]:
+        budget.start(app.config["MEMORY_CHECK_SEC"])
+
+    return app
 
 
 # ==============================================================================
@@ -66,226 +157,879 @@ def _check_file_id(request_file_id: str) -> None:
         session.clear() # Seguridad: Invalidar si hay mismatch
         raise Exception("El ID del archivo no coincide. Recargue la página.")
 
-def _get_df_from_session_as_df(key: str = 'df_staging') -> pd.DataFrame:
-    """Recupera los datos de sesión y devuelve un DataFrame."""
-    data = session.get(key)
-    if not data:
+def _client_id() -> str:
+    """Identificador estable del cliente (navegador) dentro de la sesión."""
+    if 'client_id' not in session:
+        session['client_id'] = uuid.uuid4().hex
+    return session['client_id']
+
+def _get_dataset():
+    """Devuelve el dataset compartido al que está conectada la sesión."""
+    dataset = store.get(session.get('file_id'))
+    if dataset is None:
         session.clear()
         raise Exception("Datos de sesión no encontrados.")
-    return pd.DataFrame.from_records(data)
-
-def _find_monto_column(df: pd.DataFrame) -> str | None:
-    """Heurística para encontrar la columna de dinero."""
-    possible_names = ['monto', 'total', 'amount', 'total amount']
-    for col in df.columns:
-        if str(col).lower() in possible_names:
-            return col
-    return None
+    return dataset
 
-def _find_invoice_column(df: pd.DataFrame) -> str | None:
-    """Heurística para encontrar el número de factura."""
-    possible_names = ['invoice #', 'invoice number', 'n° factura', 'factura', 'invoice id']
-    for col in df.columns:
-        if str(col).lower().strip() in possible_names:
-            return col
-    return None
+def _get_df_from_session_as_df() -> pd.DataFrame:
+    """
+    Devuelve el DataFrame del dataset de la sesión.
+    Es el objeto compartido (no una copia): modificarlo solo bajo `dataset.lock`.
+    """
+    return _get_dataset().df
+
+def _cache_key(dataset) -> tuple:
+    """
+    Clave de caché de los datos actuales del dataset: (file_id, data_version).
+
+    Los commits derivados (recálculo de prioridades al guardar o activar reglas)
+    no cambian las columnas del usuario: mantienen la clave y la caché de
+    columnas normalizadas sigue valiendo.
+    """
+    return (dataset.file_id, dataset.data_version)
+
+def _base_version(data: dict) -> int | None:
+    """Versión sobre la que el cliente hizo la edición (None si no la envía)."""
+    version = data.get('base_version')
+    return int(version) if version is not None else None
+
+def _row_positions(df: pd.DataFrame, row_ids) -> np.ndarray:
+    """Posición física de cada row_id en el DataFrame (-1 si no existe)."""
+    return pd.Index(df['_row_id'].astype(str)).get_indexer([str(r) for r in row_ids])
+
+def _as_row_id(row_id):
+    """Convierte un row_id en texto a entero cuando es posible (índice de Tabulator)."""
+    row_id = str(row_id)
+    return int(row_id) if row_id.lstrip('-').isdigit() else row_id
 
-def _check_row_completeness(fila: dict) -> str:
-    """Valida si una fila tiene celdas vacías críticas."""
-    for key, value in fila.items():
-        if key.startswith('_'): continue # Ignorar columnas internas
-        val_str = str(value).strip()
-        if val_str == "" or val_str == "0":
-            return "Incompleto"
-    return "Completo"
+def _push_history(dataset, entry: dict) -> list:
+    """
+    Añade una acción a la pila de deshacer de la sesión (con límite).
+
+    Se llama justo antes del commit de la acción: `base_version` es la versión
+    sobre la que se aplicó, a la que `undo_change` puede volver directamente.
+    """
+    entry['base_version'] = dataset.version
+    history = session.get('history', [])
+    history.append(entry)
+    if len(history) > UNDO_STACK_LIMIT: history.pop(0)
+    session['history'] = history
+    return history
+
+def _conflict_response(dataset, conflicts: set):
+    """Respuesta 409 para ediciones sobre celdas que otro usuario cambió."""
+    df = dataset.df
+    positions = _row_positions(df, [rid for rid, _ in conflicts])
+    detalle = []
+    for (rid, columna), pos in zip(conflicts, positions):
+        actual = df.iat[pos, df.columns.get_loc(columna)] if pos >= 0 and columna in df.columns else None
+        detalle.append({'row_id': _as_row_id(rid), 'columna': columna, 'valor_actual': actual})
+    return jsonify({
+        "error": "Otro usuario modificó estos datos. Se recargarán los cambios.",
+        "conflicts": detalle, "version": dataset.version
+    }), 409
+
+def _client_columns(df: pd.DataFrame) -> list:
+    """Columnas que ve el cliente (sin las internas de servidor como `_src_hash`)."""
+    return [c for c in df.columns if c != SOURCE_HASH]
+
+def _client_rows(df: pd.DataFrame) -> list[dict]:
+    """
+    Filas para el cliente (`to_dict('records')` sin `_src_hash`).
+
+    El hash es un int64 que JavaScript no representa con exactitud y el
+    cliente no usa.
+    """
+    return df.drop(columns=SOURCE_HASH, errors='ignore').to_dict('records')
+
+def _apply_cell_edits(df: pd.DataFrame, edits: list) -> list:
+    """
+    Aplica una lista de ediciones {row_id, columna, valor} sobre el DataFrame.
+
+    Trabaja por columna (una asignación vectorizada por columna tocada) en lugar
+    de recorrer fila por fila. Ignora columnas internas/inexistentes, filas que
+    no existen y ediciones sin cambio real. Si una misma celda aparece varias
+    veces, gana la última.
 
-def _calculate_kpis(df: pd.DataFrame) -> dict:
+    Returns:
+        list: Cambios efectivos [{'row_id', 'columna', 'old_val', 'new_val'}].
+    """
+    if not edits:
+        return []
+
+    ed = pd.DataFrame(edits, columns=['row_id', 'columna', 'valor'])
+    ed = ed[ed['columna'].isin(df.columns) & ~ed['columna'].astype(str).str.startswith('_')]
+    ed = ed.assign(row_id=ed['row_id'].astype(str)).drop_duplicates(['row_id', 'columna'], keep='last')
+    if ed.empty:
+        return []
+
+    # Posición física de cada row_id en el DataFrame (-1 si no existe).
+    ed['pos'] = _row_positions(df, ed['row_id'])
+    ed = ed[ed['pos'] >= 0]
+
+    cambios = []
+    for columna, grupo in ed.groupby('columna', sort=False):
+        posiciones = grupo['pos'].to_numpy()
+        nuevos = grupo['valor'].astype(object).to_numpy()
+        viejos = df[columna].to_numpy(dtype=object)[posiciones]
+        distintos = viejos != nuevos
+        if not distintos.any():
+            continue
+
+        posiciones, nuevos, viejos = posiciones[distintos], nuevos[distintos], viejos[distintos]
+        allow_values(df, columna, nuevos)
+        df.iloc[posiciones, df.columns.get_loc(columna)] = nuevos
+        cambios.extend(
+            {'row_id': rid, 'columna': columna, 'old_val': old, 'new_val': new}
+            for rid, old, new in zip(grupo['row_id'].to_numpy()[distintos], viejos, nuevos)
+        )
+    return cambios
+
+def _amounts(dataset, df: pd.DataFrame) -> pd.Series | None:
+    """
+    Montos numéricos de las filas de `df` (None si el dataset no tiene columna de monto).
+
+    Con el borrador en memoria salen de los valores ya convertidos
+    (`dataset.parsed`); las filas leídas del backend se convierten aquí.
+    """
+    col = dataset.profile.amount
+    if not col or col not in df.columns:
+        return None
+    if dataset.resident:
+        return dataset.parsed.values(col, df['_row_id'])
+    return parse_amounts(df[col])
+
+def _calculate_kpis(dataset, df: pd.DataFrame) -> dict:
     """Calcula totales financieros seguros."""
     monto_total = 0.0
     monto_promedio = 0.0
     total_facturas = len(df)
-    monto_col = _find_monto_column(df)
 
-    if monto_col and not df.empty:
+    if not df.empty:
         try:
-            clean_series = df[monto_col].astype(str).str.replace(r'[$,]', '', regex=True)
-            nums = pd.to_numeric(clean_series, errors='coerce').fillna(0)
-            monto_total = nums.sum()
-            monto_promedio = nums.mean()
+            nums = _amounts(dataset, df)
+            if nums is not None:
+                monto_total = nums.sum()
+                monto_promedio = nums.mean()
         except Exception as e:
             print(f"Advertencia KPIs: {e}")
 
+    return _format_kpis(total_facturas, monto_total, monto_promedio)
+
+def _format_kpis(total_facturas: int, monto_total: float, monto_promedio: float) -> dict:
+    """KPIs con el formato de la tarjeta de resumen."""
     return {
         "total_facturas": total_facturas,
         "monto_total": f"${monto_total:,.2f}",
         "monto_promedio": f"${monto_promedio:,.2f}"
     }
 
-def _recalculate_priorities(df: pd.DataFrame) -> pd.DataFrame:
+def _base_priorities(df: pd.DataFrame, settings: dict, pay_col: str | None) -> tuple[np.ndarray, np.ndarray]:
     """
-    Recalcula 'Priority' aplicando lógica base + reglas de usuario.
-    Se llama después de cualquier edición que pueda afectar reglas.
+    Calcula la prioridad base (Hardcoded Business Logic) sin modificar el DataFrame.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (prioridades, razones) alineadas con `df`.
     """
-    settings = load_settings()
-    pay_col = session.get('pay_group_col_name')
-    
-    # 1. Reiniciar a lógica base (Hardcoded Business Logic)
     if pay_col and pay_col in df.columns and settings.get('enable_scf_intercompany', True):
-        # Optimizamos usando vectorización simple
-        pg_series = df[pay_col].astype(str).str.strip().str.upper()
-        
-        cond_alta = pg_series.isin(['SCF', 'INTERCOMPANY'])
-        cond_baja = pg_series.str.startswith('PAY GROUP', na=False)
-        
-        df['_priority'] = np.select([cond_alta, cond_baja], ['Alta', 'Baja'], default='Media')
-        df['_priority_reason'] = np.select(
-            [cond_alta, cond_baja], 
-            ['Prioridad base (SCF/Intercompany)', 'Prioridad base (Pay Group)'], 
+        # Optimizamos usando vectorización simple (categóricas: sobre los valores distintos)
+        pay, codes = df[pay_col], None
+        if is_categorical(pay):
+            # El código -1 (nulo) apunta al 'nan' añadido, como `astype(str)`
+            pay, codes = pd.Series(np.append(pay.cat.categories.astype(str), 'nan')), pay.cat.codes.to_numpy()
+        pg_series = pay.astype(str).str.strip().str.upper()
+
+        cond_alta = pg_series.isin(['SCF', 'INTERCOMPANY']).to_numpy(dtype=bool)
+        cond_baja = pg_series.str.startswith('PAY GROUP', na=False).to_numpy(dtype=bool)
+        if codes is not None:
+            cond_alta, cond_baja = cond_alta[codes], cond_baja[codes]
+
+        prio = np.select([cond_alta, cond_baja], ['Alta', 'Baja'], default='Media')
+        reason = np.select(
+            [cond_alta, cond_baja],
+            ['Prioridad base (SCF/Intercompany)', 'Prioridad base (Pay Group)'],
             default="Prioridad base (Estándar)"
         )
-    else:
-        df['_priority'] = 'Media'
-        df['_priority_reason'] = "Prioridad base (Desactivada/No encontrada)"
-    
+        return prio, reason
+
+    return (np.full(len(df), 'Media', dtype=object),
+            np.full(len(df), "Prioridad base (Desactivada/No encontrada)", dtype=object))
+
+def _recalculate_priorities(df: pd.DataFrame, pay_col: str | None, cache_key=None,
+                            data_key=None) -> pd.DataFrame:
+    """
+    Recalcula 'Priority' aplicando lógica base + reglas de usuario.
+    Se llama después de cualquier edición que pueda afectar reglas.
+
+    `cache_key` solo debe pasarse cuando los datos NO cambiaron desde la última
+    versión guardada (p. ej. al cambiar reglas), para reutilizar columnas normalizadas.
+    `data_key` ((file_id, data_version)) activa la caché de resultados: si ya se
+    calcularon estas reglas sobre esos datos, solo se sustituyen las columnas.
+    """
+    rules, settings = load_rules(), load_settings()
+    result_key = (*data_key, rules_hash(rules, settings)) if data_key is not None else None
+    cached = cached_priorities(result_key, df['_row_id']) if result_key is not None else None
+    if cached is not None:
+        df['_priority'], df['_priority_reason'] = cached
+        return df
+
+    # 1. Reiniciar a lógica base
+    df['_priority'], df['_priority_reason'] = _base_priorities(df, settings, pay_col)
+
     # 2. Sobrescribir con Reglas de Usuario
-    df = apply_priority_rules(df)
+    df = apply_priority_rules(df, rules, cache_key=cache_key)
+    df = compact_frame(df, ('_priority', '_priority_reason'))
+    if result_key is not None:
+        remember_priorities(result_key, df['_row_id'], df['_priority'], df['_priority_reason'])
+    return df
+
+def _recalculate_priorities_for_rows(df: pd.DataFrame, pay_col: str | None, row_ids) -> pd.DataFrame:
+    """
+    Igual que `_recalculate_priorities`, pero solo sobre las filas indicadas.
+    Las reglas son locales a cada fila, así que el resultado es idéntico al
+    recálculo completo para esas filas.
+    """
+    return _recalculate_priorities_for_mask(df, pay_col, select_rows(df, row_ids))
+
+def _recalculate_priorities_for_mask(df: pd.DataFrame, pay_col: str | None, mask: np.ndarray) -> pd.DataFrame:
+    """`_recalculate_priorities_for_rows` con las filas ya marcadas en una máscara."""
+    if not mask.any():
+        return df
+
+    subset = _recalculate_priorities(df.loc[mask].copy(), pay_col)
+    for col in ('_priority', '_priority_reason'):
+        valores = subset[col].to_numpy(dtype=object)
+        allow_values(df, col, valores)
+        df.loc[mask, col] = valores
     return df
 
+def _priority_columns(pay_col: str | None) -> set:
+    """Columnas de las que depende la prioridad: la de Pay Group y las de las reglas activas."""
+    columns = {pay_col} if pay_col else set()
+    for rule in load_rules():
+        if rule.get('active', True):
+            columns.update(cond.get('column') for cond in rule_conditions(rule))
+    return columns
+
+def _commit_with_priorities(dataset, df: pd.DataFrame, updated=(), added=(), removed=(),
+                            cache_key=None) -> tuple[pd.DataFrame, int]:
+    """
+    Recalcula prioridades de todo `df` y registra el cambio en el dataset,
+    sumando a `updated` las filas cuya prioridad cambió (para que el backend
+    y los demás clientes reciban solo esas filas).
+
+    Con `cache_key` (los datos del usuario no cambiaron) se usa además la caché
+    de prioridades por (versión de datos, hash de reglas) y el commit se marca
+    como derivado, así `data_version` no avanza.
+
+    Returns:
+        tuple[pd.DataFrame, int]: (DataFrame resultante, nueva versión).
+    """
+    old_prio = df['_priority'].to_numpy(dtype=object).copy()
+    old_reason = df['_priority_reason'].to_numpy(dtype=object).copy()
+
+    derived = cache_key is not None
+    data_key = (dataset.file_id, dataset.data_version) if derived else None
+    df = _recalculate_priorities(df, dataset.pay_group_col, cache_key, data_key)
+
+    changed = (df['_priority'].to_numpy(dtype=object) != old_prio) | \
+              (df['_priority_reason'].to_numpy(dtype=object) != old_reason)
+    updated = [*updated, *df.loc[changed, '_row_id']]
+    version = dataset.commit(df=df, updated=updated, added=added, removed=removed, author=_client_id(),
+                             derived=derived)
+    return df, version
+
+def _recalculate_dataset_priorities(dataset, filtros=None) -> dict:
+    """
+    Recalcula prioridades de todo el dataset tras un cambio de reglas/configuración.
+
+    Returns:
+        dict: Campos de respuesta {'resumen', 'delta', 'version'}.
+    """
+    bus.progress(dataset.file_id, 'reglas', 0, "Recalculando prioridades...")
+    with dataset.lock:
+        before = _derived_state(dataset.df)
+        df, version = _commit_with_priorities(dataset, dataset.df, cache_key=_cache_key(dataset))
+        bus.progress(dataset.file_id, 'reglas', 100, "Prioridades actualizadas.")
+        return {
+            "resumen": _view_kpis(dataset, df, filtros),
+            "delta": _build_delta(df, before, filtros=filtros),
+            "version": version
+        }
+
+def _view_kpis(dataset, df: pd.DataFrame, filtros) -> dict:
+    """KPIs de lo que ve el cliente (con sus filtros activos)."""
+    return _calculate_kpis(dataset, aplicar_filtros_dinamicos(df, filtros) if filtros else df)
+
+def _derived_state(df: pd.DataFrame) -> pd.DataFrame:
+    """Copia de las columnas derivadas indexada por row_id (texto); base de `_build_delta`."""
+    cols = [c for c in DERIVED_COLUMNS if c in df.columns]
+    return df[cols].set_axis(df['_row_id'].astype(str)).copy()
+
+def _build_delta(df: pd.DataFrame, before: pd.DataFrame, cells=(), added=(), removed=(), filtros=None) -> dict:
+    """
+    Delta compacto de una mutación para que el cliente parchee la tabla en sitio
+    en lugar de volver a pedir `/api/filter`.
+
+    Args:
+        df (pd.DataFrame): Borrador tras el cambio.
+        before (pd.DataFrame): `_derived_state` tomado antes del cambio.
+        cells (iterable): Celdas editadas (row_id, columna).
+        added, removed (iterable): Ids de filas añadidas / eliminadas.
+        filtros (list, optional): Filtros activos del cliente.
+
+    Returns:
+        dict: {'updated': [{'_row_id', <solo las celdas que cambiaron>}],
+               'added': [filas completas], 'removed': [row_ids]}.
+            Las filas que dejan de cumplir los filtros van en `removed`; las que
+            cambian en una columna filtrada viajan completas en `added` (upsert),
+            porque el cliente puede no tenerlas.
+    """
+    removed = {str(r) for r in removed}
+    added = {str(r) for r in added} - removed
+    # Celdas editadas por columna: {columna: row_ids (texto)}
+    edited = defaultdict(set)
+    for rid, col in cells:
+        edited[col].add(str(rid))
+
+    # Columnas derivadas que cambiaron (comparación vectorizada contra `before`)
+    after = _derived_state(df)
+    changed = after.astype(object).ne(before.reindex(after.index).astype(object))
+    for col in after.columns:
+        edited[col].update(after.index[changed[col].to_numpy()].tolist())
+
+    ids = df['_row_id'].astype(str)
+    mask = ids.isin((set().union(*edited.values()) | added) - removed).to_numpy()
+    filas = df.loc[mask]
+    visibles = (aplicar_filtros_dinamicos(filas, filtros) if filtros else filas)['_row_id'].astype(str)
+    filtradas = set().union(*(edited[f.get('columna')] for f in filtros or [] if f.get('columna') in edited))
+
+    # Clasificación de las filas tocadas (máscaras alineadas con `filas`)
+    rids = pd.Index(ids[mask])
+    visible, nueva = rids.isin(visibles), rids.isin(added)
+    completa = visible & (nueva | rids.isin(filtradas))
+
+    delta = {"updated": [], "added": [], "removed": [_as_row_id(r) for r in removed]}
+    delta["removed"].extend(filas['_row_id'][~visible & ~nueva].tolist())
+    delta["added"] = _client_rows(filas[completa])
+
+    # Resto: solo las celdas que cambiaron, columna a columna (sin `to_dict` de filas completas)
+    parche = visible & ~completa
+    rids = rids[parche]
+    delta["updated"] = [{'_row_id': r} for r in filas.loc[parche, '_row_id'].tolist()]
+    for col in filas.columns:
+        if col in edited and col not in ('_row_id', SOURCE_HASH):
+            valores = filas.loc[parche, col].tolist()
+            for i in np.flatnonzero(rids.isin(edited[col])):
+                delta["updated"][i][col] = valores[i]
+    return delta
+
 
 # ==============================================================================
 # 3. RUTAS: VISTAS & SISTEMA
 # ==============================================================================
 
-@app.context_processor
+@bp.app_context_processor
 def inject_translator():
     return dict(get_text=get_text, lang=session.get('language', 'es'))
 
-@app.route('/')
+@bp.route('/')
 def home():
     """Carga la SPA (Single Page Application)."""
     session_data = {
-        "file_id": session.get('file_id'),
+        "file_id": None,
         "columnas": [],
         "autocomplete_options": {},
-        "history_count": len(session.get('history', []))
+        "history_count": len(session.get('history', [])),
+        "version": 0
     }
-    
-    # Si hay datos previos, intentar restaurar columnas para UI
-    df_data = session.get('df_staging')
-    if df_data and len(df_data) > 0:
-        session_data["columnas"] = list(df_data[0].keys())
-        # Reconstruir autocomplete ligero
-        session_data["autocomplete_options"] = get_autocomplete_options(pd.DataFrame.from_records(df_data))
+
+    # Si la sesión sigue conectada a un dataset activo, restaurar columnas para UI
+    dataset = store.get(session.get('file_id'))
+    if dataset is not None:
+        with dataset.lock:
+            session_data["file_id"] = dataset.file_id
+            session_data["columnas"] = _client_columns(dataset.df)
+            session_data["tipos_columna"] = dataset.profile.kinds
+            session_data["autocomplete_options"] = get_autocomplete_options(dataset.df)
+            session_data["version"] = dataset.version
+            session_data["preview"] = dataset.preview
 
     return render_template('index.html', session_data=session_data)
 
-@app.route('/api/set_language/<string:lang_code>')
+@bp.route('/api/set_language/<string:lang_code>')
 def set_language(lang_code):
     if lang_code in LANGUAGES: session['language'] = lang_code
     return jsonify({"status": "success", "language": lang_code})
 
-@app.route('/api/get_translations')
+@bp.route('/api/get_translations')
 def get_translations():
-    return jsonify(LANGUAGES.get(session.get('language', 'es'), LANGUAGES['es']))
+    """Traducciones del idioma de la sesión (precompiladas; 304 si el ETag coincide)."""
+    body, etag = current_app.extensions['translations'].get(session.get('language', 'es'))
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # El idioma depende de la sesión: caché privada y siempre revalidada (barato gracias al ETag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+@bp.app_url_defaults
+def static_version(endpoint, values):
+    """`url_for('static', ...)` añade `?v=<hash del contenido>`."""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = current_app.extensions['static_manifest'].version(values['filename'])
+        if version: values['v'] = version
+
+@bp.after_app_request
+def cache_static(response):
+    """Los estáticos pedidos con su hash vigente se cachean un año sin revalidar."""
+    if request.endpoint == 'static' and response.status_code == 200:
+        version = request.args.get('v')
+        if version and version == current_app.extensions['static_manifest'].version(request.view_args['filename']):
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+    return response
+
+@bp.route('/api/maintenance/cleanup', methods=['POST'])
+def maintenance_cleanup():
+    """Ejecuta una pasada de limpieza de temporales y devuelve el informe."""
+    try:
+        report = current_app.extensions['janitor'].run_once()
+        return jsonify({"status": "success", **report})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/maintenance/memory', methods=['POST'])
+def maintenance_memory():
+    """Mide la memoria de los datasets, descarga los fríos si hace falta y devuelve el informe."""
+    try:
+        report = current_app.extensions['memory_budget'].enforce()
+        return jsonify({"status": "success", **report})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/events/<string:channel>')
+def event_stream(channel):
+    """
+    Canal SSE: avisos de nueva versión del dataset y progreso de operaciones largas.
+
+    `channel` es el file_id de la sesión o un canal efímero `op-...` (p. ej. el
+    progreso de una subida, que aún no tiene file_id).
+    """
+    progress_only = bool(PROGRESS_CHANNEL.match(channel))
+    if not progress_only and channel != session.get('file_id'):
+        return jsonify({"error": "Canal no autorizado"}), 403
+
+    def current_version():
+        # Cada latido cuenta como uso (pestaña abierta) y detecta cambios de otros workers
+        dataset = store.get(channel)
+        return dataset.version if dataset is not None else None
+
+    return Response(
+        bus.stream(channel, None if progress_only else current_version),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 # ==============================================================================
 # 4. RUTAS: GESTIÓN DE ARCHIVOS
 # ==============================================================================
 
-@app.route('/api/upload', methods=['POST'])
+@bp.before_request
+def block_preview_edits():
+    """Las ediciones esperan a que la vista previa se complete (el resto de filas aún no existe)."""
+    if request.endpoint not in PREVIEW_BLOCKED_ENDPOINTS:
+        return None
+    dataset = store.get(session.get('file_id'), touch=False)
+    if dataset is not None and dataset.preview:
+        return jsonify({"error": "Vista previa: espere a que termine la carga completa."}), 423
+    return None
+
+def _finish_preview_load(file_id: str, file_path: str) -> None:
+    """
+    Lee el Excel completo en segundo plano y sustituye la vista previa.
+
+    Si las reglas o la configuración cambian durante la lectura, se vuelven a
+    aplicar antes de publicar. Si la lectura falla, el dataset se queda como
+    vista previa de solo lectura y el cliente recibe el error por el canal de eventos.
+    """
+    try:
+        config = (load_rules(), load_settings())
+        df, profile = cargar_datos(file_path)
+        if df.empty: raise Exception("Archivo vacío o corrupto.")
+        df = df.reset_index().rename(columns={'index': '_row_id'})
+        if config != (load_rules(), load_settings()):
+            df = _recalculate_priorities(df, profile.pay_group)
+
+        dataset = store.get(file_id, touch=False)
+        if dataset is None: return  # Descartado mientras se cargaba
+        dataset.replace(df, profile.pay_group, index_columns=[profile.pay_group, profile.invoice], profile=profile)
+        bus.progress(file_id, 'preview', 100, f"Carga completa: {len(df)} filas.")
+    except Exception as e:
+        print(f"ERROR: Falló la carga completa de {file_id}: {e}")
+        bus.progress(file_id, 'preview', 100, f"Error: {e}")
+    finally:
+        if os.path.exists(file_path): os.remove(file_path)
+
+def _refresh_from_extract(file_path: str, progress: str | None):
+    """
+    Modo "actualizar" de la subida: fusiona un extracto nuevo del mismo reporte
+    con el dataset de la sesión (ver `modules/refresh.py`), conservando las
+    ediciones de las filas que no cambiaron y evaluando reglas solo sobre las
+    filas nuevas o modificadas.
+    """
+    dataset = _get_dataset()
+    if dataset.preview: raise Exception("Vista previa: espere a que termine la carga completa.")
+
+    bus.progress(progress, 'upload', 20, "Leyendo extracto nuevo...")
+    fresh = leer_excel(file_path)
+    if fresh.empty: raise Exception("Archivo vacío o corrupto.")
+
+    with dataset.lock:
+        df = dataset.df
+        key_col = dataset.profile.invoice
+        if not key_col or key_col not in fresh.columns:
+            raise Exception("No se encontró la columna de número de factura en ambos archivos.")
+
+        bus.progress(progress, 'upload', 50, "Comparando filas...")
+        merged, ids, report = merge_extract(df, fresh, key_col)
+        merged = _recalculate_priorities_for_rows(merged, dataset.pay_group_col, ids['added'] + ids['updated'])
+
+        bus.progress(progress, 'upload', 80, "Guardando borrador...")
+        if list(merged.columns) == list(df.columns):
+            version = dataset.commit(df=merged, updated=ids['updated'], added=ids['added'],
+                                     removed=ids['removed'], author=_client_id())
+        else:
+            # Columnas nuevas en el extracto: se reescribe el borrador completo
+            allow_values(merged, '_row_status', [COMPLETO, INCOMPLETO])
+            merged['_row_status'] = row_status(merged)
+            version = dataset.replace(merged, dataset.pay_group_col,
+                                      index_columns=[dataset.pay_group_col, key_col], author=_client_id())
+
+        audit = session.get('audit_log', [])
+        audit.append({
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'action': 'Actualización desde extracto', 'row_id': 'bulk',
+            'valor_nuevo': ', '.join(f"{k}: {v}" for k, v in report.items())
+        })
+        session['audit_log'] = audit
+        bus.progress(progress, 'upload', 100, "Listo.")
+
+        return jsonify({
+            "status": "success",
+            "file_id": dataset.file_id,
+            "columnas": _client_columns(merged),
+            "tipos_columna": dataset.profile.kinds,
+            "autocomplete_options": get_autocomplete_options(merged),
+            "version": version,
+            "resumen_actualizacion": report
+        })
+
+@bp.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files: return jsonify({"error": "No file"}), 400
     file = request.files['file']
     if file.filename == '': return jsonify({"error": "No selection"}), 400
 
+    # Canal de progreso propuesto por el cliente (aún no existe file_id al que suscribirse)
+    progress = request.form.get('progress_id')
+    if progress and not PROGRESS_CHANNEL.match(progress): progress = None
+
     file_id = str(uuid.uuid4())
     file_path = os.path.join(UPLOAD_FOLDER, f"{file_id}.xlsx")
     file.save(file_path)
+    bus.progress(progress, 'upload', 10, "Archivo recibido.")
+
+    if request.form.get('mode') == 'refresh':
+        try:
+            return _refresh_from_extract(file_path, progress)
+        except Exception as e:
+            bus.progress(progress, 'upload', 100, f"Error: {e}")
+            return jsonify({"error": str(e)}), 500
+        finally:
+            if os.path.exists(file_path): os.remove(file_path)
 
     try:
-        session.clear() # Limpieza fresca
-        
+        # Limpieza fresca (conservando la identidad del cliente)
+        client_id = _client_id()
+        store.detach(session.get('file_id'), client_id)
+        session.clear()
+        session['client_id'] = client_id
+
+        # Archivos grandes: primero las N primeras filas; el resto se lee en segundo plano
+        preview_rows = current_app.config["PREVIEW_ROWS"]
+        preview = bool(preview_rows) and \
+            os.path.getsize(file_path) >= current_app.config["PREVIEW_MIN_MB"] * 1024 * 1024
+
         # Loader Inteligente
-        df, pay_group_col = cargar_datos(file_path)
+        bus.progress(progress, 'upload', 20, "Leyendo Excel y calculando prioridades...")
+        df, profile = cargar_datos(file_path, nrows=preview_rows if preview else None)
         if df.empty: raise Exception("Archivo vacío o corrupto.")
+        preview = preview and len(df) >= preview_rows  # Si cabe entero no hay nada más que leer
 
         # Añadir ID interno para trazabilidad
         df = df.reset_index().rename(columns={'index': '_row_id'})
 
-        # Guardar Estado
-        session['df_staging'] = df.to_dict('records')
+        # Guardar Estado: el DataFrame vive en el registro compartido, la sesión solo guarda el file_id
+        bus.progress(progress, 'upload', 70, "Guardando borrador...")
+        dataset = store.create(
+            file_id, df, profile.pay_group, file.filename,
+            index_columns=[profile.pay_group, profile.invoice], preview=preview, profile=profile
+        )
+        store.attach(file_id, client_id)
         session['history'] = []
         session['audit_log'] = []
         session['file_id'] = file_id
-        session['pay_group_col_name'] = pay_group_col
-        
-        if os.path.exists(file_path): os.remove(file_path)
+
+        if preview:
+            # El hilo borra el archivo al terminar
+            threading.Thread(target=_finish_preview_load, args=(file_id, file_path), daemon=True).start()
+        elif os.path.exists(file_path):
+            os.remove(file_path)
+        bus.progress(progress, 'upload', 100, "Listo.")
 
         return jsonify({
             "file_id": file_id,
-            "columnas": list(df.columns),
-            "autocomplete_options": get_autocomplete_options(df)
+            "columnas": _client_columns(df),
+            "tipos_columna": profile.kinds,
+            "autocomplete_options": get_autocomplete_options(df),
+            "version": dataset.version,
+            "preview": preview
         })
 
     except Exception as e:
         if os.path.exists(file_path): os.remove(file_path)
+        bus.progress(progress, 'upload', 100, f"Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
 # ==============================================================================
-# 5. RUTAS: LECTURA & AGRUPACIÓN
+# 5. RUTAS: DATASETS COMPARTIDOS
 # ==============================================================================
 
-@app.route('/api/filter', methods=['POST'])
+@bp.route('/api/dataset/list', methods=['GET'])
+def list_datasets():
+    """Datasets activos en el servidor, para que otros usuarios puedan unirse."""
+    return jsonify({"datasets": [
+        {
+            "file_id": ds.file_id, "filename": ds.filename, "filas": ds.num_rows,
+            "version": ds.version, "usuarios": len(ds.sessions)
+        }
+        for ds in store.list()
+    ]})
+
+@bp.route('/api/dataset/attach', methods=['POST'])
+def attach_dataset():
+    """Conecta la sesión a un dataset ya cargado por otro usuario (modo compartido)."""
+    try:
+        file_id = request.json.get('file_id')
+        client_id = _client_id()
+
+        dataset = store.attach(file_id, client_id)
+        if dataset is None: return jsonify({"error": "Dataset no encontrado"}), 404
+
+        if session.get('file_id') != file_id:
+            store.detach(session.get('file_id'), client_id)
+            language = session.get('language')
+            session.clear()
+            session['client_id'] = client_id
+            if language: session['language'] = language
+            session['history'] = []
+            session['audit_log'] = []
+            session['file_id'] = file_id
+
+        with dataset.lock:
+            return jsonify({
+                "file_id": file_id,
+                "columnas": _client_columns(dataset.df),
+                "tipos_columna": dataset.profile.kinds,
+                "autocomplete_options": get_autocomplete_options(dataset.df),
+                "version": dataset.version,
+                "preview": dataset.preview
+            })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/dataset/changes', methods=['POST'])
+def dataset_changes():
+    """
+    Cambios del dataset desde la versión `since` del cliente.
+
+    Devuelve las filas nuevas/modificadas que cumplen los filtros activos y los
+    ids que el cliente debe quitar (eliminadas o que ya no cumplen los filtros).
+    Si el registro de cambios no llega tan atrás, pide una recarga completa.
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        dataset = _get_dataset()
+        filtros = data.get('filtros_activos')
+
+        with dataset.lock:
+            delta = dataset.changes_since(int(data.get('since') or 0))
+            if delta is None:
+                return jsonify({"version": dataset.version, "full_reload": True})
+            if not delta['upserted'] and not delta['removed']:
+                return jsonify({"version": dataset.version, "full_reload": False, "rows": [], "removed": []})
+
+            changed = dataset.rows(delta['upserted'])
+            visibles = aplicar_filtros_dinamicos(changed, filtros)
+            ocultas = set(changed['_row_id'].astype(str)) - set(visibles['_row_id'].astype(str))
+            resumen = _calculate_kpis(dataset, dataset.query(filtros))
+
+            return jsonify({
+                "version": dataset.version,
+                "full_reload": False,
+                "rows": _client_rows(visibles),
+                "removed": [_as_row_id(r) for r in delta['removed'] | ocultas],
+                "resumen": resumen
+            })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ==============================================================================
+# 6. RUTAS: LECTURA & AGRUPACIÓN
+# ==============================================================================
+
+@bp.route('/api/filter', methods=['POST'])
 def filter_data():
     try:
         data = request.json
         _check_file_id(data.get('file_id'))
-        
-        df = _get_df_from_session_as_df()
-        df_filt = aplicar_filtros_dinamicos(df, data.get('filtros_activos'))
-        
+
+        dataset = _get_dataset()
+        with dataset.lock:
+            df_filt = dataset.query(data.get('filtros_activos'))
+            version, preview = dataset.version, dataset.preview
+
         return jsonify({
-            "data": df_filt.to_dict('records'),
+            "data": _client_rows(df_filt),
             "num_filas": len(df_filt),
-            "resumen": _calculate_kpis(df_filt)
+            "resumen": _calculate_kpis(dataset, df_filt),
+            "version": version,
+            "preview": preview
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/group_by', methods=['POST'])
+@bp.route('/api/sorted_page', methods=['POST'])
+def sorted_page():
+    """
+    Una página de filas filtradas y ordenadas en el servidor (`modules/sort_index.py`).
+
+    Es la fuente de la tabla detallada (paginación y orden remotos de Tabulator).
+
+    Body: {file_id, filtros_activos, sort: [{column, dir: 'asc'|'desc'}], offset, limit, resumen}
+        `sort` admite varias columnas (la primera manda); `_priority` se
+        desempata por antigüedad si `enable_age_sort` está activo, como la tabla.
+        `resumen: true` añade los KPIs de la vista filtrada (el cliente los
+        pide al cambiar de filtros, no en cada página).
+    Returns: {data, num_filas, offset, limit, sort (columnas aplicadas), version, preview[, resumen]}
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        offset = max(int(data.get('offset') or 0), 0)
+        limit = min(max(int(data.get('limit') or PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        age_sort = load_settings().get('enable_age_sort', True)
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+            spec = sort_spec(data.get('sort'), df.columns, age_sort)
+            visible = dataset.sorting.visible(dataset, spec, data.get('filtros_activos'))
+            filas = df.iloc[visible[offset:offset + limit]]
+            version, preview = dataset.version, dataset.preview
+            resumen = _calculate_kpis(dataset, df.iloc[visible]) if data.get('resumen') else None
+
+        result = {
+            "data": _client_rows(filas), "num_filas": len(visible), "offset": offset, "limit": limit,
+            "sort": [{'column': col, 'dir': 'desc' if desc else 'asc'} for col, desc in spec if isinstance(col, str)],
+            "version": version, "preview": preview
+        }
+        if resumen is not None: result["resumen"] = resumen
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/data_quality', methods=['POST'])
+def data_quality_summary():
+    """
+    Resumen de calidad: filas incompletas y celdas vacías/en cero por columna.
+    Con `row_id`, añade las columnas que dejan incompleta a esa fila.
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            quality = dataset.quality
+            result = quality.summary()
+            if data.get('row_id') is not None:
+                result['row_id'] = data['row_id']
+                result['columnas_incompletas'] = quality.incomplete_columns(data['row_id'])
+            result['version'] = dataset.version
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/search', methods=['POST'])
+def global_search():
+    """
+    Búsqueda global en todas las columnas del usuario (`modules/search_index.py`).
+
+    Body: {file_id, q, limit}
+    Returns: {total, resultados: [{_row_id, columna, valor, coincidencia}], version},
+        ordenados por tipo de coincidencia (exacta, prefijo, parcial) y campo.
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        dataset = _get_dataset()
+        limit = min(int(data.get('limit') or SEARCH_LIMIT), 500)
+
+        with dataset.lock:
+            found = dataset.search.search(data.get('q'), limit)
+            ids = [r['_row_id'] for r in found['resultados']]
+            filas = dataset.rows(ids).set_index('_row_id') if ids else None
+            for r in found['resultados']:
+                r['valor'] = str(filas.at[r['_row_id'], r['columna']])
+            found['version'] = dataset.version
+        return jsonify(found)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/group_by', methods=['POST'])
 def group_by_data():
     try:
         data = request.json
         _check_file_id(data.get('file_id'))
-        
-        df = _get_df_from_session_as_df()
-        df = aplicar_filtros_dinamicos(df, data.get('filtros_activos'))
-        
+
+        dataset = _get_dataset()
         col_agrupar = data.get('columna_agrupar')
-        if col_agrupar not in df.columns: return jsonify({"error": "Columna inválida"}), 400
-
-        # Preparar agregaciones
-        col_monto = _find_monto_column(df)
-        
-        if col_monto:
-            # Limpieza numérica para agregación
-            clean = df[col_monto].astype(str).str.replace(r'[$,]', '', regex=True)
-            df['_tm'] = pd.to_numeric(clean, errors='coerce').fillna(0)
-            
-            gb = df.groupby(col_agrupar)['_tm'].agg(['sum', 'mean', 'min', 'max', 'count']).reset_index()
-            gb = gb.rename(columns={
-                'sum': 'Total_sum', 'mean': 'Total_mean', 
-                'min': 'Total_min', 'max': 'Total_max', 'count': 'Total_count'
-            })
-            # Redondeo
-            gb[['Total_sum','Total_mean','Total_min','Total_max']] = gb[['Total_sum','Total_mean','Total_min','Total_max']].round(2)
-        else:
-            gb = df.groupby(col_agrupar).size().reset_index(name='Total_count')
-            # Rellenar vacíos financieros
-            for c in ['Total_sum','Total_mean','Total_min','Total_max']: gb[c] = 0
 
+        with dataset.lock:
+            schema = dataset.schema()
+            if col_agrupar not in schema.columns: return jsonify({"error": "Columna inválida"}), 400
+
+            # Preparar agregaciones
+            col_monto = dataset.profile.amount
+
+            # Push-down: si el borrador no está en memoria, agrega el motor de base de datos
+            if dataset.pushdown:
+                gb = dataset.storage.group_by(dataset.file_id, col_agrupar, col_monto, data.get('filtros_activos'))
+                return jsonify({"data": gb.fillna(0).to_dict('records')})
+
+            df = dataset.query(data.get('filtros_activos'))
+            # Montos ya convertidos (sin columna de monto, solo conteos)
+            amounts = _amounts(dataset, df)
+
+        gb = group_totals(df[col_agrupar], amounts)
         return jsonify({"data": gb.fillna(0).to_dict('records')})
 
     except Exception as e:
@@ -293,362 +1037,501 @@ def group_by_data():
 
 
 # ==============================================================================
-# 6. RUTAS: EDICIÓN (FILA INDIVIDUAL)
+# 7. RUTAS: EDICIÓN (FILA INDIVIDUAL)
 # ==============================================================================
 
-@app.route('/api/update_cell', methods=['POST'])
+@bp.route('/api/update_cell', methods=['POST'])
 def update_cell():
     try:
         data = request.json
         _check_file_id(data.get('file_id'))
         row_id_str = str(data.get('row_id'))
-        
-        # Trabajamos con lista de diccionarios (más rápido para 1 celda)
-        datos = session.get('df_staging')
-        history = session.get('history', [])
-        audit = session.get('audit_log', [])
+        columna = data['columna']
+
+        dataset = _get_dataset()
+        with dataset.lock:
+            df = dataset.df
+            pos = _row_positions(df, [row_id_str])[0]
+            if pos < 0 or columna not in df.columns: return jsonify({"error": "Fila no encontrada"}), 404
+
+            # Control optimista: ¿otro usuario cambió esta celda desde base_version?
+            conflicts = dataset.conflicting_cells(_base_version(data), [(row_id_str, columna)], _client_id())
+            if conflicts: return _conflict_response(dataset, conflicts)
+
+            col_idx = df.columns.get_loc(columna)
+            old = df.iat[pos, col_idx]
+            if old == data['valor']: return jsonify({"status": "no_change"})
+
+            # Historial
+            history = _push_history(dataset, {
+                'action': 'update', 'row_id': row_id_str, 'columna': columna,
+                'old_val': old, 'new_val': data['valor']
+            })
 
-        changed_row = None
-        new_prio = None
-        
-        for fila in datos:
-            if str(fila.get('_row_id')) == row_id_str:
-                old = fila.get(data['columna'])
-                if old == data['valor']: return jsonify({"status": "no_change"})
-
-                # Historial
-                history.append({
-                    'action': 'update', 'row_id': row_id_str, 'columna': data['columna'],
-                    'old_val': old, 'new_val': data['valor']
-                })
-                if len(history) > UNDO_STACK_LIMIT: history.pop(0)
+            # Auditoría
+            audit = session.get('audit_log', [])
+            audit.append({
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'action': 'Celda Actualizada', 'row_id': row_id_str,
+                'columna': columna, 'valor_anterior': old, 'valor_nuevo': data['valor']
+            })
+            session['audit_log'] = audit
 
-                # Auditoría
-                audit.append({
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'action': 'Celda Actualizada', 'row_id': row_id_str,
-                    'columna': data['columna'], 'valor_anterior': old, 'valor_nuevo': data['valor']
-                })
+            # Aplicar
+            allow_values(df, columna, [data['valor']])
+            df.iat[pos, col_idx] = data['valor']
 
-                # Aplicar
-                fila[data['columna']] = data['valor']
-                fila['_row_status'] = _check_row_completeness(fila)
-                changed_row = fila
-                break
-        
-        if not changed_row: return jsonify({"error": "Fila no encontrada"}), 404
-
-        # Recalcular Prioridad (Solo si necesario)
-        df = pd.DataFrame.from_records(datos)
-        df = _recalculate_priorities(df)
-        
-        # Extraer la nueva prioridad específica de esta fila
-        new_prio_data = df.loc[df['_row_id'].astype(str) == row_id_str]
-        if not new_prio_data.empty:
-            new_prio = new_prio_data['_priority'].iloc[0]
-            
-        session['df_staging'] = df.to_dict('records')
-        session['history'] = history
-        session['audit_log'] = audit
+            # Recalcular Prioridad (solo la fila editada); el commit recalcula `_row_status`
+            df = _recalculate_priorities_for_rows(df, dataset.pay_group_col, [row_id_str])
+            version = dataset.commit(updated=[row_id_str], cells=[(row_id_str, columna)], author=_client_id())
+            new_prio = df.iat[pos, df.columns.get_loc('_priority')]
+            new_status = df.iat[pos, df.columns.get_loc('_row_status')]
+            resumen = _calculate_kpis(dataset, df)
 
         return jsonify({
             "status": "success",
             "history_count": len(history),
-            "resumen": _calculate_kpis(df),
+            "resumen": resumen,
             "new_priority": new_prio,
-            "new_row_status": changed_row.get('_row_status')
+            "new_row_status": new_status,
+            "version": version
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/add_row', methods=['POST'])
+@bp.route('/api/update_cells_batch', methods=['POST'])
+def update_cells_batch():
+    """
+    Aplica un bloque de ediciones de celda (pegado desde Excel, multi-celda) en
+    una sola pasada: 1 entrada de undo, 1 lote de auditoría y recálculo de
+    prioridad solo para las filas tocadas.
+
+    Las celdas que otro usuario modificó desde `base_version` no se aplican y se
+    devuelven en `conflicts`; el resto del lote se fusiona.
+
+    Body: {file_id, base_version, edits: [{row_id, columna, valor}, ...]}
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        edits = data.get('edits') or []
+        if not isinstance(edits, list):
+            return jsonify({"error": "Formato de ediciones inválido"}), 400
+
+        dataset = _get_dataset()
+        with dataset.lock:
+            df = dataset.df
+            conflicts = dataset.conflicting_cells(
+                _base_version(data), [(e.get('row_id'), e.get('columna')) for e in edits], _client_id()
+            )
+            edits = [e for e in edits if (str(e.get('row_id')), e.get('columna')) not in conflicts]
+
+            cambios = _apply_cell_edits(df, edits)
+            if not cambios:
+                if conflicts: return _conflict_response(dataset, conflicts)
+                return jsonify({"status": "no_change"})
+
+            touched_ids = {c['row_id'] for c in cambios}
+            touched_mask = df['_row_id'].astype(str).isin(touched_ids)
+
+            # Prioridad solo para las filas afectadas (el commit recalcula su `_row_status`)
+            df = _recalculate_priorities_for_rows(df, dataset.pay_group_col, touched_ids)
+
+            # Historial: una sola entrada para todo el lote
+            history = _push_history(dataset, {'action': 'batch_update', 'changes': cambios})
+
+            # Auditoría: un lote con la misma marca de tiempo
+            audit = session.get('audit_log', [])
+            ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            audit.extend({
+                'timestamp': ts, 'action': 'Edición por Lote', 'row_id': c['row_id'],
+                'columna': c['columna'], 'valor_anterior': c['old_val'], 'valor_nuevo': c['new_val']
+            } for c in cambios)
+            session['audit_log'] = audit
+
+            version = dataset.commit(
+                updated=touched_ids, cells=[(c['row_id'], c['columna']) for c in cambios], author=_client_id()
+            )
+            filas = df.loc[touched_mask, ['_row_id', '_priority', '_priority_reason', '_row_status']]
+            resumen = _calculate_kpis(dataset, df)
+
+        return jsonify({
+            "status": "success",
+            "message": f"{len(cambios)} celdas actualizadas.",
+            "history_count": len(history),
+            "resumen": resumen,
+            "rows": filas.to_dict('records'),
+            "conflicts": [{'row_id': _as_row_id(r), 'columna': c} for r, c in conflicts],
+            "version": version
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/add_row', methods=['POST'])
 def add_row():
     try:
         _check_file_id(request.json.get('file_id'))
-        data = session.get('df_staging')
-        
-        # ID Auto-incremental
-        max_id = max([int(r.get('_row_id', 0)) for r in data]) if data else 0
-        new_id = max_id + 1
-        
-        # Crear fila vacía con claves existentes
-        cols = list(data[0].keys()) if data else ['_row_id', '_priority']
-        new_row = {c: "" for c in cols}
-        new_row.update({
-            '_row_id': new_id, 
-            '_row_status': 'Incompleto',
-            '_priority': 'Media',
-            '_priority_reason': 'Nueva Fila'
-        })
-        
-        data.append(new_row)
-        
-        # Historial
-        hist = session.get('history', [])
-        hist.append({'action': 'add', 'row_id': new_id})
-        if len(hist) > UNDO_STACK_LIMIT: hist.pop(0)
-        
-        session['df_staging'] = data
-        session['history'] = hist
-        
+        filtros = request.json.get('filtros_activos')
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+            before = _derived_state(df)
+
+            # ID Auto-incremental
+            max_id = int(df['_row_id'].astype(int).max()) if len(df) else 0
+            new_id = max_id + 1
+
+            # Crear fila vacía con columnas existentes
+            new_row = {c: "" for c in df.columns}
+            if SOURCE_HASH in df.columns: new_row[SOURCE_HASH] = 0  # Fila manual (no viene del extracto)
+            new_row.update({
+                '_row_id': new_id,
+                '_row_status': 'Incompleto',
+                '_priority': 'Media',
+                '_priority_reason': 'Nueva Fila'
+            })
+            df = concat_rows([df, pd.DataFrame([new_row])])
+
+            # Historial
+            hist = _push_history(dataset, {'action': 'add', 'row_id': new_id})
+            version = dataset.commit(df=df, added=[new_id], author=_client_id())
+            resumen = _view_kpis(dataset, df, filtros)
+            delta = _build_delta(df, before, added=[new_id], filtros=filtros)
+
         return jsonify({
             "status": "success", "new_row_id": new_id,
             "history_count": len(hist),
-            "resumen": _calculate_kpis(pd.DataFrame.from_records(data))
+            "resumen": resumen,
+            "delta": delta,
+            "version": version
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/delete_row', methods=['POST'])
+@bp.route('/api/delete_row', methods=['POST'])
 def delete_row():
     try:
         rid = str(request.json.get('row_id'))
         _check_file_id(request.json.get('file_id'))
-        data = session.get('df_staging')
-        
-        # Buscar y eliminar
-        idx = next((i for i, r in enumerate(data) if str(r.get('_row_id')) == rid), -1)
-        if idx == -1: return jsonify({"error": "Fila no encontrada"}), 404
-        
-        deleted = data.pop(idx)
-        
-        # Historial
-        hist = session.get('history', [])
-        hist.append({'action': 'delete', 'deleted_row': deleted, 'original_index': idx})
-        if len(hist) > UNDO_STACK_LIMIT: hist.pop(0)
-        
-        session['df_staging'] = data
-        session['history'] = hist
-        
-        return jsonify({"status": "success", "history_count": len(hist), "resumen": _calculate_kpis(pd.DataFrame.from_records(data))})
+        filtros = request.json.get('filtros_activos')
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+
+            # Buscar y eliminar
+            idx = int(_row_positions(df, [rid])[0])
+            if idx == -1: return jsonify({"error": "Fila no encontrada"}), 404
+
+            deleted = df.iloc[[idx]].to_dict('records')[0]
+            df = df.drop(df.index[idx]).reset_index(drop=True)
+
+            # Historial
+            hist = _push_history(dataset, {'action': 'delete', 'deleted_row': deleted, 'original_index': idx})
+            version = dataset.commit(df=df, removed=[rid], author=_client_id())
+            resumen = _view_kpis(dataset, df, filtros)
+
+        return jsonify({
+            "status": "success", "history_count": len(hist), "resumen": resumen,
+            "delta": {"updated": [], "added": [], "removed": [_as_row_id(rid)]}, "version": version
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # ==============================================================================
-# 7. RUTAS: EDICIÓN MASIVA & HERRAMIENTAS
+# 8. RUTAS: EDICIÓN MASIVA & HERRAMIENTAS
 # ==============================================================================
 
-@app.route('/api/bulk_update', methods=['POST'])
+def _apply_bulk_edits(dataset, data: dict, targets: dict):
+    """
+    Aplica ediciones masivas (bulk_update / find_replace) con control optimista.
+
+    Trabaja con máscaras (`modules/bulk_edit.py`): una asignación por columna y
+    un solo recálculo de prioridad para todas las filas tocadas (si alguna
+    columna editada interviene en la prioridad). Las celdas que
+    otro usuario modificó desde `base_version` se excluyen.
+
+    Args:
+        targets (dict): {columna: (máscara de filas, valor nuevo o array
+            alineado con `np.flatnonzero(máscara)`)}.
+
+    Returns:
+        tuple: (parche de deshacer {columna: grupos}, celdas cambiadas
+            [(row_id, columna)], celdas en conflicto, DataFrame resultante).
+    """
+    df = dataset.df
+    ids = df['_row_id'].to_numpy()
+    conflicts = dataset.conflicting_cells(
+        _base_version(data), ((rid, col) for col, (mask, _) in targets.items() for rid in ids[mask]), _client_id()
+    )
+
+    patch, cells = {}, []
+    tocadas = np.zeros(len(df), dtype=bool)
+    for columna, (mask, valores) in targets.items():
+        bloqueadas = select_rows(df, [rid for rid, col in conflicts if col == columna])
+        if bloqueadas.any():
+            if isinstance(valores, np.ndarray):
+                valores = valores[~bloqueadas[mask]]
+            mask = mask & ~bloqueadas
+        positions, viejos = assign(df, columna, np.flatnonzero(mask), valores)
+        if len(positions):
+            patch[columna] = undo_patch(ids[positions], viejos)
+            cells.extend((rid, columna) for rid in ids[positions].tolist())
+            tocadas[positions] = True
+
+    # Solo si alguna columna editada interviene en la prioridad (base o reglas)
+    if tocadas.any() and not _priority_columns(dataset.pay_group_col).isdisjoint(patch):
+        df = _recalculate_priorities_for_mask(df, dataset.pay_group_col, tocadas)
+    return patch, cells, conflicts, df
+
+def _bulk_response(dataset, data: dict, action: str, patch: dict, cells: list, conflicts: set,
+                   df: pd.DataFrame, before: pd.DataFrame, message: str):
+    """Registra una edición masiva (historial + commit) y arma la respuesta con su delta."""
+    filtros = data.get('filtros_activos')
+    hist = _push_history(dataset, {'action': action, 'patch': patch})
+    version = dataset.commit(updated={rid for rid, _ in cells}, cells=cells, author=_client_id())
+    return jsonify({
+        "status": "success", "message": message,
+        "history_count": len(hist), "resumen": _view_kpis(dataset, df, filtros),
+        "delta": _build_delta(df, before, cells, filtros=filtros),
+        "conflicts": len(conflicts), "version": version
+    })
+
+def _editable_column(df: pd.DataFrame, columna) -> bool:
+    """Columna del usuario existente (las internas `_...` no se editan en masa)."""
+    return columna in df.columns and not str(columna).startswith('_')
+
+@bp.route('/api/bulk_update', methods=['POST'])
 def bulk_update():
     try:
         d = request.json
         _check_file_id(d.get('file_id'))
-        target_ids = set(str(i) for i in d.get('row_ids', []))
-        
-        data = session.get('df_staging')
-        changes = []
-        count = 0
-        
-        for r in data:
-            rid = str(r.get('_row_id'))
-            if rid in target_ids:
-                old = r.get(d['column'])
-                if old != d['new_value']:
-                    changes.append({'row_id': rid, 'old_val': old})
-                    r[d['column']] = d['new_value']
-                    r['_row_status'] = _check_row_completeness(r)
-                    count += 1
-        
-        if count > 0:
-            hist = session.get('history', [])
-            hist.append({'action': 'bulk_update', 'columna': d['column'], 'new_val': d['new_value'], 'changes': changes})
-            session['history'] = hist
-            
-            df = pd.DataFrame.from_records(data)
-            df = _recalculate_priorities(df)
-            session['df_staging'] = df.to_dict('records')
-            
-            return jsonify({"status": "success", "message": f"{count} filas editadas.", "history_count": len(hist), "resumen": _calculate_kpis(df)})
-            
+        columna = d['column']
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+            if not _editable_column(df, columna): return jsonify({"error": "Columna inválida"}), 400
+            before = _derived_state(df)
+
+            seleccion = select_rows(df, d.get('row_ids', []))
+            patch, cells, conflicts, df = _apply_bulk_edits(dataset, d, {columna: (seleccion, d['new_value'])})
+            if patch:
+                return _bulk_response(dataset, d, 'bulk_update', patch, cells, conflicts, df, before,
+                                      f"{len(cells)} filas editadas.")
+
+        if conflicts: return _conflict_response(dataset, conflicts)
         return jsonify({"status": "no_change"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/find_replace_in_selection', methods=['POST'])
+@bp.route('/api/find_replace_in_selection', methods=['POST'])
 def find_replace():
+    """
+    Buscar y reemplazar dentro de las filas seleccionadas.
+
+    Body: {file_id, base_version, row_ids, columna | columnas: [...], find_text,
+           replace_text, mode: 'exact' (defecto, celda completa) | 'contains' | 'regex',
+           match_case: bool (defecto true), filtros_activos}
+    """
     try:
         d = request.json
         _check_file_id(d.get('file_id'))
-        target_ids = set(str(i) for i in d.get('row_ids', []))
-        find_txt = str(d.get('find_text'))
-        
-        data = session.get('df_staging')
-        changes = []
-        count = 0
-        
-        for r in data:
-            rid = str(r.get('_row_id'))
-            if rid in target_ids:
-                old = r.get(d['columna'])
-                if str(old) == find_txt: # Coincidencia exacta
-                    changes.append({'row_id': rid, 'old_val': old})
-                    r[d['columna']] = d['replace_text']
-                    r['_row_status'] = _check_row_completeness(r)
-                    count += 1
-                    
-        if count > 0:
-            hist = session.get('history', [])
-            hist.append({'action': 'find_replace', 'columna': d['columna'], 'new_val': d['replace_text'], 'changes': changes})
-            session['history'] = hist
-            
-            df = pd.DataFrame.from_records(data)
-            df = _recalculate_priorities(df)
-            session['df_staging'] = df.to_dict('records')
-            
-            return jsonify({"status": "success", "message": f"{count} reemplazos.", "history_count": len(hist), "resumen": _calculate_kpis(df)})
-            
+        columnas = d.get('columnas') or [d['columna']]
+        find_txt = str(d.get('find_text', ''))
+        mode, match_case = d.get('mode', EXACT), bool(d.get('match_case', True))
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+            if not all(_editable_column(df, c) for c in columnas):
+                return jsonify({"error": "Columna inválida"}), 400
+            before = _derived_state(df)
+
+            seleccion = select_rows(df, d.get('row_ids', []))
+            targets = {}
+            try:
+                for columna in columnas:
+                    mask = seleccion & match_mask(df[columna], find_txt, mode, match_case)
+                    if mask.any():
+                        targets[columna] = (mask, replaced_values(
+                            df[columna], mask, find_txt, d['replace_text'], mode, match_case
+                        ))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            patch, cells, conflicts, df = _apply_bulk_edits(dataset, d, targets)
+            if patch:
+                return _bulk_response(dataset, d, 'find_replace', patch, cells, conflicts, df, before,
+                                      f"{len(cells)} reemplazos.")
+
+        if conflicts: return _conflict_response(dataset, conflicts)
         return jsonify({"status": "no_change", "message": "Sin coincidencias."})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/bulk_delete_rows', methods=['POST'])
+@bp.route('/api/bulk_delete_rows', methods=['POST'])
 def bulk_delete():
     try:
-        ids = set(str(i) for i in request.json.get('row_ids', []))
         _check_file_id(request.json.get('file_id'))
-        data = session.get('df_staging')
-        
-        kept = []
-        deleted = []
-        
-        for r in data:
-            if str(r.get('_row_id')) in ids: deleted.append(r)
-            else: kept.append(r)
-            
-        if deleted:
-            hist = session.get('history', [])
-            hist.append({'action': 'bulk_delete', 'deleted_rows': deleted})
-            session['history'] = hist
-            session['df_staging'] = kept
-            
-            return jsonify({"status": "success", "message": f"{len(deleted)} eliminadas.", "history_count": len(hist), "resumen": _calculate_kpis(pd.DataFrame.from_records(kept))})
-            
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+            mask = select_rows(df, request.json.get('row_ids', []))
+
+            if mask.any():
+                deleted = df[mask]
+                kept = df[~mask].reset_index(drop=True)
+                removed = deleted['_row_id'].tolist()
+
+                # Prioridad y `_row_status` dependen solo de cada fila: borrar no cambia las que quedan.
+                # Las filas borradas se guardan por columnas (compacto en la sesión).
+                hist = _push_history(dataset, {'action': 'bulk_delete', 'deleted_rows': deleted.to_dict('list')})
+                version = dataset.commit(df=kept, removed=removed, author=_client_id())
+
+                return jsonify({
+                    "status": "success", "message": f"{len(removed)} eliminadas.",
+                    "history_count": len(hist), "resumen": _view_kpis(dataset, kept, request.json.get('filtros_activos')),
+                    "delta": {"updated": [], "added": [], "removed": removed},
+                    "version": version
+                })
+
         return jsonify({"status": "no_change"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/get_duplicate_invoices', methods=['POST'])
+@bp.route('/api/get_duplicate_invoices', methods=['POST'])
 def get_duplicates():
     try:
         _check_file_id(request.json.get('file_id'))
-        df = _get_df_from_session_as_df()
-        col = _find_invoice_column(df)
-        if not col: return jsonify({"error": "No se detectó columna de Factura"}), 400
-        
-        dupes = df[df.duplicated(subset=[col], keep=False)].sort_values(by=[col])
-        return jsonify({"data": dupes.to_dict('records'), "num_filas": len(dupes)})
+        dataset = _get_dataset()
+        with dataset.lock:
+            df = dataset.df
+            col = dataset.profile.invoice
+            if not col: return jsonify({"error": "No se detectó columna de Factura"}), 400
+
+            dupes = df[df.duplicated(subset=[col], keep=False)].sort_values(by=[col])
+        return jsonify({"data": _client_rows(dupes), "num_filas": len(dupes)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/cleanup_duplicate_invoices', methods=['POST'])
+@bp.route('/api/cleanup_duplicate_invoices', methods=['POST'])
 def cleanup_duplicates():
     try:
         _check_file_id(request.json.get('file_id'))
-        df = _get_df_from_session_as_df()
-        col = _find_invoice_column(df)
-        
-        mask = df.duplicated(subset=[col], keep='first')
-        deleted = df[mask]
-        
-        if not deleted.empty:
-            hist = session.get('history', [])
-            hist.append({'action': 'bulk_delete_duplicates', 'deleted_rows': deleted.to_dict('records')})
-            session['history'] = hist
-            
-            df_clean = df[~mask]
-            session['df_staging'] = df_clean.to_dict('records')
-            
-            return jsonify({"status": "success", "message": f"{len(deleted)} eliminados.", "history_count": len(hist), "resumen": _calculate_kpis(df_clean)})
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            df = dataset.df
+            col = dataset.profile.invoice
+
+            mask = df.duplicated(subset=[col], keep='first')
+            deleted = df[mask]
+
+            if not deleted.empty:
+                hist = _push_history(dataset, {'action': 'bulk_delete_duplicates', 'deleted_rows': deleted.to_dict('list')})
+
+                df_clean = df[~mask].reset_index(drop=True)
+                version = dataset.commit(df=df_clean, removed=deleted['_row_id'], author=_client_id())
+
+                return jsonify({
+                    "status": "success", "message": f"{len(deleted)} eliminados.",
+                    "history_count": len(hist), "resumen": _view_kpis(dataset, df_clean, request.json.get('filtros_activos')),
+                    "delta": {"updated": [], "added": [], "removed": deleted['_row_id'].tolist()},
+                    "version": version
+                })
         return jsonify({"status": "no_change"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # ==============================================================================
-# 8. RUTAS: REGLAS DE NEGOCIO & LISTAS
+# 9. RUTAS: REGLAS DE NEGOCIO & LISTAS
 # ==============================================================================
 
-@app.route('/api/priority_rules/get', methods=['GET'])
+@bp.route('/api/priority_rules/get', methods=['GET'])
 def get_rules():
     return jsonify({"rules": load_rules(), "settings": load_settings()})
 
-@app.route('/api/priority_rules/save_settings', methods=['POST'])
+def _rules_changed_response(filtros=None):
+    """Recalcula el dataset de la sesión (si hay) y responde con el delta de prioridades."""
+    dataset = store.get(session.get('file_id'))
+    if dataset is None:
+        return jsonify({"status": "success", "resumen": None})
+    return jsonify({"status": "success", **_recalculate_dataset_priorities(dataset, filtros)})
+
+@bp.route('/api/priority_rules/save_settings', methods=['POST'])
 def api_save_settings():
-    save_settings(request.json)
-    if session.get('df_staging'):
-        df = _recalculate_priorities(_get_df_from_session_as_df())
-        session['df_staging'] = df.to_dict('records')
-    return jsonify({"status": "success"})
+    d = dict(request.json)
+    filtros = d.pop('filtros_activos', None)
+    save_settings(d)
+    return _rules_changed_response(filtros)
 
-@app.route('/api/priority_rules/save', methods=['POST'])
+@bp.route('/api/priority_rules/save', methods=['POST'])
 def api_save_rule():
-    save_rule(request.json)
-    resumen = None
-    if session.get('df_staging'):
-        df = _recalculate_priorities(_get_df_from_session_as_df())
-        session['df_staging'] = df.to_dict('records')
-        resumen = _calculate_kpis(df)
-    return jsonify({"status": "success", "resumen": resumen})
-
-@app.route('/api/priority_rules/toggle', methods=['POST'])
+    d = dict(request.json)
+    filtros = d.pop('filtros_activos', None)
+    rule = normalize_rule(d)
+    error = validate_rule(rule)
+    if error: return jsonify({"error": error}), 400
+
+    save_rule(rule)
+    return _rules_changed_response(filtros)
+
+@bp.route('/api/priority_rules/toggle', methods=['POST'])
 def api_toggle_rule():
     d = request.json
-    toggle_rule(d.get('column'), d.get('value'), d.get('active'))
-    if session.get('df_staging'):
-        df = _recalculate_priorities(_get_df_from_session_as_df())
-        session['df_staging'] = df.to_dict('records')
-    return jsonify({"status": "success"})
+    toggle_rule(d.get('column'), d.get('value'), d.get('active'), d.get('id'))
+    return _rules_changed_response(d.get('filtros_activos'))
 
-@app.route('/api/priority_rules/delete', methods=['POST'])
+@bp.route('/api/priority_rules/delete', methods=['POST'])
 def api_delete_rule():
     d = request.json
-    delete_rule(d.get('column'), d.get('value'))
-    resumen = None
-    if session.get('df_staging'):
-        df = _recalculate_priorities(_get_df_from_session_as_df())
-        session['df_staging'] = df.to_dict('records')
-        resumen = _calculate_kpis(df)
-    return jsonify({"status": "success", "resumen": resumen})
-
-@app.route('/api/save_autocomplete_lists', methods=['POST'])
+    delete_rule(d.get('column'), d.get('value'), d.get('id'))
+    return _rules_changed_response(d.get('filtros_activos'))
+
+@bp.route('/api/save_autocomplete_lists', methods=['POST'])
 def api_save_lists():
     guardar_json(USER_LISTS_FILE, request.json)
     return jsonify({"status": "success"})
 
-@app.route('/api/import_autocomplete_values', methods=['POST'])
+@bp.route('/api/import_autocomplete_values', methods=['POST'])
 def api_import_autocomplete():
     try:
         data = request.json
         _check_file_id(data.get('file_id'))
         col_name = data.get('column')
-        
+
         df = _get_df_from_session_as_df()
-        
+
         if col_name not in df.columns:
             return jsonify({"error": f"La columna '{col_name}' no existe."}), 400
-            
+
         valores = df[col_name].dropna().astype(str).unique()
         nuevos_valores = sorted([
-            v.strip() for v in valores 
+            v.strip() for v in valores
             if v.strip() not in ["", "nan", "None"]
         ])
-        
+
         if not nuevos_valores:
             return jsonify({"error": "Columna vacía."}), 400
 
         current_lists = cargar_json(USER_LISTS_FILE)
         existing_vals = set(current_lists.get(col_name, []))
         existing_vals.update(nuevos_valores)
-        
+
         current_lists[col_name] = sorted(list(existing_vals))
         guardar_json(USER_LISTS_FILE, current_lists)
-        
+
         new_options = get_autocomplete_options(df)
-        
+
         return jsonify({
-            "status": "success", 
+            "status": "success",
             "message": f"Importados {len(nuevos_valores)} valores.",
             "autocomplete_options": new_options
         })
@@ -656,95 +1539,235 @@ def api_import_autocomplete():
         return jsonify({"error": str(e)}), 500
 
 # --- NUEVA RUTA: IMPORTAR REGLAS MASIVAS (PARA VISTAS) ---
-@app.route('/api/priority_rules/import_view', methods=['POST'])
+@bp.route('/api/priority_rules/import_view', methods=['POST'])
 def api_import_view_rules():
     try:
         data = request.json
         rules = data.get('rules', [])
         settings = data.get('settings', {})
-        
+
         # Sobrescribir reglas actuales con las de la vista
         replace_all_rules(rules, settings)
-        
+
         # Recalcular prioridades si hay datos cargados
-        df_result = None
-        if session.get('df_staging'):
-            df = _get_df_from_session_as_df()
-            df = _recalculate_priorities(df)
-            session['df_staging'] = df.to_dict('records')
-            df_result = df
-            
-        return jsonify({
-            "status": "success", 
-            "resumen": _calculate_kpis(df_result) if df_result is not None else None
-        })
+        return _rules_changed_response(data.get('filtros_activos'))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/priority_rules/preview', methods=['POST'])
+def api_preview_rules():
+    """
+    Dry-run de reglas: cuántas facturas reprioriza una regla (o una vista completa)
+    sin guardar nada ni modificar el borrador.
+
+    Body: {file_id, rule: {...}}                  -> regla candidata + reglas actuales
+          {file_id, rules: [...], settings: {...}} -> conjunto completo (import_view)
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        dataset = _get_dataset()
+
+        if 'rules' in data:
+            # Misma semántica que /api/priority_rules/import_view (reemplazo total)
+            rules = [normalize_rule(r) for r in data.get('rules') or []]
+            settings = data.get('settings') or {}
+        else:
+            # Misma semántica que save_rule: la candidata reemplaza a la de igual columna/valor
+            candidate = normalize_rule(data.get('rule') or {})
+            error = validate_rule(candidate)
+            if error: return jsonify({"error": error}), 400
+            candidate['candidate'] = True
+            rules = merge_rule(load_rules(), candidate)
+            settings = load_settings()
+
+        with dataset.lock:
+            df = dataset.df
+            base_priority, _ = _base_priorities(df, settings, dataset.pay_group_col)
+            return jsonify(preview_rules(df, rules, base_priority, cache_key=_cache_key(dataset)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- VISTAS GUARDADAS EN EL SERVIDOR ---
+@bp.route('/api/views', methods=['GET'])
+def api_list_views():
+    return jsonify({"views": load_views()})
+
+@bp.route('/api/views/save', methods=['POST'])
+def api_save_view():
+    """
+    Guarda la configuración actual como vista del equipo (mismo nombre = se sobrescribe).
+    Con `include_rules`, la vista lleva también las reglas y la configuración actuales.
+    """
+    try:
+        data = dict(request.json)
+        if not str(data.get('name') or '').strip(): return jsonify({"error": "La vista necesita un nombre."}), 400
+        if data.pop('include_rules', False):
+            data['rules'], data['settings'] = load_rules(), load_settings()
+        view = save_view(data)
+        return jsonify({"status": "success", "view": view, "views": load_views()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/views/delete', methods=['POST'])
+def api_delete_view():
+    if not delete_view(request.json.get('id')): return jsonify({"error": "Vista no encontrada"}), 404
+    return jsonify({"status": "success", "views": load_views()})
+
+@bp.route('/api/views/open', methods=['POST'])
+def api_open_view():
+    """
+    Abre una vista guardada sobre el dataset de la sesión.
+
+    El resultado (filas visibles, KPIs y totales por grupo) sale de la
+    materialización de la vista, que solo reevalúa las filas cambiadas desde
+    la última vez que se abrió (`modules/saved_views.py`).
+
+    Returns:
+        {view, data (vista detallada), grupos (si agrupa), num_filas, resumen,
+         version, preview, incremental, reglas_distintas}
+    """
+    try:
+        data = request.json
+        _check_file_id(data.get('file_id'))
+        view = get_view(data.get('id'))
+        if view is None: return jsonify({"error": "Vista no encontrada"}), 404
+        dataset = _get_dataset()
+
+        with dataset.lock:
+            schema = dataset.schema()
+            if view['group_by'] not in schema.columns:
+                view = {**view, 'group_by': ''}
+            mat = materialized.get(dataset, view, dataset.profile.amount)
+            result = {
+                "view": view, "num_filas": len(mat.members), "resumen": _format_kpis(*mat.totals()),
+                "version": dataset.version, "preview": dataset.preview, "incremental": not mat.rebuilt
+            }
+            if view['view_type'] == 'detailed':
+                result['data'] = _client_rows(dataset.rows(mat.row_ids))
+            grupos = mat.groups()
+            if grupos is not None:
+                result['grupos'] = grupos.fillna(0).to_dict('records')
+
+        result['reglas_distintas'] = 'rules' in view and (
+            view['rules'] != [normalize_rule(r) for r in load_rules()] or view['settings'] != load_settings()
+        )
+        return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 # ==============================================================================
-# 9. RUTAS: HISTORIAL & EXPORTACIÓN
+# 10. RUTAS: HISTORIAL & EXPORTACIÓN
 # ==============================================================================
 
-@app.route('/api/undo_change', methods=['POST'])
+def _undo_ids(last: dict) -> tuple:
+    """
+    Filas y celdas que cambian al deshacer `last` (entrada de la pila de deshacer).
+
+    Returns:
+        tuple: (affected_row_id, updated, added, removed, cells).
+    """
+    if last['action'] == 'update':
+        return last['row_id'], [last['row_id']], [], [], [(last['row_id'], last['columna'])]
+    if last['action'] in ('bulk_update', 'find_replace'):
+        cells = patch_cells(last['patch'])
+        return 'bulk', list({rid for rid, _ in cells}), [], [], cells
+    if last['action'] == 'batch_update':
+        cells = [(c['row_id'], c['columna']) for c in last['changes']]
+        return 'bulk', [c['row_id'] for c in last['changes']], [], [], cells
+    if last['action'] == 'add':
+        return None, [], [], [last['row_id']], []
+    if last['action'] == 'delete':
+        return last['deleted_row']['_row_id'], [], [last['deleted_row']['_row_id']], [], []
+    return 'bulk', [], list(last['deleted_rows']['_row_id']), [], []
+
+@bp.route('/api/undo_change', methods=['POST'])
 def undo_change():
     try:
         _check_file_id(request.json.get('file_id'))
         hist = session.get('history', [])
         if not hist: return jsonify({"error": "Nada que deshacer"}), 404
-        
+
         last = hist.pop()
-        data = session.get('df_staging')
+        filtros = request.json.get('filtros_activos')
+        dataset = _get_dataset()
         affected_id = None
-        
-        # Restaurar según tipo de acción
-        if last['action'] == 'update':
-            for r in data:
-                if str(r['_row_id']) == str(last['row_id']):
-                    r[last['columna']] = last['old_val']
-                    r['_row_status'] = _check_row_completeness(r)
+        updated, added, removed, cells = [], [], [], []
+
+        with dataset.lock:
+            df = dataset.df
+            before = _derived_state(df)
+
+            # Nadie cambió nada después de esta acción: se vuelve a la versión
+            # anterior, que se conserva (comparte las columnas no editadas)
+            base = last.get('base_version')
+            reverted = base is not None and dataset.can_revert(base)
+            if reverted:
+                affected_id, updated, added, removed, cells = _undo_ids(last)
+                version = dataset.revert(base, updated, added, removed, cells, author=_client_id())
+                df = dataset.df
+
+            # Restaurar según tipo de acción
+            elif last['action'] == 'update':
+                pos = _row_positions(df, [last['row_id']])[0]
+                if pos >= 0:
+                    allow_values(df, last['columna'], [last['old_val']])
+                    df.iat[pos, df.columns.get_loc(last['columna'])] = last['old_val']
                     affected_id = last['row_id']
-                    break
-        
-        elif last['action'] in ('bulk_update', 'find_replace'):
-            restore_map = {c['row_id']: c['old_val'] for c in last['changes']}
-            for r in data:
-                if str(r['_row_id']) in restore_map:
-                    r[last['columna']] = restore_map[str(r['_row_id'])]
-            affected_id = 'bulk'
-            
-        elif last['action'] == 'add':
-            data = [r for r in data if str(r['_row_id']) != str(last['row_id'])]
-            
-        elif last['action'] == 'delete':
-            data.insert(last['original_index'], last['deleted_row'])
-            affected_id = last['deleted_row']['_row_id']
-            
-        elif last['action'] in ('bulk_delete', 'bulk_delete_duplicates'):
-            data.extend(last['deleted_rows'])
-            data.sort(key=lambda x: int(x['_row_id']))
-            affected_id = 'bulk'
-
-        # Recálculo final
-        df = pd.DataFrame.from_records(data)
-        df = _recalculate_priorities(df)
-        session['df_staging'] = df.to_dict('records')
+                    updated = [last['row_id']]
+                    cells = [(last['row_id'], last['columna'])]
+
+            elif last['action'] in ('bulk_update', 'find_replace'):
+                revert_patch(df, last['patch'])
+                affected_id, updated, _, _, cells = _undo_ids(last)
+
+            elif last['action'] == 'batch_update':
+                _apply_cell_edits(df, [
+                    {'row_id': c['row_id'], 'columna': c['columna'], 'valor': c['old_val']}
+                    for c in last['changes']
+                ])
+                affected_id = 'bulk'
+                updated = [c['row_id'] for c in last['changes']]
+                cells = [(c['row_id'], c['columna']) for c in last['changes']]
+
+            elif last['action'] == 'add':
+                df = df[df['_row_id'].astype(str) != str(last['row_id'])].reset_index(drop=True)
+                removed = [last['row_id']]
+
+            elif last['action'] == 'delete':
+                idx = last['original_index']
+                df = concat_rows([df.iloc[:idx], pd.DataFrame([last['deleted_row']]), df.iloc[idx:]])
+                affected_id = last['deleted_row']['_row_id']
+                added = [affected_id]
+
+            elif last['action'] in ('bulk_delete', 'bulk_delete_duplicates'):
+                df = concat_rows([df, pd.DataFrame(last['deleted_rows'])])
+                df = df.sort_values('_row_id', key=lambda s: s.astype(int)).reset_index(drop=True)
+                affected_id = 'bulk'
+                added = list(last['deleted_rows']['_row_id'])
+
+            # Recálculo final
+            if not reverted:
+                df, version = _commit_with_priorities(dataset, df, updated, added, removed)
+            resumen = _view_kpis(dataset, df, filtros)
+            delta = _build_delta(df, before, cells, added, removed, filtros)
         session['history'] = hist
-        
+
         return jsonify({
-            "status": "success", "history_count": len(hist),
-            "resumen": _calculate_kpis(df), "affected_row_id": affected_id
+            "status": "success", "history_count": len(hist), "resumen": resumen,
+            "delta": delta, "affected_row_id": affected_id, "version": version
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/commit_changes', methods=['POST'])
+@bp.route('/api/commit_changes', methods=['POST'])
 def commit_changes():
     _check_file_id(request.json.get('file_id'))
     session['history'] = []
     return jsonify({"status": "success", "message": "Historial limpiado."})
 
-@app.route('/api/download_audit_log', methods=['POST'])
+@bp.route('/api/download_audit_log', methods=['POST'])
 def download_audit():
     _check_file_id(request.json.get('file_id'))
     logs = session.get('audit_log', [])
@@ -756,19 +1779,22 @@ def download_audit():
     out.seek(0)
     return send_file(out, as_attachment=True, download_name='audit_log.txt', mimetype='text/plain')
 
-@app.route('/api/download_excel', methods=['POST'])
+@bp.route('/api/download_excel', methods=['POST'])
 def download_excel():
     return _generic_download(request.json, grouped=False)
 
-@app.route('/api/download_excel_grouped', methods=['POST'])
+@bp.route('/api/download_excel_grouped', methods=['POST'])
 def download_excel_grouped():
     return _generic_download(request.json, grouped=True)
 
 def _generic_download(data, grouped):
     _check_file_id(data.get('file_id'))
-    df = _get_df_from_session_as_df()
-    df = aplicar_filtros_dinamicos(df, data.get('filtros_activos'))
-    
+    dataset = _get_dataset()
+    bus.progress(dataset.file_id, 'export', 10, "Preparando datos...")
+    with dataset.lock:
+        df = dataset.query(data.get('filtros_activos'))
+
+    bus.progress(dataset.file_id, 'export', 40, f"Generando Excel ({len(df)} filas)...")
     out = io.BytesIO()
     with pd.ExcelWriter(out, engine='xlsxwriter') as writer:
         if grouped:
@@ -776,16 +1802,17 @@ def _generic_download(data, grouped):
             gb = df.groupby(col).size().reset_index(name='count') # Placeholder simple
             gb.to_excel(writer, index=False)
         else:
-            cols = data.get('columnas_visibles', df.columns)
+            cols = data.get('columnas_visibles') or _client_columns(df)
             df[[c for c in cols if c in df.columns]].to_excel(writer, index=False)
-            
+
     out.seek(0)
+    bus.progress(dataset.file_id, 'export', 100, "Excel generado.")
     name = 'agrupado.xlsx' if grouped else 'filtrado.xlsx'
     return send_file(out, as_attachment=True, download_name=name, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
 
 # ==============================================================================
-# 10. ARRANQUE
+# 11. ARRANQUE
 # ==============================================================================
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,73 @@
+"""
+assets.py
+---------
+Caché HTTP de recursos que no cambian entre peticiones.
+
+Estándares: Google Python Style Guide.
+- `TranslationBundles`: el JSON de cada idioma se serializa una sola vez al
+  arrancar, con un ETag fuerte (hash del contenido); `/api/get_translations`
+  responde 304 si el navegador ya lo tiene.
+- `StaticManifest`: hash del contenido de cada archivo de `static/`. Las URLs
+  de `url_for('static', ...)` llevan `?v=<hash>`, así el navegador puede
+  guardarlas un año sin revalidar: si el archivo cambia, cambia la URL.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# Caché de un año para recursos versionados por contenido.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class TranslationBundles:
+    """JSON precompilado por idioma: {lang: (cuerpo, etag)}."""
+
+    def __init__(self, languages: dict, default: str = 'es'):
+        self.default = default
+        self._bundles = {}
+        for lang, texts in languages.items():
+            body = json.dumps(texts, ensure_ascii=False, sort_keys=True).encode('utf-8')
+            self._bundles[lang] = (body, _digest(body))
+
+    def get(self, lang: str | None) -> tuple[bytes, str]:
+        """Cuerpo y ETag del idioma (el idioma por defecto si no existe)."""
+        return self._bundles.get(lang) or self._bundles[self.default]
+
+
+class StaticManifest:
+    """
+    Hash de contenido de los archivos estáticos.
+
+    Se recalcula solo si cambian la fecha o el tamaño del archivo (útil en
+    desarrollo, donde `script.js` se edita con el servidor en marcha).
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def version(self, filename: str) -> str | None:
+        """Hash del archivo, o None si no existe."""
+        path = os.path.join(self.folder, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._cache.get(filename)
+            if cached and cached[0] == key:
+                return cached[1]
+        with open(path, 'rb') as f:
+            digest = _digest(f.read())
+        with self._lock:
+            self._cache[filename] = (key, digest)
+        return digest
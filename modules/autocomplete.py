@@ -1,8 +1,12 @@
 # modules/autocomplete.py (Versión 9.0 - Dinámico)
 # Módulo dedicado a generar las opciones de autocompletado.
 
-import pandas as pd
+from __future__ import annotations
+
 from .json_manager import cargar_json, USER_LISTS_FILE
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
 
 def get_autocomplete_options(df: pd.DataFrame) -> dict:
     """
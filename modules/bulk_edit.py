@@ -0,0 +1,195 @@
+"""
+bulk_edit.py
+------------
+Mutaciones masivas del borrador con máscaras: actualización de una columna,
+buscar/reemplazar en varias columnas y parches compactos para deshacer.
+
+Estándares: Google Python Style Guide.
+Antes cada ruta masiva armaba una edición {row_id, columna, valor} por fila y
+la pasaba por `_apply_cell_edits`. Aquí todo trabaja por columna:
+
+- `select_rows` marca las filas de una selección de `_row_id`.
+- `match_mask` busca un texto en una columna: coincidencia exacta (`EXACT`),
+  parcial (`CONTAINS`) o expresión regular (`REGEX`). En las categóricas se
+  evalúa sobre los valores distintos.
+- `replaced_values` calcula el reemplazo una vez por valor distinto de las
+  celdas que coinciden.
+- `assign` escribe una columna con una sola asignación y devuelve las celdas
+  que cambiaron.
+- `undo_patch` agrupa esas celdas por valor anterior:
+  [[valor_anterior, [row_id, ...]], ...]. Una edición de 50k filas con tres
+  estados distintos ocupa tres grupos en la sesión, no 50k dicts.
+"""
+
+from __future__ import annotations
+
+import re
+import warnings
+
+from .column_types import allow_values, is_categorical
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+EXACT, CONTAINS, REGEX = 'exact', 'contains', 'regex'
+MATCH_MODES = (EXACT, CONTAINS, REGEX)
+
+
+# ==============================================================================
+# SELECCIÓN Y BÚSQUEDA
+# ==============================================================================
+
+def select_rows(df: pd.DataFrame, row_ids) -> np.ndarray:
+    """Máscara de las filas cuyo `_row_id` está en `row_ids` (comparación como texto)."""
+    ids = {str(r) for r in row_ids}
+    if not ids:
+        return np.zeros(len(df), dtype=bool)
+    return df['_row_id'].astype(str).isin(ids).to_numpy()
+
+
+def _texts(series: pd.Series) -> tuple[pd.Series, np.ndarray | None]:
+    """
+    Texto de una columna (los nulos como "").
+
+    Returns:
+        tuple: (valores distintos, códigos) en las categóricas — el código -1
+            (nulo) apunta al "" añadido al final —; (texto por fila, None) en el resto.
+    """
+    if is_categorical(series):
+        values = np.append(series.cat.categories.astype(str).to_numpy(dtype=object), '')
+        return pd.Series(values, dtype=object), series.cat.codes.to_numpy()
+    return series.fillna('').astype(str), None
+
+
+def _pattern(find: str, mode: str, match_case: bool) -> re.Pattern:
+    """Expresión compilada para `CONTAINS` / `REGEX`."""
+    if not find:
+        raise ValueError("Indique el texto a buscar.")
+    flags = 0 if match_case else re.IGNORECASE
+    try:
+        return re.compile(re.escape(find) if mode == CONTAINS else find, flags)
+    except re.error as e:
+        raise ValueError(f"Expresión regular inválida: {e}") from e
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Modo de búsqueda desconocido: {mode}")
+
+
+def match_mask(series: pd.Series, find: str, mode: str = EXACT, match_case: bool = True) -> np.ndarray:
+    """
+    Celdas de `series` que coinciden con `find`.
+
+    Args:
+        find (str): Texto (o expresión regular en modo `REGEX`). En modo
+            `EXACT` "" busca las celdas vacías.
+        mode (str): `EXACT` (celda completa), `CONTAINS` o `REGEX`.
+        match_case (bool): Distinguir mayúsculas y minúsculas.
+
+    Raises:
+        ValueError: Modo desconocido, texto vacío en `CONTAINS`/`REGEX` o
+            expresión regular inválida.
+    """
+    _check_mode(mode)
+    texts, codes = _texts(series)
+    if mode == EXACT:
+        hits = texts == find if match_case else texts.str.lower() == find.lower()
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)  # "...has match groups" (se usan al reemplazar)
+            hits = texts.str.contains(_pattern(find, mode, match_case), regex=True, na=False)
+    hits = hits.to_numpy(dtype=bool)
+    return hits[codes] if codes is not None else hits
+
+
+def replaced_values(series: pd.Series, mask: np.ndarray, find: str, replace, mode: str = EXACT,
+                    match_case: bool = True) -> np.ndarray:
+    """
+    Valor nuevo de cada celda de `mask` (alineado con `np.flatnonzero(mask)`).
+
+    `EXACT` sustituye la celda completa por `replace`; `CONTAINS` sustituye
+    cada aparición de `find`; `REGEX` admite referencias a grupos (`\\1`).
+    """
+    _check_mode(mode)
+    positions = np.flatnonzero(mask)
+    if mode == EXACT:
+        return np.full(len(positions), replace, dtype=object)
+
+    texts, codes = _texts(series)
+    if codes is None:
+        codes, distinct = pd.factorize(texts.to_numpy(dtype=object)[positions])
+        texts = pd.Series(distinct, dtype=object)
+    else:
+        codes = codes[positions]
+    replace = '' if replace is None else str(replace)
+    if mode == CONTAINS:
+        replace = replace.replace('\\', r'\\')  # Texto literal, sin referencias a grupos
+    try:
+        nuevos = texts.str.replace(_pattern(find, mode, match_case), replace, regex=True)
+    except re.error as e:
+        raise ValueError(f"Reemplazo inválido: {e}") from e
+    return nuevos.to_numpy(dtype=object)[codes]
+
+
+# ==============================================================================
+# ESCRITURA Y DESHACER
+# ==============================================================================
+
+def assign(df: pd.DataFrame, column: str, positions: np.ndarray, values) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Escribe `values` en las filas `positions` de `column` (una sola asignación).
+
+    Args:
+        positions (np.ndarray): Posiciones físicas de las filas.
+        values: Un valor para todas, o un array alineado con `positions`.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (posiciones, valores anteriores) de las
+            celdas que cambiaron.
+    """
+    if isinstance(values, np.ndarray):
+        nuevos = values.astype(object, copy=False)
+    else:
+        nuevos = np.full(len(positions), values, dtype=object)
+    viejos = df[column].to_numpy(dtype=object)[positions]
+    distintos = viejos != nuevos
+    positions, viejos, nuevos = positions[distintos], viejos[distintos], nuevos[distintos]
+    if len(positions):
+        allow_values(df, column, nuevos)
+        df.iloc[positions, df.columns.get_loc(column)] = nuevos
+    return positions, viejos
+
+
+def undo_patch(row_ids: np.ndarray, old_values: np.ndarray) -> list:
+    """
+    Parche de deshacer de una columna: celdas agrupadas por valor anterior.
+
+    Returns:
+        list: [[valor_anterior, [row_id, ...]], ...] (tipos nativos, para la sesión).
+    """
+    codes, distinct = pd.factorize(pd.Series(old_values, dtype=object), use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    grupos = np.split(np.asarray(row_ids)[order], np.flatnonzero(np.diff(codes[order])) + 1)
+    # `factorize` numera los valores por orden de aparición: el grupo i es `distinct[i]`
+    return [[valor, ids.tolist()] for valor, ids in zip(distinct.tolist(), grupos)]
+
+
+def patch_cells(patch: dict) -> list:
+    """Celdas (row_id, columna) de un parche {columna: grupos}."""
+    return [(rid, columna) for columna, grupos in patch.items() for _, ids in grupos for rid in ids]
+
+
+def revert_patch(df: pd.DataFrame, patch: dict) -> None:
+    """Vuelve a escribir los valores anteriores de un parche (filas que aún existen)."""
+    row_ids = pd.Index(df['_row_id'].astype(str))
+    for columna, grupos in patch.items():
+        if columna not in df.columns or not grupos:
+            continue
+        ids = [str(rid) for _, grupo in grupos for rid in grupo]
+        viejos = np.empty(len(ids), dtype=object)
+        viejos[:] = [valor for valor, grupo in grupos for _ in grupo]
+        positions = row_ids.get_indexer(ids)
+        existe = positions >= 0
+        assign(df, columna, positions[existe], viejos[existe])
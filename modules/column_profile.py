@@ -0,0 +1,254 @@
+"""
+column_profile.py
+-----------------
+Inferencia de tipos de columna al cargar y caché de valores ya convertidos.
+
+Estándares: Google Python Style Guide.
+El Excel se lee como texto. Antes cada consumidor adivinaba las columnas por
+nombre (`_find_monto_column`, `_find_invoice_column`, `_find_pay_group_column`)
+y volvía a convertir los montos en cada KPI o agrupación. Ahora:
+
+- `infer_profile` recorre una vez las columnas al cargar (`cargar_datos`) y
+  clasifica cada una como monto, fecha, identificador, email, categórica o
+  texto (por nombre y por una muestra de sus valores). También resuelve las
+  columnas con papel propio: monto, número de factura y Pay Group.
+- `ParsedValues` guarda, junto al texto que ve el usuario, los montos como
+  float y las fechas como datetime64, indexados por `_row_id`. Se mantiene como
+  `QualityIndex`: se construye en el primer uso y cada commit vuelve a
+  convertir solo las celdas editadas de esas columnas.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import warnings
+from dataclasses import dataclass, field
+
+from .column_types import is_categorical
+from .data_quality import user_columns
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+AMOUNT, DATE, IDENTIFIER, EMAIL, CATEGORY, TEXT = 'amount', 'date', 'identifier', 'email', 'category', 'text'
+# Tipos cuyos valores se guardan ya convertidos.
+PARSED_KINDS = (AMOUNT, DATE)
+
+# Nombres (en minúsculas) de las columnas con papel propio.
+AMOUNT_NAMES = ('monto', 'total', 'amount', 'total amount')
+INVOICE_NAMES = ('invoice #', 'invoice number', 'n° factura', 'factura', 'invoice id')
+PAY_GROUP_NAMES = ('pay group', 'grupo de pago', 'paygroup')
+
+# Valores distintos que se examinan por columna y fracción que debe cumplir el patrón.
+SAMPLE_SIZE = 500
+MATCH_RATIO = 0.9
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[a-z]{2,}$', re.IGNORECASE)
+_MONEY_RE = re.compile(r'^-?\$?\s?-?(\d{1,3}(,\d{3})+|\d+)\.\d{1,2}$|^-?\$\s?-?[\d,]+$')
+_DATE_RE = re.compile(
+    r'^\d{4}-\d{1,2}-\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?$'
+    r'|^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}( \d{1,2}:\d{2}(:\d{2})?)?$'
+)
+_ID_NAME_RE = re.compile(r'(#|\bid\b|\bnumber\b|\bnum\b|\bno\.?$|n°)')
+
+
+# ==============================================================================
+# CONVERSIÓN
+# ==============================================================================
+
+def _by_distinct(series: pd.Series, convert) -> pd.Series:
+    """Aplica `convert` a los valores distintos (categóricas) o a toda la columna."""
+    if is_categorical(series):
+        cats = convert(pd.Series(series.cat.categories.astype(str))).to_numpy()
+        values = np.append(cats, convert(pd.Series([''])).to_numpy())[series.cat.codes.to_numpy()]
+        return pd.Series(values, index=series.index)
+    return convert(series)
+
+
+def _amounts(series: pd.Series) -> pd.Series:
+    clean = series.astype(str).str.replace(r'[$,]', '', regex=True)
+    return pd.to_numeric(clean, errors='coerce').fillna(0).astype('float64')
+
+
+def _dates(series: pd.Series) -> pd.Series:
+    text = series.astype(str).str.strip()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)  # "Could not infer format..."
+        parsed = pd.to_datetime(text, errors='coerce')
+        # Formato inferido del primer valor: los que no encajan se reintentan uno a uno
+        retry = parsed.isna() & text.ne('') & text.ne('nan')
+        if retry.any():
+            parsed[retry] = pd.to_datetime(text[retry], errors='coerce', format='mixed')
+    return parsed
+
+
+def parse_amounts(series: pd.Series) -> pd.Series:
+    """Convierte una columna de montos en texto ("$1,234.50") a float (0 si no es número)."""
+    return _by_distinct(series, _amounts)
+
+
+def parse_dates(series: pd.Series) -> pd.Series:
+    """Convierte una columna de fechas en texto a datetime64 (NaT si no es fecha)."""
+    return _by_distinct(series, _dates)
+
+
+_PARSERS = {AMOUNT: parse_amounts, DATE: parse_dates}
+
+
+# ==============================================================================
+# INFERENCIA
+# ==============================================================================
+
+@dataclass
+class ColumnProfile:
+    """
+    Tipo de cada columna del usuario y columnas con papel propio.
+
+    Attributes:
+        kinds (dict): {columna: AMOUNT | DATE | IDENTIFIER | EMAIL | CATEGORY | TEXT}.
+        amount (str | None): Columna de monto de los KPIs y agrupaciones.
+        invoice (str | None): Columna de número de factura.
+        pay_group (str | None): Columna 'Pay Group' de la prioridad base.
+    """
+    kinds: dict = field(default_factory=dict)
+    amount: str | None = None
+    invoice: str | None = None
+    pay_group: str | None = None
+
+    def columns(self, *kinds) -> list:
+        """Columnas de los tipos indicados (en el orden del archivo)."""
+        return [c for c, k in self.kinds.items() if k in kinds]
+
+    def compatible(self, df: pd.DataFrame) -> bool:
+        """False si cambiaron las columnas del dataset (hay que volver a inferir)."""
+        return list(self.kinds) == user_columns(df)
+
+
+def _by_name(columns, names) -> str | None:
+    return next((c for c in columns if str(c).lower().strip() in names), None)
+
+
+def _sample(series: pd.Series) -> list:
+    """Hasta `SAMPLE_SIZE` valores distintos no vacíos (de las primeras filas)."""
+    if is_categorical(series):
+        values = series.cat.categories.astype(str)
+    else:
+        values = series.head(SAMPLE_SIZE * 10).dropna().astype(str).unique()
+    return [v for v in (str(x).strip() for x in values[:SAMPLE_SIZE * 2]) if v and v != 'nan'][:SAMPLE_SIZE]
+
+
+def _ratio(values: list, pattern: re.Pattern) -> float:
+    return sum(1 for v in values if pattern.match(v)) / len(values)
+
+
+def _kind(name: str, series: pd.Series) -> str:
+    """Tipo de una columna por su nombre y una muestra de sus valores."""
+    lower = str(name).lower().strip()
+    if lower in AMOUNT_NAMES:
+        return AMOUNT
+    if lower in INVOICE_NAMES:
+        return IDENTIFIER
+
+    values = _sample(series)
+    if values:
+        if _ratio(values, _EMAIL_RE) >= MATCH_RATIO:
+            return EMAIL
+        if _ratio(values, _DATE_RE) >= MATCH_RATIO:
+            return DATE
+        if _ratio(values, _MONEY_RE) >= MATCH_RATIO:
+            return AMOUNT
+        if _ID_NAME_RE.search(lower) and not is_categorical(series):
+            return IDENTIFIER
+    return CATEGORY if is_categorical(series) else TEXT
+
+
+def infer_profile(df: pd.DataFrame) -> ColumnProfile:
+    """
+    Clasifica las columnas del usuario (una pasada, sobre muestras de valores).
+
+    Las columnas con papel propio se buscan primero por nombre (como las
+    heurísticas anteriores); si no hay columna de monto con nombre conocido se
+    usa la primera con formato de dinero. Con un DataFrame vacío (solo
+    columnas) la clasificación es únicamente por nombre.
+    """
+    columns = user_columns(df)
+    kinds = {col: _kind(col, df[col]) for col in columns}
+    amount = _by_name(columns, AMOUNT_NAMES) or next((c for c in columns if kinds[c] == AMOUNT), None)
+    return ColumnProfile(
+        kinds=kinds, amount=amount,
+        invoice=_by_name(columns, INVOICE_NAMES), pay_group=_by_name(columns, PAY_GROUP_NAMES),
+    )
+
+
+# ==============================================================================
+# VALORES CONVERTIDOS
+# ==============================================================================
+
+class ParsedValues:
+    """
+    Montos y fechas ya convertidos de un dataset, indexados por `_row_id`.
+
+    Attributes:
+        kinds (dict): {columna: AMOUNT | DATE} de las columnas convertidas.
+        frame (pd.DataFrame): Un valor convertido por fila y columna.
+    """
+
+    def __init__(self, df: pd.DataFrame, profile: ColumnProfile):
+        self.kinds = {c: k for c, k in profile.kinds.items() if k in PARSED_KINDS and c in df.columns}
+        if profile.amount in df.columns:
+            self.kinds[profile.amount] = AMOUNT
+        self.frame = self._parse(df)
+
+    def _parse(self, rows: pd.DataFrame, columns=None) -> pd.DataFrame:
+        columns = list(self.kinds) if columns is None else columns
+        index = pd.Index(rows['_row_id'].to_numpy(), name='_row_id')
+        return pd.DataFrame({c: _PARSERS[self.kinds[c]](rows[c]).to_numpy() for c in columns}, index=index)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria aproximada."""
+        size = int(self.frame.memory_usage(index=False).sum()) + self.frame.index.nbytes
+        if self.frame.index.dtype == object:
+            size += sum(sys.getsizeof(r) for r in self.frame.index)
+        return size
+
+    def compatible(self, df: pd.DataFrame) -> bool:
+        """False si alguna columna convertida ya no existe."""
+        return all(c in df.columns for c in self.kinds)
+
+    def update(self, rows: pd.DataFrame, cells=None) -> None:
+        """
+        Vuelve a convertir filas nuevas o editadas.
+
+        Args:
+            rows (pd.DataFrame): Filas tocadas (con `_row_id`).
+            cells (set, optional): Celdas editadas (row_id, columna) en texto. Si
+                se indican, de las filas ya conocidas solo se convierten esas celdas.
+        """
+        if rows.empty or not self.kinds:
+            return
+        known = rows['_row_id'].isin(self.frame.index).to_numpy()
+        if known.any():
+            old = rows[known]
+            if cells is None:
+                self.frame.loc[old['_row_id'].to_numpy(), list(self.kinds)] = self._parse(old).to_numpy()
+            else:
+                ids = old['_row_id'].astype(str).to_numpy()
+                for col in {c for _, c in cells} & set(self.kinds):
+                    edited = np.fromiter(((r, col) in cells for r in ids), dtype=bool, count=len(ids))
+                    if edited.any():
+                        part = old[edited]
+                        self.frame.loc[part['_row_id'].to_numpy(), col] = self._parse(part, [col])[col].to_numpy()
+        if not known.all():
+            self.frame = pd.concat([self.frame, self._parse(rows[~known])])
+
+    def remove(self, row_ids) -> None:
+        """Quita filas eliminadas."""
+        if row_ids:
+            self.frame = self.frame[~self.frame.index.astype(str).isin({str(r) for r in row_ids})]
+
+    def values(self, column: str, row_ids: pd.Series) -> pd.Series:
+        """Valores convertidos de `column` para `row_ids`, alineados con ellos."""
+        return pd.Series(self.frame[column].reindex(row_ids.to_numpy()).to_numpy(), index=row_ids.index)
@@ -0,0 +1,89 @@
+"""
+column_types.py
+---------------
+Representación compacta de las columnas del borrador.
+
+Estándares: Google Python Style Guide.
+El Excel se lee con `dtype=str`: cada celda sería un objeto de texto propio.
+Columnas como Status, Assignee, Pay group, Currency Code o `_priority` tienen
+unas pocas decenas de valores distintos, así que se guardan como categóricas
+(un código entero por fila + la lista de valores). El resto queda con el tipo
+de texto por defecto de pandas (respaldado por Arrow si está `pyarrow`).
+
+Las categóricas no aceptan valores nuevos sin declararlos: toda escritura de
+celdas debe pasar antes por `allow_values`, y las altas de filas por `concat_rows`.
+"""
+
+from __future__ import annotations
+
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+# Categórica si hay como mucho este número de valores distintos...
+CATEGORY_MAX_UNIQUE = 2000
+# ...y no superan esta fracción de las filas (si no, no compensa).
+CATEGORY_MAX_RATIO = 0.5
+# Columnas que nunca se convierten.
+EXCLUDED_COLUMNS = ('_row_id',)
+
+
+def is_categorical(series: pd.Series) -> bool:
+    """True si la columna es categórica (convertida por `compact_frame`)."""
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def compact_frame(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """
+    Convierte a categóricas las columnas de texto con pocos valores distintos.
+
+    Modifica `df` y lo devuelve. Es idempotente: las columnas ya categóricas
+    o numéricas se dejan como están.
+
+    Args:
+        df (pd.DataFrame): Borrador.
+        columns (iterable, optional): Limitar a estas columnas (por defecto, todas).
+    """
+    n = len(df)
+    if not n:
+        return df
+    for col in (df.columns if columns is None else columns):
+        if col in EXCLUDED_COLUMNS or col not in df.columns:
+            continue
+        s = df[col]
+        if is_categorical(s) or not (pd.api.types.is_string_dtype(s) or s.dtype == object):
+            continue
+        unique = s.nunique(dropna=False)
+        if unique <= CATEGORY_MAX_UNIQUE and unique <= max(1, n * CATEGORY_MAX_RATIO):
+            df[col] = s.astype('category')
+        elif s.dtype == object:
+            df[col] = s.astype('str')
+    return df
+
+
+def allow_values(df: pd.DataFrame, column: str, values) -> None:
+    """
+    Declara en una columna categórica los valores que se van a escribir.
+
+    Las categorías se mantienen ordenadas, así las agrupaciones siguen
+    saliendo en orden alfabético.
+    """
+    s = df[column]
+    if not is_categorical(s):
+        return
+    known = set(s.cat.categories)
+    # Valores distintos primero: una edición masiva escribe miles de veces los mismos
+    distinct = pd.Series(list(values), dtype=object).unique()
+    new = {v for v in distinct if not pd.isna(v) and v not in known}
+    if new:
+        df[column] = s.cat.set_categories(sorted(known | new, key=str))
+
+
+def concat_rows(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """`pd.concat` de filas que conserva las columnas categóricas del primer DataFrame."""
+    base = frames[0]
+    out = pd.concat(frames, ignore_index=True)
+    categorical = [c for c in base.columns if is_categorical(base[c]) and not is_categorical(out[c])]
+    for col in categorical:
+        out[col] = out[col].astype('category')
+    return out
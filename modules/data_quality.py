@@ -0,0 +1,262 @@
+"""
+data_quality.py
+---------------
+Calidad de datos: qué celdas están vacías o en cero y qué columnas hacen que
+una fila sea "Incompleto".
+
+Estándares: Google Python Style Guide.
+Una sola definición para carga y edición (antes `cargar_datos` y las rutas de
+edición usaban reglas distintas):
+- Solo cuentan las columnas del usuario (las internas `_...` se ignoran).
+- Una celda está vacía si es nula o su texto sin espacios es ""; en cero si es "0".
+- Una fila es "Incompleto" si tiene alguna celda vacía o en cero.
+
+`QualityIndex` mantiene, por dataset, la matriz de celdas vacías/cero de cada
+fila (su máscara de columnas incompletas) y los conteos por columna. Se
+actualiza solo con las filas que cambian, así el resumen cuesta O(columnas).
+"""
+
+from __future__ import annotations
+
+import sys
+from collections import defaultdict
+
+from .column_types import is_categorical
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+COMPLETO = "Completo"
+INCOMPLETO = "Incompleto"
+
+
+def user_columns(df: pd.DataFrame) -> list:
+    """Columnas que cuentan para la completitud (excluye las internas `_...`)."""
+    return [c for c in df.columns if not str(c).startswith('_')]
+
+
+def classify(df: pd.DataFrame, columns: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Clasifica las celdas de `columns` (vectorizado).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Matrices booleanas (filas x columnas)
+            de celdas vacías y de celdas en cero.
+    """
+    if not columns or df.empty:
+        shape = (len(df), len(columns))
+        return np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool)
+
+    blank = np.empty((len(df), len(columns)), dtype=bool)
+    zero = np.empty((len(df), len(columns)), dtype=bool)
+    for i, col in enumerate(columns):
+        blank[:, i], zero[:, i] = _classify_column(df[col])
+    return blank, zero
+
+
+def _classify_column(series: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Celdas vacías y en cero de una columna (categóricas: sobre sus valores distintos)."""
+    if is_categorical(series):
+        texto = series.cat.categories.astype(str).str.strip()
+        # Código -1 (nulo): vacía
+        blank = np.append(texto == "", True)
+        zero = np.append(texto == "0", False)
+        codes = series.cat.codes.to_numpy()
+        return blank[codes], zero[codes]
+    texto = series.astype(str).str.strip()
+    return (series.isna() | (texto == "")).to_numpy(dtype=bool), (texto == "0").to_numpy(dtype=bool)
+
+
+def row_status(df: pd.DataFrame) -> np.ndarray:
+    """Estado 'Completo'/'Incompleto' de cada fila de `df`."""
+    blank, zero = classify(df, user_columns(df))
+    return np.where((blank | zero).any(axis=1), INCOMPLETO, COMPLETO)
+
+
+def edited_row_status(rows: pd.DataFrame, cells: set, previous: pd.DataFrame | None = None) -> np.ndarray:
+    """
+    `row_status` de filas en las que solo cambiaron las celdas `cells`.
+
+    Solo se clasifican las columnas editadas: una celda editada vacía o en cero
+    deja la fila "Incompleto" y una fila que ya era "Completo" sigue completa.
+    Con `previous`, una fila "Incompleto" cuyas celdas editadas no estaban
+    vacías ni en cero sigue incompleta (la celda que falta es otra y no cambió).
+    Se reclasifican enteras las demás "Incompleto" y las que no tienen celdas
+    declaradas.
+
+    Args:
+        rows (pd.DataFrame): Filas tocadas, con su `_row_status` anterior.
+        cells (set): Celdas editadas (row_id en texto, columna).
+        previous (pd.DataFrame, optional): Borrador anterior al cambio (mismas
+            etiquetas de índice para las filas que ya existían).
+    """
+    ids = rows['_row_id'].astype(str)
+    por_columna = defaultdict(set)
+    for rid, col in cells:
+        por_columna[col].add(rid)
+
+    anteriores = None
+    if previous is not None:
+        anteriores = previous.reindex(rows.index)
+        # Solo valen las etiquetas que siguen siendo la misma fila
+        misma_fila = anteriores['_row_id'].astype(str).to_numpy() == ids.to_numpy()
+
+    declaradas = np.zeros(len(rows), dtype=bool)
+    incompletas = np.zeros(len(rows), dtype=bool)
+    faltaban = np.zeros(len(rows), dtype=bool)  # Alguna celda editada estaba vacía/en cero (o no se sabe)
+    for col, rids in por_columna.items():
+        if col not in rows.columns or str(col).startswith('_'):
+            continue
+        editadas = ids.isin(rids).to_numpy()
+        blank, zero = _classify_column(rows[col][editadas])
+        declaradas |= editadas
+        incompletas[editadas] |= blank | zero
+        if anteriores is not None and col in anteriores.columns:
+            blank, zero = _classify_column(anteriores[col][editadas])
+            faltaban[editadas] |= blank | zero | ~misma_fila[editadas]
+        else:
+            faltaban |= editadas
+
+    status = np.where(incompletas, INCOMPLETO, COMPLETO).astype(object)
+    completas = rows['_row_status'].to_numpy(dtype=object) == COMPLETO
+    siguen_incompletas = declaradas & ~completas & ~faltaban
+    status[siguen_incompletas] = INCOMPLETO
+    pendientes = ~incompletas & ~(declaradas & completas) & ~siguen_incompletas
+    if pendientes.any():
+        status[pendientes] = row_status(rows[pendientes])
+    return status
+
+
+class QualityIndex:
+    """
+    Índice incremental de calidad de un dataset.
+
+    Attributes:
+        columns (list): Columnas del usuario, en el orden de las máscaras.
+        blank_counts (np.ndarray): Celdas vacías por columna.
+        zero_counts (np.ndarray): Celdas en cero por columna.
+        incomplete_rows (int): Filas con al menos una celda vacía o en cero.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = user_columns(df)
+        ids = df['_row_id'].astype(str).to_numpy()
+        self._slot = dict(zip(ids, range(len(ids))))
+        self._free = []
+        self._blank, self._zero = classify(df, self.columns)
+        self._live = np.ones(len(ids), dtype=bool)
+
+        self.blank_counts = self._blank.sum(axis=0)
+        self.zero_counts = self._zero.sum(axis=0)
+        self.incomplete_rows = int((self._blank | self._zero).any(axis=1).sum())
+
+    @property
+    def num_rows(self) -> int:
+        return len(self._slot)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria aproximada del índice (matrices + mapa de `_row_id` a posición)."""
+        ids = sum(sys.getsizeof(r) for r in self._slot)
+        return self._blank.nbytes + self._zero.nbytes + self._live.nbytes + sys.getsizeof(self._slot) + ids
+
+    def compatible(self, df: pd.DataFrame) -> bool:
+        """False si cambiaron las columnas del dataset (hay que reconstruir)."""
+        return user_columns(df) == self.columns
+
+    def _take_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+        # Sin huecos libres: ampliar al doble (las altas son poco frecuentes)
+        size = len(self._live)
+        grow = max(size, 16)
+        self._blank = np.vstack([self._blank, np.zeros((grow, len(self.columns)), dtype=bool)])
+        self._zero = np.vstack([self._zero, np.zeros((grow, len(self.columns)), dtype=bool)])
+        self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+        self._free = list(range(size + grow - 1, size, -1))
+        return size
+
+    def _clear(self, slots: np.ndarray) -> None:
+        """Descuenta las filas de `slots` de los totales."""
+        blank, zero = self._blank[slots], self._zero[slots]
+        self.blank_counts -= blank.sum(axis=0)
+        self.zero_counts -= zero.sum(axis=0)
+        self.incomplete_rows -= int((blank | zero).any(axis=1).sum())
+
+    def update(self, rows: pd.DataFrame) -> np.ndarray:
+        """
+        Reclasifica filas nuevas o modificadas (solo esas filas).
+
+        Args:
+            rows (pd.DataFrame): Filas actuales (con `_row_id`).
+
+        Returns:
+            np.ndarray: Estado 'Completo'/'Incompleto' de cada fila, alineado con `rows`.
+        """
+        if rows.empty:
+            return np.array([], dtype=object)
+
+        ids = rows['_row_id'].astype(str).to_numpy()
+        slots = np.array([self._slot[r] if r in self._slot else -1 for r in ids])
+        existing = slots >= 0
+        self._clear(slots[existing])
+        for i in np.flatnonzero(~existing):
+            slots[i] = self._slot[ids[i]] = self._take_slot()
+
+        blank, zero = classify(rows, self.columns)
+        self._blank[slots], self._zero[slots] = blank, zero
+        self._live[slots] = True
+
+        incompletas = (blank | zero).any(axis=1)
+        self.blank_counts += blank.sum(axis=0)
+        self.zero_counts += zero.sum(axis=0)
+        self.incomplete_rows += int(incompletas.sum())
+        return np.where(incompletas, INCOMPLETO, COMPLETO)
+
+    def remove(self, row_ids) -> None:
+        """Quita filas eliminadas del índice."""
+        slots = np.array([s for s in (self._slot.pop(str(r), None) for r in row_ids) if s is not None], dtype=int)
+        if not len(slots):
+            return
+        self._clear(slots)
+        self._blank[slots] = self._zero[slots] = self._live[slots] = False
+        self._free.extend(slots.tolist())
+
+    def row_mask(self, row_id) -> int:
+        """Máscara de bits de columnas incompletas de una fila (bit i = `columns[i]`)."""
+        slot = self._slot.get(str(row_id))
+        if slot is None:
+            return 0
+        bits = self._blank[slot] | self._zero[slot]
+        return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+    def incomplete_columns(self, row_id) -> list:
+        """Columnas vacías o en cero de una fila."""
+        mask = self.row_mask(row_id)
+        return [c for i, c in enumerate(self.columns) if mask >> i & 1]
+
+    def summary(self) -> dict:
+        """
+        Resumen por columna (O(columnas), no recorre las filas).
+
+        Returns:
+            dict: {'total_filas', 'filas_incompletas', 'filas_completas',
+                   'columnas': [{'columna', 'vacias', 'ceros', 'porcentaje'}]}
+                   con las columnas ordenadas de más a menos celdas incompletas.
+        """
+        total = self.num_rows
+        columnas = [
+            {
+                'columna': col, 'vacias': int(b), 'ceros': int(z),
+                'porcentaje': round(100 * (int(b) + int(z)) / total, 2) if total else 0.0
+            }
+            for col, b, z in zip(self.columns, self.blank_counts, self.zero_counts)
+        ]
+        columnas.sort(key=lambda c: c['vacias'] + c['ceros'], reverse=True)
+        return {
+            'total_filas': total,
+            'filas_incompletas': self.incomplete_rows,
+            'filas_completas': total - self.incomplete_rows,
+            'columnas': columnas,
+        }
@@ -0,0 +1,717 @@
+"""
+dataset_store.py
+----------------
+Registro en memoria de los datasets de trabajo ("borradores"), compartidos por file_id.
+
+Estándares: Google Python Style Guide.
+
+Antes cada sesión de Flask guardaba su propia copia del DataFrame (`df_staging`).
+Ahora el DataFrame vive UNA vez en este registro y las sesiones solo guardan el
+`file_id` al que están conectadas; varios analistas pueden trabajar sobre el
+mismo extracto y ver los cambios de los demás.
+
+Control de concurrencia optimista:
+- Cada cambio incrementa `Dataset.version` y queda en un registro de cambios
+  acotado (qué filas se añadieron/actualizaron/eliminaron y qué celdas cambiaron).
+- Las ediciones llegan con una `base_version`: si otra sesión modificó la misma
+  celda después de esa versión, la edición se rechaza (conflicto); si tocó otras
+  celdas, la edición se fusiona sin más.
+- Los clientes piden los cambios desde su última versión (`changes_since`) en
+  lugar de volver a descargar la tabla completa.
+
+Almacenamiento (`modules/storage.py`):
+- Cada cambio se escribe también en el backend configurado (SQLite por defecto),
+  solo con las filas afectadas. Tras un reinicio, o en otro worker, el dataset
+  se recupera del backend.
+- Si el DataFrame no está en memoria, los filtros y agrupaciones se ejecutan en
+  el motor (`query`, `pushdown`) y solo se carga el borrador completo cuando una
+  operación lo necesita (propiedad `df`).
+- Si otro proceso escribió una versión más nueva, la copia en memoria se descarta.
+- Cada commit recalcula `_row_status` de las filas tocadas y mantiene al día
+  el índice de calidad (`modules/data_quality.py`), el de búsqueda global
+  (`modules/search_index.py`), los montos/fechas ya convertidos de las celdas
+  editadas (`modules/column_profile.py`) y las permutaciones de orden y
+  máscaras de filtro (`modules/sort_index.py`).
+- Cada versión del borrador se conserva (las últimas `FRAME_VERSIONS`) como un
+  DataFrame que comparte las columnas con las demás (Copy-on-Write de pandas >= 3):
+  una edición solo copia las columnas que toca. Deshacer la última acción
+  vuelve a la versión anterior (`frame_at`) sin reescribir celdas, y las
+  lecturas (`snapshot`, `query`) no copian el borrador.
+- Cada commit publica un evento `version` en el canal SSE del dataset
+  (`modules/events.py`) para que los demás clientes pidan solo el delta.
+- Con backends de snapshot + WAL, cada commit comprueba si toca compactar
+  (`snapshot_due`) y al arrancar `restore` recarga los datasets más recientes.
+- Con backends persistentes, `evict` libera el DataFrame y sus índices (el
+  presupuesto de memoria, `modules/memory_budget.py`, elige cuáles); la
+  siguiente petición a ese `file_id` lo recarga sin que el cliente lo note.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from .column_profile import ColumnProfile, ParsedValues, infer_profile
+from .column_types import allow_values, compact_frame, is_categorical
+from .data_quality import QualityIndex, edited_row_status, row_status
+from .events import bus
+from .filters import ANY_COLUMN, aplicar_filtros_dinamicos
+from .lazy_import import lazy_import
+from .priority_manager import forget_cached
+from .saved_views import materialized
+from .search_index import SearchIndex
+from .sort_index import SortIndex
+from .storage import MemoryStorage, StaleDatasetError
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Número máximo de entradas del registro de cambios por dataset.
+CHANGE_LOG_LIMIT = 500
+
+# Versiones anteriores del borrador que se conservan en memoria por dataset.
+FRAME_VERSIONS = 8
+
+# Datasets que se restauran en memoria al arrancar (los más recientes).
+RESTORE_LIMIT = 5
+
+# Segundos entre escrituras del último acceso en el backend (ver `Dataset.touch`).
+ACCESS_SAVE_SEC = 60
+
+
+def _buffer(series: pd.Series) -> np.ndarray:
+    """Array de datos de una columna (los códigos si es categórica), sin copiarlo."""
+    values = series.array
+    return values.codes if is_categorical(series) else np.asarray(values)
+
+
+@dataclass
+class ChangeEntry:
+    """Una entrada del registro de cambios de un dataset."""
+    version: int
+    author: str | None
+    updated: set = field(default_factory=set)
+    added: set = field(default_factory=set)
+    removed: set = field(default_factory=set)
+    cells: set = field(default_factory=set)  # {(row_id, columna)}
+
+
+class Dataset:
+    """
+    Dataset de trabajo compartido.
+
+    Attributes:
+        file_id (str): Identificador del dataset.
+        df (pd.DataFrame): Borrador actual (incluye `_row_id`); se carga del backend si hace falta.
+        pay_group_col (str | None): Columna 'Pay Group' detectada al cargar.
+        filename (str): Nombre original del archivo subido.
+        version (int): Versión actual; aumenta con cada cambio.
+        data_version (int): Última versión que cambió datos del usuario (no avanza
+            con commits que solo recalculan columnas derivadas, ver `commit`).
+        lock (threading.RLock): Serializa lecturas/escrituras del DataFrame.
+        sessions (set[str]): Clientes conectados (ids de sesión).
+        last_access (float): Marca de tiempo del último acceso.
+        storage: Backend donde se persiste el borrador.
+        on_load (callable | None): Se llama cada vez que el DataFrame pasa a memoria.
+        preview (bool): Solo contiene las primeras filas; el archivo completo se
+            está cargando en segundo plano (ver `replace`). No admite ediciones.
+
+    Las ediciones pueden escribir en sitio sobre `df`: las versiones guardadas
+    (`frame_at`) y las lecturas (`snapshot`) no cambian, porque pandas copia
+    antes de escribir solo la columna afectada.
+    """
+
+    def __init__(self, file_id: str, df: pd.DataFrame | None, pay_group_col: str | None, filename: str = "",
+                 storage=None, version: int = 1, preview: bool = False, profile: ColumnProfile | None = None):
+        self.file_id = file_id
+        self._df = df
+        self.pay_group_col = pay_group_col
+        self.filename = filename
+        self.version = version
+        self.data_version = version
+        self.lock = threading.RLock()
+        self.sessions = set()
+        self.last_access = time.time()
+        self._access_saved = 0.0
+        self.storage = storage or MemoryStorage()
+        self._log = deque(maxlen=CHANGE_LOG_LIMIT)
+        self._frames = deque(maxlen=FRAME_VERSIONS)  # [(versión, DataFrame, versión equivalente)]
+        self._quality = None
+        self._search = None
+        self._profile = profile
+        self._parsed = None
+        self._sort = None
+        self.preview = preview
+        self.on_load = None
+        self._keep_frame()
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Borrador completo (lo carga del backend si no está en memoria)."""
+        with self.lock:
+            if self._df is None:
+                df = self.storage.load(self.file_id)
+                if df is None:
+                    raise Exception("Datos de sesión no encontrados.")
+                self._df = compact_frame(df)
+                self._keep_frame()
+                self._loaded()
+            return self._df
+
+    @property
+    def resident(self) -> bool:
+        """True si el DataFrame está cargado en memoria."""
+        return self._df is not None
+
+    @property
+    def pushdown(self) -> bool:
+        """True si las lecturas deben ejecutarse en el motor del backend."""
+        return self._df is None and self.storage.pushdown
+
+    @property
+    def num_rows(self) -> int:
+        """Número de filas, sin cargar el DataFrame si no está en memoria."""
+        return self.storage.count(self.file_id) if self.pushdown else len(self.df)
+
+    @property
+    def quality(self) -> QualityIndex:
+        """Índice de calidad de datos (se construye en el primer uso y luego es incremental)."""
+        with self.lock:
+            if self._quality is None or not self._quality.compatible(self.df):
+                self._quality = QualityIndex(self.df)
+            return self._quality
+
+    @property
+    def search(self) -> SearchIndex:
+        """Índice de búsqueda global (se construye en el primer uso y luego es incremental)."""
+        with self.lock:
+            if self._search is None or not self._search.compatible(self.df):
+                self._search = SearchIndex(self.df)
+            return self._search
+
+    @property
+    def profile(self) -> ColumnProfile:
+        """Tipos de columna (inferidos al cargar el Excel; si no se conocen, en el primer uso)."""
+        with self.lock:
+            if self._profile is not None and (self._df is None or self._profile.compatible(self._df)):
+                return self._profile
+            if self.pushdown:
+                return infer_profile(self.schema())  # Solo por nombre, sin cargar el borrador
+            self._profile = infer_profile(self.df)
+            return self._profile
+
+    @property
+    def parsed(self) -> ParsedValues:
+        """Montos y fechas ya convertidos (se construyen en el primer uso y luego por celda editada)."""
+        with self.lock:
+            if self._parsed is None or not self._parsed.compatible(self.df):
+                self._parsed = ParsedValues(self.df, self.profile)
+            return self._parsed
+
+    def _keep_frame(self, same_as: int | None = None) -> None:
+        """
+        Conserva la versión actual del borrador (sin copiar: comparte las columnas).
+
+        Args:
+            same_as (int, optional): Versión anterior con los mismos datos (al
+                volver a ella con `revert`).
+        """
+        if self._df is not None:
+            self._frames.append((self.version, self._df.copy(deep=False), same_as or self.version))
+
+    def _equivalent(self, version: int) -> int:
+        """Versión más antigua con los mismos datos que `version` (ella misma si no hubo `revert`)."""
+        return next((same for v, _, same in self._frames if v == version), version)
+
+    def snapshot(self) -> pd.DataFrame:
+        """Borrador actual para leer fuera del lock (las ediciones posteriores no lo alteran)."""
+        with self.lock:
+            return self.df.copy(deep=False)
+
+    def frame_at(self, version: int) -> pd.DataFrame | None:
+        """Borrador tal como quedó en `version`, o None si ya no se conserva."""
+        with self.lock:
+            for v, frame, _ in reversed(self._frames):
+                if v == version:
+                    return frame.copy(deep=False)
+            return None
+
+    def can_revert(self, version: int) -> bool:
+        """
+        True si se puede volver a `version` con `revert`: se conserva y desde
+        `version + 1` no hubo más cambios (salvo otros `revert`).
+        """
+        with self.lock:
+            return (self._equivalent(self.version) == self._equivalent(version + 1)
+                    and any(v == version for v, _, _ in self._frames))
+
+    def revert(self, version: int, updated=(), added=(), removed=(), cells=(), author: str | None = None) -> int:
+        """
+        Vuelve al borrador de `version` (ver `can_revert`) en una versión nueva.
+
+        Es un cambio de puntero: no se reescriben celdas ni se recalcula nada.
+        Los ids y celdas se registran como en `commit` (backend, deltas, conflictos).
+
+        Returns:
+            int: Nueva versión del dataset.
+        """
+        with self.lock:
+            frame = self.frame_at(version)
+            if frame is None:
+                raise Exception(f"La versión {version} ya no se conserva.")
+            same_as = self._equivalent(version)
+            new_version = self.commit(df=frame, updated=updated, added=added, removed=removed,
+                                      cells=cells, author=author)
+            self._frames[-1] = (*self._frames[-1][:2], same_as)
+            return new_version
+
+    @property
+    def frames_nbytes(self) -> int:
+        """Memoria de las versiones conservadas (solo las columnas que ya no comparten con `df`)."""
+        with self.lock:
+            if self._df is None:
+                return 0
+            seen = {col: [_buffer(self._df[col])] for col in self._df.columns}
+            size = 0
+            for _, frame, _ in self._frames:
+                for col in frame.columns:
+                    data = _buffer(frame[col])
+                    known = seen.setdefault(col, [])
+                    if not any(np.may_share_memory(data, other) for other in known):
+                        known.append(data)
+                        size += int(frame[col].memory_usage(index=False, deep=True))
+            return size
+
+    @property
+    def sorting(self) -> SortIndex:
+        """Permutaciones de orden y máscaras de filtro (en el primer uso; luego por fila editada)."""
+        with self.lock:
+            if self._sort is None or not self._sort.compatible(self.df):
+                self._sort = SortIndex(self.df, self.profile.kinds)
+            return self._sort
+
+    def schema(self) -> pd.DataFrame:
+        """DataFrame vacío con las columnas del dataset (para heurísticas de columnas)."""
+        if self.pushdown:
+            return pd.DataFrame(columns=self.storage.meta(self.file_id)['columns'])
+        return self.df.head(0)
+
+    def query(self, filtros: list) -> pd.DataFrame:
+        """
+        Filas que cumplen `filtros` (en el motor si el borrador no está en memoria).
+
+        Los filtros sobre `ANY_COLUMN` se resuelven con el índice de búsqueda.
+        """
+        with self.lock:
+            if self.pushdown:
+                return self.storage.query(self.file_id, filtros)
+            df = self.df
+            globales = [f['valor'] for f in filtros or [] if f.get('columna') == ANY_COLUMN and f.get('valor')]
+            if globales:
+                df = df[df['_row_id'].isin(self.search.matching(globales))]
+                filtros = [f for f in filtros if f.get('columna') != ANY_COLUMN]
+            return aplicar_filtros_dinamicos(df, filtros)
+
+    def rows(self, row_ids) -> pd.DataFrame:
+        """Filas concretas por `_row_id`."""
+        with self.lock:
+            if self.pushdown:
+                return self.storage.fetch_rows(self.file_id, row_ids)
+            df = self.df
+            return df[df['_row_id'].astype(str).isin({str(r) for r in row_ids})]
+
+    def touch(self) -> None:
+        """
+        Marca el dataset como usado recientemente.
+
+        El acceso también se guarda en el backend (como mucho cada
+        `ACCESS_SAVE_SEC`): la limpieza de temporales de otro worker no debe
+        borrar un dataset que este proceso está sirviendo.
+        """
+        now = time.time()
+        self.last_access = now
+        if now - self._access_saved >= ACCESS_SAVE_SEC:
+            self._access_saved = now
+            self.storage.touch(self.file_id, now)
+
+    def _loaded(self) -> None:
+        if self.on_load is not None:
+            self.on_load()
+
+    def evict(self) -> bool:
+        """
+        Libera el DataFrame y el índice de calidad (se recargan en el próximo uso).
+
+        Solo con backends persistentes: antes se deja el borrador en su forma
+        compacta en disco (`seal`). El registro de cambios se conserva, así los
+        clientes siguen sincronizando por delta.
+
+        Returns:
+            bool: True si se liberó la memoria.
+        """
+        with self.lock:
+            if self._df is None or not self.storage.persistent:
+                return False
+            self.storage.seal(self.file_id, self._df, self.version)
+            self._df = None
+            self._frames.clear()
+            self._quality = None
+            self._search = None
+            self._parsed = None
+            self._sort = None
+            return True
+
+    def warm(self) -> None:
+        """Carga el DataFrame en memoria si aún no lo está."""
+        with self.lock:
+            if self._df is None:
+                self._df = self.df
+
+    def invalidate(self, version: int) -> None:
+        """Descarta la copia en memoria: otro proceso guardó la versión `version`."""
+        with self.lock:
+            self._df = None
+            self._frames.clear()
+            self._quality = None
+            self._search = None
+            self._profile = None
+            self._parsed = None
+            self._sort = None
+            self._log.clear()
+            self.version = self.data_version = version
+
+    def commit(self, df: pd.DataFrame | None = None, updated=(), added=(), removed=(),
+               cells=(), author: str | None = None, derived: bool = False) -> int:
+        """
+        Registra un cambio (y opcionalmente reemplaza el DataFrame).
+
+        Los ids de fila se normalizan a str para que las comparaciones sean
+        independientes del tipo con el que llegaron (int desde JSON, etc.).
+        En el backend solo se escriben las filas añadidas/actualizadas/eliminadas.
+
+        Args:
+            df (pd.DataFrame, optional): Nuevo DataFrame (si la operación creó uno nuevo).
+            updated, added, removed (iterable): Ids de fila afectados.
+            cells (iterable): Celdas modificadas como (row_id, columna).
+            author (str, optional): Cliente que hizo el cambio.
+            derived (bool): Solo cambiaron columnas derivadas (p. ej. prioridades
+                tras cambiar reglas); `data_version` no avanza.
+
+        Returns:
+            int: Nueva versión del dataset.
+
+        Raises:
+            StaleDatasetError: Otro proceso escribió antes; la copia en memoria se
+                descarta para recargarla del backend.
+        """
+        with self.lock:
+            if df is not None:
+                self._df = df
+            entry = ChangeEntry(
+                version=self.version + 1, author=author,
+                updated={str(r) for r in updated}, added={str(r) for r in added},
+                removed={str(r) for r in removed}, cells={(str(r), c) for r, c in cells},
+            )
+
+            touched = entry.updated | entry.added
+            if self._quality is not None and not self._quality.compatible(self._df):
+                self._quality = None  # Cambiaron las columnas: se reconstruye en el próximo uso
+            if self._search is not None and not self._search.compatible(self._df):
+                self._search = None
+            if self._parsed is not None and not self._parsed.compatible(self._df):
+                self._parsed = None
+            rows = self.df[self.df['_row_id'].astype(str).isin(touched)] if touched else None
+
+            # `_row_status` se deriva aquí para todas las rutas de edición (misma regla que la carga)
+            if rows is not None and '_row_status' in rows.columns:
+                if self._quality is not None:
+                    status = self._quality.update(rows)
+                elif entry.cells:
+                    # Solo las columnas editadas (valores previos: la versión anterior conservada)
+                    previous = next((f for v, f, _ in reversed(self._frames) if v == self.version), None)
+                    status = edited_row_status(rows, entry.cells, previous)
+                else:
+                    status = row_status(rows)
+                rows = rows.assign(_row_status=status)
+                allow_values(self._df, '_row_status', status)
+                self._df.loc[rows.index, '_row_status'] = status
+            if entry.removed and self._quality is not None:
+                self._quality.remove(entry.removed)
+            if self._search is not None:
+                if rows is not None:
+                    self._search.update(rows)
+                self._search.remove(entry.removed - touched)
+            if self._parsed is not None:
+                if rows is not None:
+                    # Con celdas declaradas solo se reconvierten esas (las demás filas
+                    # tocadas cambiaron columnas derivadas, p. ej. la prioridad)
+                    self._parsed.update(rows, entry.cells or None)
+                self._parsed.remove(entry.removed - touched)
+            if self._sort is not None:
+                # Con altas o bajas cambian las posiciones: se reconstruye en el próximo uso
+                if entry.added or entry.removed or not self._sort.compatible(self._df):
+                    self._sort = None
+                elif rows is not None:
+                    self._sort.update(self._df, self._df.index.get_indexer(rows.index))
+            try:
+                self.storage.write_rows(self.file_id, self.version, entry.version, rows, entry.removed)
+            except StaleDatasetError:
+                self.invalidate(self.storage.version(self.file_id) or self.version)
+                raise
+
+            self.version = entry.version
+            if not derived:
+                self.data_version = entry.version
+            self._log.append(entry)
+            self._keep_frame()
+            self.touch()
+            bus.publish(self.file_id, 'version', {'version': self.version, 'author': author})
+
+            # Compactación periódica: snapshot completo y WAL recortado.
+            if self.storage.snapshot_due(self.file_id):
+                self.storage.snapshot(self.file_id, self._df, self.version)
+            return self.version
+
+    def replace(self, df: pd.DataFrame, pay_group_col: str | None, index_columns=(),
+                author: str | None = None, profile: ColumnProfile | None = None) -> int:
+        """
+        Sustituye el DataFrame completo y lo vuelve a guardar en el backend.
+
+        Para cambios que no caben en un commit por filas: completar una vista
+        previa o incorporar un extracto con columnas nuevas. Crea una versión
+        nueva sin registro de cambios anterior, así los clientes conectados
+        reciben `full_reload` en su próxima sincronización.
+
+        Args:
+            profile (ColumnProfile, optional): Tipos ya inferidos al leer `df`
+                (si no se indican, se infieren en el primer uso).
+
+        Returns:
+            int: Nueva versión del dataset.
+        """
+        with self.lock:
+            version = self.version + 1
+            self.storage.save(self.file_id, df, {
+                'filename': self.filename, 'pay_group_col': pay_group_col, 'version': version, 'preview': False
+            }, index_columns)
+            self._df, self.pay_group_col, self.preview = df, pay_group_col, False
+            self._quality = None
+            self._search = None
+            self._profile = profile
+            self._parsed = None
+            self._sort = None
+            self._log.clear()
+            self.version = self.data_version = version
+            self._frames.clear()
+            self._keep_frame()
+            self.touch()
+            self._loaded()
+        bus.publish(self.file_id, 'version', {'version': version, 'author': author})
+        return version
+
+    def _entries_since(self, version: int) -> list[ChangeEntry] | None:
+        """Entradas posteriores a `version`, o None si el registro ya no llega tan atrás."""
+        if version >= self.version:
+            return []
+        if not self._log or self._log[0].version > version + 1:
+            return None
+        return [e for e in self._log if e.version > version]
+
+    def conflicting_cells(self, base_version: int | None, cells, author: str | None) -> set:
+        """
+        Celdas de `cells` que OTRO cliente modificó después de `base_version`.
+
+        Args:
+            base_version (int | None): Versión sobre la que el cliente hizo la edición.
+                None desactiva la comprobación (clientes antiguos).
+            cells (iterable): Celdas (row_id, columna) que se quieren editar.
+            author (str | None): Cliente que edita (sus propios cambios no cuentan).
+
+        Returns:
+            set: Celdas en conflicto; también las de filas eliminadas desde entonces.
+        """
+        if base_version is None:
+            return set()
+
+        wanted = {(str(r), c) for r, c in cells}
+        entries = self._entries_since(int(base_version))
+        if entries is None:
+            # Historial insuficiente: ante la duda solo protegemos filas eliminadas.
+            entries = list(self._log)
+
+        conflicts = set()
+        for entry in entries:
+            if entry.author == author:
+                continue
+            conflicts |= wanted & entry.cells
+            conflicts |= {cell for cell in wanted if cell[0] in entry.removed}
+        return conflicts
+
+    def changes_since(self, version: int) -> dict | None:
+        """
+        Resume los cambios posteriores a `version`.
+
+        Returns:
+            dict | None: {'upserted': set(ids), 'removed': set(ids)} o None si el
+            cliente debe recargar todo (versión demasiado antigua).
+        """
+        entries = self._entries_since(int(version))
+        if entries is None:
+            return None
+
+        state = {}
+        for entry in entries:
+            for rid in entry.added | entry.updated:
+                state[rid] = 'upserted'
+            for rid in entry.removed:
+                state[rid] = 'removed'
+
+        return {
+            'upserted': {rid for rid, st in state.items() if st == 'upserted'},
+            'removed': {rid for rid, st in state.items() if st == 'removed'},
+        }
+
+
+class DatasetStore:
+    """Registro de datasets activos, indexado por file_id (seguro entre hilos)."""
+
+    def __init__(self, storage=None):
+        self._datasets = {}
+        self._lock = threading.Lock()
+        self.storage = storage or MemoryStorage()
+        # Aviso al cargar un DataFrame en memoria (lo usa el presupuesto de memoria)
+        self.on_load = None
+
+    def _notify_load(self) -> None:
+        if self.on_load is not None:
+            self.on_load()
+
+    def set_storage(self, storage) -> None:
+        """Configura el backend de almacenamiento (al arrancar la aplicación)."""
+        self.storage = storage
+
+    def create(self, file_id: str, df: pd.DataFrame, pay_group_col: str | None, filename: str = "",
+               index_columns=(), preview: bool = False, profile: ColumnProfile | None = None) -> Dataset:
+        """
+        Registra un dataset nuevo, lo guarda en el backend y lo devuelve.
+
+        Args:
+            index_columns (iterable): Columnas a indexar en el backend (además de las internas).
+            preview (bool): `df` es solo una vista previa (se completará con `Dataset.replace`).
+            profile (ColumnProfile, optional): Tipos de columna inferidos al cargar.
+        """
+        dataset = Dataset(file_id, df, pay_group_col, filename, storage=self.storage, preview=preview,
+                          profile=profile)
+        dataset.on_load = self._notify_load
+        self.storage.save(file_id, df, {
+            'filename': filename, 'pay_group_col': pay_group_col, 'version': dataset.version, 'preview': preview
+        }, index_columns)
+        with self._lock:
+            self._datasets[file_id] = dataset
+        self._notify_load()
+        return dataset
+
+    def get(self, file_id: str | None, touch: bool = True) -> Dataset | None:
+        """
+        Devuelve el dataset o None si no existe.
+
+        Si no está en este proceso se recupera del backend (sin cargar el DataFrame);
+        si el backend tiene una versión más nueva, se descarta la copia en memoria.
+
+        Args:
+            touch (bool): Marcar el acceso. Los recorridos internos (listado,
+                restauración) no cuentan como uso para la limpieza de temporales.
+        """
+        if not file_id:
+            return None
+        with self._lock:
+            dataset = self._datasets.get(file_id)
+
+        if dataset is None:
+            meta = self.storage.meta(file_id)
+            if meta is None:
+                return None
+            shell = Dataset(file_id, None, meta['pay_group_col'], meta['filename'] or "",
+                            storage=self.storage, version=meta['version'], preview=meta.get('preview', False))
+            if not touch:
+                shell.last_access = 0.0  # Nadie lo ha usado aún en este proceso
+            shell.on_load = self._notify_load
+            with self._lock:
+                dataset = self._datasets.setdefault(file_id, shell)
+        else:
+            with dataset.lock:
+                stored = self.storage.version(file_id)
+                if stored is None and self.storage.persistent:
+                    self._forget(file_id)  # Otro worker lo eliminó: no se sirve una copia huérfana
+                    return None
+                if stored is not None and stored > dataset.version:
+                    dataset.invalidate(stored)
+                    # Otro worker pudo completar la vista previa
+                    meta = self.storage.meta(file_id) if dataset.preview else None
+                    if meta is not None:
+                        dataset.preview, dataset.pay_group_col = meta.get('preview', False), meta['pay_group_col']
+
+        if touch:
+            dataset.touch()
+        return dataset
+
+    def attach(self, file_id: str, client_id: str) -> Dataset | None:
+        """Conecta un cliente a un dataset existente."""
+        dataset = self.get(file_id)
+        if dataset is not None:
+            with dataset.lock:
+                dataset.sessions.add(client_id)
+        return dataset
+
+    def detach(self, file_id: str | None, client_id: str) -> None:
+        """Desconecta un cliente (p. ej. al subir otro archivo)."""
+        dataset = self.get(file_id)
+        if dataset is not None:
+            with dataset.lock:
+                dataset.sessions.discard(client_id)
+
+    def _forget(self, file_id: str) -> None:
+        """Quita un dataset del registro y sus cachés de reglas y vistas."""
+        with self._lock:
+            self._datasets.pop(file_id, None)
+        forget_cached(file_id)
+        materialized.forget(file_id)
+
+    def drop(self, file_id: str) -> None:
+        """Elimina un dataset del registro, de las cachés y del backend."""
+        self._forget(file_id)
+        self.storage.drop(file_id)
+
+    def restore(self, limit: int = RESTORE_LIMIT) -> int:
+        """
+        Recarga en memoria los datasets guardados más recientes (tras un reinicio).
+
+        Returns:
+            int: Número de datasets restaurados.
+        """
+        restored = 0
+        for file_id in self.storage.list_ids()[:limit]:
+            dataset = self.get(file_id, touch=False)
+            if dataset is not None:
+                dataset.warm()
+                restored += 1
+        return restored
+
+    def list(self, load: bool = True) -> list[Dataset]:
+        """
+        Datasets activos.
+
+        Args:
+            load (bool): Incluir los guardados en el backend por otros procesos.
+        """
+        if load:
+            for file_id in self.storage.list_ids():
+                self.get(file_id, touch=False)
+        with self._lock:
+            return list(self._datasets.values())
+
+
+# Instancia única del proceso.
+store = DatasetStore()
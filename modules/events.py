@@ -0,0 +1,123 @@
+"""
+events.py
+---------
+Canal de eventos por dataset (Server-Sent Events).
+
+Estándares: Google Python Style Guide.
+Cada canal (un `file_id`, o un id efímero `op-...` para operaciones que aún no
+tienen dataset, como una subida) tiene sus suscriptores; cada suscriptor es
+una cola que consume su propia conexión SSE.
+
+Eventos:
+- `version`:  el dataset cambió ({version, author}); el cliente pide solo el delta.
+- `progress`: avance de una operación larga ({op, pct, mensaje}).
+
+Si el dataset cambia en otro worker, el latido de cada conexión compara la
+versión guardada y emite `version` igualmente.
+"""
+
+import json
+import queue
+import re
+import threading
+from collections import defaultdict
+
+# Segundos entre latidos (mantienen viva la conexión y detectan cambios de otros workers)
+HEARTBEAT_SECONDS = 15
+# Eventos pendientes por suscriptor; si se llena se descartan los más antiguos
+QUEUE_LIMIT = 100
+# Canales efímeros de progreso (generados por el cliente)
+PROGRESS_CHANNEL = re.compile(r'^op-[\w-]{1,64}$')
+
+
+def _format(event: str, data: dict) -> str:
+    """Serializa un evento en formato SSE."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventBus:
+    """Publicación/suscripción en memoria del proceso (segura entre hilos)."""
+
+    def __init__(self):
+        self._subs = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> queue.Queue:
+        q = queue.Queue(maxsize=QUEUE_LIMIT)
+        with self._lock:
+            self._subs[channel].add(q)
+        return q
+
+    def unsubscribe(self, channel: str, q: queue.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(channel)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[channel]
+
+    def publish(self, channel: str | None, event: str, data: dict) -> int:
+        """
+        Envía un evento a los suscriptores del canal (sin bloquear al emisor).
+
+        Returns:
+            int: Número de suscriptores que lo recibieron.
+        """
+        if not channel:
+            return 0
+        with self._lock:
+            subs = list(self._subs.get(channel, ()))
+        for q in subs:
+            while True:
+                try:
+                    q.put_nowait((event, data))
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()  # Cliente lento: se pierde el evento más antiguo
+                    except queue.Empty:
+                        pass
+        return len(subs)
+
+    def progress(self, channel: str | None, op: str, pct: int, mensaje: str = "") -> None:
+        """Publica el avance (0-100) de una operación larga."""
+        self.publish(channel, 'progress', {'op': op, 'pct': pct, 'mensaje': mensaje})
+
+    def stream(self, channel: str, version_fn=None, heartbeat: float = HEARTBEAT_SECONDS):
+        """
+        Generador de la respuesta SSE de un suscriptor.
+
+        Args:
+            channel (str): Canal a escuchar.
+            version_fn (callable, optional): Devuelve la versión actual del dataset;
+                se envía al conectar y se vuelve a comprobar en cada latido.
+            heartbeat (float): Segundos sin eventos antes de enviar un latido.
+        """
+        q = self.subscribe(channel)
+        try:
+            yield "retry: 3000\n\n"
+            last_version = version_fn() if version_fn else None
+            if last_version is not None:
+                yield _format('version', {'version': last_version, 'author': None})
+
+            while True:
+                try:
+                    event, data = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    current = version_fn() if version_fn else None
+                    if current is not None and current != last_version:
+                        last_version = current
+                        yield _format('version', {'version': current, 'author': None})
+                    else:
+                        yield ": ping\n\n"
+                    continue
+
+                if event == 'version':
+                    last_version = data.get('version')
+                yield _format(event, data)
+        finally:
+            self.unsubscribe(channel, q)
+
+
+# Instancia única del proceso.
+bus = EventBus()
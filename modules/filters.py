@@ -1,8 +1,18 @@
 # modules/filters.py (Versión 3.0 - Documentado y Optimizado)
 
-import pandas as pd
+from __future__ import annotations
+
 from collections import defaultdict
 
+from .column_types import is_categorical
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Columna comodín: el valor se busca en todas las columnas del usuario.
+ANY_COLUMN = '*'
+
 def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
     """
     Aplica filtros dinámicos al DataFrame con lógica mixta (AND/OR).
@@ -14,6 +24,12 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
     Optimización v18.0:
     - Uso de vectorización para comparaciones de strings.
     - Manejo robusto de tipos de datos antes de la búsqueda.
+    - Columnas categóricas: la búsqueda se hace sobre los valores distintos.
+    - Columna `ANY_COLUMN` ("*"): coincidencia en cualquier columna del usuario.
+      Sobre el dataset completo la resuelve el índice de búsqueda
+      (`Dataset.query`); aquí se usa para subconjuntos pequeños (deltas).
+    - Sin copias profundas: el resultado comparte columnas con `df` y, con
+      Copy-on-Write, modificarlo no altera el original (ni al revés).
 
     Args:
         df (pd.DataFrame): DataFrame original.
@@ -24,7 +40,7 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
     """
     
     if not filtros:
-        return df.copy()
+        return df.copy(deep=False)
 
     # 1. Agrupar filtros por columna.
     filtros_agrupados = defaultdict(list)
@@ -32,7 +48,7 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
         if f.get('columna') and f.get('valor'):
              filtros_agrupados[f['columna']].append(f['valor'])
 
-    resultado = df.copy()
+    resultado = df.copy(deep=False)
 
     # 2. Iterar sobre cada columna (Lógica AND entre columnas).
     for columna, valores in filtros_agrupados.items():
@@ -54,7 +70,25 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
                     # .isin es altamente eficiente.
                     resultado = resultado[resultado[columna].isin(ids_a_buscar)]
 
+            # Búsqueda global: OR entre valores y entre columnas del usuario.
+            elif columna == ANY_COLUMN:
+                mascara_global = pd.Series(False, index=resultado.index)
+                for col in [c for c in resultado.columns if not str(c).startswith('_')]:
+                    columna_texto = resultado[col].astype(str).str.lower()
+                    for valor in valores:
+                        mascara_global |= columna_texto.str.contains(str(valor).lower(), regex=False, na=False)
+                resultado = resultado[mascara_global]
+
             # Caso General: Filtro de texto parcial.
+            elif columna in resultado.columns and is_categorical(resultado[columna]):
+                # Categórica: se busca solo entre los valores distintos y se filtra por código.
+                serie = resultado[columna]
+                categorias = pd.Series(serie.cat.categories.astype(str)).str.lower()
+                coinciden = pd.Series(False, index=categorias.index)
+                for valor in valores:
+                    coinciden |= categorias.str.contains(str(valor).lower(), case=False, regex=False, na=False)
+                resultado = resultado[serie.cat.codes.isin(np.flatnonzero(coinciden.to_numpy()))]
+
             elif columna in resultado.columns:
                 # Normalizamos la columna a string y minúsculas de una vez.
                 columna_texto = resultado[columna].astype(str).str.lower()
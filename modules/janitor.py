@@ -0,0 +1,159 @@
+"""
+janitor.py
+----------
+Limpieza en segundo plano de `temp_uploads` con presupuesto de disco.
+
+Estándares: Google Python Style Guide.
+Candidatos a borrar: archivos de sesión (Flask-Session), Excel subidos que
+quedaron huérfanos y datasets guardados en el backend del borrador. Primero se
+borra todo lo que supera la edad máxima; si el total sigue por encima del
+presupuesto, se borra del más antiguo al más reciente hasta entrar en él.
+Nunca se borra nada usado dentro de la ventana de actividad (`active_window`):
+así un `file_id` en uso no pierde su borrador ni su sesión.
+
+La antigüedad de un dataset es la de su último acceso, no la de su última
+escritura: cada worker guarda sus accesos en el catálogo del backend
+(`Dataset.touch`), así que la limpieza de un worker respeta los datasets que
+otro está sirviendo aunque nadie los edite.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from modules.dataset_store import store as default_store
+
+# Valores por defecto (se sobrescriben desde la configuración de la app)
+MAX_AGE_HOURS = 72
+MAX_MB = 2048
+ACTIVE_WINDOW_MIN = 120
+
+
+class Janitor:
+    """
+    Recolector de artefactos de disco con edad máxima y presupuesto total.
+
+    Attributes:
+        upload_folder (str): Carpeta de Excel subidos (`temp_uploads`).
+        session_folder (str): Carpeta de sesiones de Flask-Session.
+        max_age (float): Edad máxima en segundos.
+        max_bytes (int): Presupuesto total en bytes.
+        active_window (float): Segundos durante los que un artefacto usado se protege.
+    """
+
+    def __init__(self, upload_folder: str, session_folder: str, store=None,
+                 max_age_hours: float = MAX_AGE_HOURS, max_mb: float = MAX_MB,
+                 active_window_min: float = ACTIVE_WINDOW_MIN):
+        self.upload_folder = upload_folder
+        self.session_folder = session_folder
+        self.store = store or default_store
+        self.max_age = max_age_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.active_window = active_window_min * 60
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_report = None
+
+    # --- Inventario ---
+
+    @staticmethod
+    def _files(folder: str, kind: str, suffix: str = '') -> list[dict]:
+        items = []
+        if not os.path.isdir(folder):
+            return items
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if not os.path.isfile(path) or not name.endswith(suffix):
+                continue
+            st = os.stat(path)
+            items.append({'kind': kind, 'key': path, 'updated': st.st_mtime, 'bytes': st.st_size})
+        return items
+
+    def _active_ids(self, now: float) -> set[str]:
+        """`file_id` con accesos recientes en este proceso."""
+        return {ds.file_id for ds in self.store.list(load=False)
+                if now - ds.last_access < self.active_window}
+
+    def inventory(self) -> list[dict]:
+        """
+        Artefactos candidatos: [{'kind', 'key', 'updated', 'bytes'}].
+
+        'updated' es la fecha de modificación de los archivos y el último
+        acceso (de cualquier worker) de los datasets.
+        """
+        items = self._files(self.session_folder, 'sessions')
+        items += self._files(self.upload_folder, 'uploads', '.xlsx')
+        for u in self.store.storage.usage():
+            items.append({'kind': 'datasets', 'key': u['file_id'], 'updated': u['accessed'], 'bytes': u['bytes']})
+        return items
+
+    # --- Limpieza ---
+
+    def _remove(self, item: dict) -> None:
+        if item['kind'] == 'datasets':
+            self.store.drop(item['key'])
+        else:
+            os.remove(item['key'])
+
+    def run_once(self) -> dict:
+        """
+        Ejecuta una pasada de limpieza.
+
+        Returns:
+            dict: Informe con los artefactos borrados por tipo, bytes liberados
+                y bytes que siguen ocupados.
+        """
+        with self._lock:
+            now = time.time()
+            active = self._active_ids(now)
+            items = sorted(self.inventory(), key=lambda i: i['updated'])
+            total = sum(i['bytes'] for i in items)
+            report = {'sessions': 0, 'uploads': 0, 'datasets': 0, 'bytes_reclaimed': 0, 'errors': 0}
+
+            for item in items:
+                expired = now - item['updated'] > self.max_age
+                if not expired and total <= self.max_bytes:
+                    break  # Orden por antigüedad: lo que queda es más reciente
+                if now - item['updated'] < self.active_window or item['key'] in active:
+                    continue
+                if item['kind'] == 'uploads' and os.path.basename(item['key'])[:-len('.xlsx')] in active:
+                    continue
+                try:
+                    self._remove(item)
+                except OSError as e:
+                    print(f"WARN: No se pudo borrar {item['key']}: {e}")
+                    report['errors'] += 1
+                    continue
+                report[item['kind']] += 1
+                report['bytes_reclaimed'] += item['bytes']
+                total -= item['bytes']
+
+            if report['datasets']:
+                self.store.storage.compact()
+            report['bytes_total'] = total
+            report['over_budget'] = total > self.max_bytes
+            self.last_report = report
+
+        if report['bytes_reclaimed'] or report['over_budget']:
+            print(f"INFO: Limpieza: {report['sessions']} sesiones, {report['uploads']} archivos y "
+                  f"{report['datasets']} datasets borrados; {report['bytes_reclaimed'] / 1e6:.1f} MB liberados, "
+                  f"{total / 1e6:.1f} MB ocupados.")
+        return report
+
+    def start(self, interval_min: float) -> None:
+        """Lanza la limpieza periódica en un hilo daemon."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"ERROR: Falló la limpieza de temporales: {e}")
+                time.sleep(interval_min * 60)
+
+        self._thread = threading.Thread(target=loop, daemon=True, name='janitor')
+        self._thread.start()
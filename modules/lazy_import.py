@@ -0,0 +1,57 @@
+"""
+lazy_import.py
+--------------
+Importación diferida de dependencias pesadas (pandas, numpy).
+
+Estándares: Google Python Style Guide.
+`import pandas` tarda cientos de milisegundos y domina el arranque de cada
+worker. Los módulos de datos usan `pd = lazy_import('pandas')`: el módulo real
+se importa en el primer acceso a un atributo (`pd.DataFrame`, `np.select`...),
+así las rutas ligeras (traducciones, idioma) responden sin cargarlo.
+
+Requiere `from __future__ import annotations` en los módulos que usan
+`pd.DataFrame` en anotaciones de tipo (para que no se evalúen al importar).
+"""
+
+import importlib
+import sys
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """Proxy de un módulo que se importa al primer acceso (seguro entre hilos)."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        estado = 'cargado' if self._module is not None else 'diferido'
+        return f"<LazyModule '{self._name}' ({estado})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Devuelve un proxy del módulo `name` que se importa en el primer uso.
+
+    Args:
+        name (str): Nombre del módulo (p. ej. 'pandas').
+    """
+    return LazyModule(name)
+
+
+def is_loaded(name: str) -> bool:
+    """True si el módulo ya fue importado realmente en este proceso."""
+    return name in sys.modules
@@ -8,71 +8,79 @@ Optimizaciones v18.0:
 - Reemplazo de `.apply()` por `np.select` para asignación de prioridades (Mejora de rendimiento O(n) a Vectorial).
 """
 
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+
+from .column_profile import ColumnProfile, infer_profile
+from .column_types import compact_frame
+from .data_quality import row_status
+from .lazy_import import lazy_import
 # Importamos la función para aplicar reglas dinámicas y cargar settings.
 from .priority_manager import apply_priority_rules, load_settings
+from .refresh import stamp
+
+# pandas/numpy se importan en el primer uso (arranque rápido).
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 
-def _find_pay_group_column(df: pd.DataFrame) -> str | None:
+def leer_excel(ruta_archivo: str, nrows: int | None = None) -> pd.DataFrame:
     """
-    Busca heurísticamente la columna de "Pay Group" en el DataFrame.
+    Lee el Excel como texto, limpia los nombres de columna y compacta los tipos.
 
-    Args:
-        df (pd.DataFrame): El DataFrame cargado.
+    No calcula estado ni prioridades (lo usa también la actualización
+    incremental, que solo las recalcula para las filas nuevas o modificadas).
 
-    Returns:
-        str | None: El nombre real de la columna encontrada o None si no existe.
+    Args:
+        ruta_archivo (str): Ruta absoluta al archivo .xlsx.
+        nrows (int, optional): Leer solo las primeras `nrows` filas.
     """
-    # Lista de posibles nombres (en minúsculas) para la columna.
-    possible_names = ['pay group', 'grupo de pago', 'paygroup']
-    
-    # Iteramos sobre las columnas del DataFrame.
-    for col in df.columns:
-        if str(col).lower() in possible_names:
-            return col 
-    return None 
+    # dtype=str asegura que no se pierdan ceros a la izquierda en IDs.
+    df = pd.read_excel(ruta_archivo, dtype=str, nrows=nrows)
 
+    # Eliminamos espacios en blanco de los nombres de las columnas.
+    df.columns = [col.strip() for col in df.columns]
 
-def cargar_datos(ruta_archivo: str) -> tuple[pd.DataFrame, str | None]:
+    # Reemplazamos NaN con cadenas vacías para manejo uniforme de strings.
+    df = df.fillna("")
+    print(f"INFO: Archivo cargado correctamente con {len(df)} registros.")
+
+    # Columnas con pocos valores distintos como categóricas (ver `column_types.py`).
+    return compact_frame(df)
+
+
+def cargar_datos(ruta_archivo: str, nrows: int | None = None) -> tuple[pd.DataFrame, ColumnProfile]:
     """
     Carga un archivo Excel, normaliza datos y aplica lógica de negocio base.
 
     Proceso:
-    1. Carga Excel con pandas.
-    2. Limpia espacios en nombres de columnas.
-    3. Calcula `_row_status` vectorizado.
-    4. Aplica prioridades base (SCF/Intercompany) usando vectorización (`np.select`).
-    5. Aplica reglas personalizadas (`apply_priority_rules`).
+    1. Carga Excel con pandas y limpia espacios en nombres de columnas (`leer_excel`).
+    2. Registra el hash de contenido de cada fila (`_src_hash`, ver `refresh.py`).
+    3. Infiere una sola vez el tipo de cada columna y las columnas de monto,
+       factura y Pay Group (`infer_profile`, ver `column_profile.py`).
+    4. Calcula `_row_status` vectorizado.
+    5. Aplica prioridades base (SCF/Intercompany) usando vectorización (`np.select`).
+    6. Aplica reglas personalizadas (`apply_priority_rules`).
 
     Args:
         ruta_archivo (str): Ruta absoluta al archivo .xlsx.
+        nrows (int, optional): Leer solo las primeras `nrows` filas (vista previa).
 
     Returns:
-        tuple[pd.DataFrame, str | None]: 
+        tuple[pd.DataFrame, ColumnProfile]:
             - DataFrame procesado.
-            - Nombre de la columna 'Pay Group' detectada.
+            - Tipos de columna inferidos (`profile.pay_group`: columna 'Pay Group' detectada).
     """
     try:
         # 1. Carga y limpieza inicial de datos.
-        # dtype=str asegura que no se pierdan ceros a la izquierda en IDs.
-        df = pd.read_excel(ruta_archivo, dtype=str)
-        
-        # Eliminamos espacios en blanco de los nombres de las columnas.
-        df.columns = [col.strip() for col in df.columns]
-        
-        # Reemplazamos NaN con cadenas vacías para manejo uniforme de strings.
-        df = df.fillna("")
-        print(f"INFO: Archivo cargado correctamente con {len(df)} registros.")
+        df = leer_excel(ruta_archivo, nrows)
+        # Contenido original de cada fila, para actualizar luego con otro extracto.
+        df = stamp(df)
+        # Tipos de columna, una sola vez por carga (ver `column_profile.py`).
+        profile = infer_profile(df)
 
         # 2. Cálculo Vectorizado de "Row Status" (Completo/Incompleto).
-        # Creamos una máscara booleana donde True indica celda vacía o "0".
-        blank_mask = (df == "") | (df == "0")
-        # Si alguna columna en la fila (axis=1) es True, la fila es incompleta.
-        incomplete_rows = blank_mask.any(axis=1)
-        
-        # Asignamos estado usando numpy where (mucho más rápido que apply).
-        df['_row_status'] = np.where(incomplete_rows, "Incompleto", "Completo")
+        # Misma regla que las ediciones posteriores (ver `data_quality.py`).
+        df['_row_status'] = row_status(df)
         
         # --- LÓGICA DE PRIORIDAD (Optimizada v18.0) ---
         
@@ -84,7 +92,7 @@ def cargar_datos(ruta_archivo: str) -> tuple[pd.DataFrame, str | None]:
         enable_scf = user_settings.get('enable_scf_intercompany', True)
         
         # 4. Aplicar Prioridad Base.
-        pay_group_col_name = _find_pay_group_column(df)
+        pay_group_col_name = profile.pay_group
         
         # Definimos valores por defecto.
         df['_priority'] = 'Media'
@@ -125,15 +133,16 @@ def cargar_datos(ruta_archivo: str) -> tuple[pd.DataFrame, str | None]:
         # 5. Aplicar Reglas Personalizadas (Sobrescritura).
         print("INFO: Aplicando reglas de prioridad personalizadas...")
         df = apply_priority_rules(df)
+        df = compact_frame(df, ('_row_status', '_priority', '_priority_reason'))
         
-        return df, pay_group_col_name
+        return df, profile
 
     except FileNotFoundError:
         print(f"ERROR: No se encontró el archivo en la ruta: {ruta_archivo}")
-        return pd.DataFrame(), None
+        return pd.DataFrame(), ColumnProfile()
     except Exception as e:
         print(f"ERROR CRÍTICO al cargar el archivo Excel: {e}")
-        return pd.DataFrame(), None
+        return pd.DataFrame(), ColumnProfile()
 
 # (Nota: Se elimina la función auxiliar `_assign_priority` ya que su lógica fue
 #  incorporada de forma vectorizada dentro de `cargar_datos` para mayor eficiencia.)
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+memory_budget.py
+----------------
+Presupuesto de memoria del proceso para los datasets cargados.
+
+Estándares: Google Python Style Guide.
+Cada dataset en memoria cuesta su DataFrame (`memory_usage(deep=True)`), sus
+versiones anteriores conservadas (solo las columnas que ya no comparten con el
+borrador actual), sus índices de calidad, de búsqueda y de orden, las columnas
+normalizadas en la caché de reglas y las vistas guardadas materializadas
+(`modules/saved_views.py`). Si la suma supera el presupuesto, se descargan los datasets menos usados
+(`Dataset.evict`): quedan solo en el backend (SQLite o snapshot) y la próxima
+petición a su `file_id` los recarga de forma transparente.
+
+La medición recorre las celdas de texto, así que no se hace en las peticiones:
+un hilo la ejecuta cada `interval` segundos y cuando un dataset pasa a memoria
+(subida, recarga del backend). El tamaño del DataFrame se reutiliza mientras
+no cambien el objeto ni su número de filas (las ediciones de celda apenas lo
+alteran).
+
+Nunca se descargan el dataset usado más recientemente ni los usados en los
+últimos `HOT_SECONDS` (evita recargas en bucle), ni uno ocupado en ese momento.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from modules.dataset_store import store as default_store
+from modules.priority_manager import cached_bytes, forget_cached
+from modules.saved_views import materialized
+
+# Valores por defecto (se sobrescriben desde la configuración de la app)
+MAX_MB = 1024
+CHECK_INTERVAL_SEC = 30
+# Segundos desde el último uso durante los que un dataset no se descarga
+HOT_SECONDS = 10
+
+
+class MemoryBudget:
+    """
+    Contabilidad de memoria de los datasets y descarga de los más fríos.
+
+    Attributes:
+        store (DatasetStore): Registro de datasets.
+        max_bytes (int): Presupuesto total en bytes (0 o menos: sin límite).
+        last_report (dict | None): Resultado de la última comprobación.
+    """
+
+    def __init__(self, store=None, max_mb: float = MAX_MB):
+        self.store = store or default_store
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._sizes = {}  # {file_id: ((id(df), filas, columnas), bytes)}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.last_report = None
+
+    # --- Medición ---
+
+    def _frame_bytes(self, dataset) -> int:
+        """Tamaño del DataFrame (reutiliza la medición si no cambió su forma)."""
+        df = dataset._df
+        if df is None:
+            return 0
+        key = (id(df), len(df), len(df.columns))
+        cached = self._sizes.get(dataset.file_id)
+        if cached and cached[0] == key:
+            return cached[1]
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        self._sizes[dataset.file_id] = (key, size)
+        return size
+
+    def footprint(self, dataset) -> dict:
+        """
+        Memoria de un dataset.
+
+        Returns:
+            dict: {'file_id', 'resident', 'bytes', 'dataframe', 'quality', 'search', 'parsed', 'sort',
+                   'versions', 'cache', 'last_access'}.
+        """
+        frame = quality = search = parsed = sort = versions = 0
+        # Un dataset ocupado se mide en la próxima pasada (no bloquea peticiones)
+        if dataset.lock.acquire(blocking=False):
+            try:
+                frame = self._frame_bytes(dataset)
+                quality = dataset._quality.nbytes if dataset._quality is not None else 0
+                search = dataset._search.nbytes if dataset._search is not None else 0
+                parsed = dataset._parsed.nbytes if dataset._parsed is not None else 0
+                sort = dataset._sort.nbytes if dataset._sort is not None else 0
+                versions = dataset.frames_nbytes
+            finally:
+                dataset.lock.release()
+        elif dataset.file_id in self._sizes:
+            frame = self._sizes[dataset.file_id][1]
+        cache = cached_bytes(dataset.file_id) + materialized.nbytes(dataset.file_id)
+        return {
+            'file_id': dataset.file_id, 'resident': dataset.resident,
+            'bytes': frame + quality + search + parsed + sort + versions + cache, 'dataframe': frame,
+            'quality': quality, 'search': search, 'parsed': parsed, 'sort': sort, 'versions': versions,
+            'cache': cache,
+            'last_access': dataset.last_access,
+        }
+
+    # --- Presupuesto ---
+
+    def enforce(self) -> dict:
+        """
+        Mide los datasets y descarga los menos usados hasta entrar en el presupuesto.
+
+        Sin límite (`max_bytes <= 0`) solo mide: no descarga nada.
+
+        Returns:
+            dict: Informe con los bytes en uso, el presupuesto, los datasets
+                descargados y si sigue por encima del presupuesto.
+        """
+        with self._lock:
+            now = time.time()
+            datasets = self.store.list(load=False)
+            usage = sorted((self.footprint(ds) for ds in datasets), key=lambda u: u['last_access'])
+            total = sum(u['bytes'] for u in usage)
+            unlimited = self.max_bytes <= 0
+            report = {'bytes_total': 0, 'max_bytes': self.max_bytes, 'evicted': [], 'bytes_freed': 0}
+
+            by_id = {ds.file_id: ds for ds in datasets}
+            # El último residente es el usado más recientemente: nunca se descarga
+            for u in [u for u in usage if u['resident']][:-1]:
+                if unlimited or total <= self.max_bytes:
+                    break
+                if now - u['last_access'] < HOT_SECONDS:
+                    continue
+                dataset = by_id[u['file_id']]
+                if not dataset.lock.acquire(blocking=False):
+                    continue
+                try:
+                    evicted = dataset.evict()
+                finally:
+                    dataset.lock.release()
+                if not evicted:
+                    continue
+                forget_cached(u['file_id'])
+                materialized.forget(u['file_id'])
+                self._sizes.pop(u['file_id'], None)
+                report['evicted'].append(u['file_id'])
+                report['bytes_freed'] += u['bytes']
+                total -= u['bytes']
+
+            live = set(by_id)
+            for file_id in [f for f in self._sizes if f not in live]:
+                del self._sizes[file_id]
+
+            report['bytes_total'] = total
+            report['over_budget'] = not unlimited and total > self.max_bytes
+            report['datasets'] = [
+                {k: u[k] for k in ('file_id', 'resident', 'bytes')} for u in usage
+                if u['file_id'] not in report['evicted']
+            ]
+            self.last_report = report
+
+        if report['evicted']:
+            print(f"INFO: Memoria: {len(report['evicted'])} datasets descargados, "
+                  f"{report['bytes_freed'] / 1e6:.1f} MB liberados, {total / 1e6:.1f} MB en uso.")
+        elif report['over_budget']:
+            print(f"WARN: Memoria por encima del presupuesto ({total / 1e6:.1f} de "
+                  f"{self.max_bytes / 1e6:.1f} MB) sin datasets fríos que descargar.")
+        return report
+
+    # --- Hilo de fondo ---
+
+    def request_check(self) -> None:
+        """Pide una comprobación inmediata (p. ej. tras cargar un dataset)."""
+        self._wake.set()
+
+    def start(self, interval_sec: float = CHECK_INTERVAL_SEC) -> None:
+        """Lanza las comprobaciones en un hilo daemon y se suscribe a las cargas del registro."""
+        if self._thread is not None:
+            return
+        self.store.on_load = self.request_check
+
+        def loop():
+            while True:
+                self._wake.wait(interval_sec)
+                self._wake.clear()
+                try:
+                    self.enforce()
+                except Exception as e:
+                    print(f"ERROR: Falló la comprobación de memoria: {e}")
+
+        self._thread = threading.Thread(target=loop, daemon=True, name='memory-budget')
+        self._thread.start()
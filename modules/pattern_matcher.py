@@ -0,0 +1,113 @@
+"""
+pattern_matcher.py
+------------------
+Búsqueda de múltiples subcadenas en una sola pasada (autómata Aho-Corasick).
+
+Estándares: Google Python Style Guide.
+Uso principal: reglas de prioridad "contiene cualquiera de estas N palabras".
+En lugar de ejecutar un `str.contains` por palabra clave, se construye un único
+autómata con todas las palabras de una columna y cada texto se recorre una vez.
+
+Si está instalado `pyahocorasick` (implementación en C) se usa automáticamente;
+si no, se utiliza la implementación en Python puro de este módulo.
+"""
+
+from collections import deque
+
+try:
+    import ahocorasick  # Opcional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class MultiPatternMatcher:
+    """
+    Autómata Aho-Corasick sobre una lista de patrones.
+
+    Attributes:
+        patterns (list[str]): Patrones únicos, en orden de inserción. Los índices
+            devueltos por `find` hacen referencia a esta lista.
+    """
+
+    def __init__(self, patterns: list[str]):
+        """
+        Construye el autómata.
+
+        Args:
+            patterns (list[str]): Subcadenas a buscar (se ignoran vacías y duplicadas).
+        """
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        self._automaton = None
+
+        if not self.patterns:
+            return
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for idx, pattern in enumerate(self.patterns):
+                self._automaton.add_word(pattern, idx)
+            self._automaton.make_automaton()
+        else:
+            self._build(self.patterns)
+
+    def _build(self, patterns: list[str]) -> None:
+        """Construye las tablas goto/fail/output en Python puro."""
+        goto = [{}]
+        output = [[]]
+
+        # 1. Trie con todos los patrones.
+        for idx, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    output.append([])
+                    nxt = len(goto) - 1
+                    goto[node][ch] = nxt
+                node = nxt
+            output[node].append(idx)
+
+        # 2. Enlaces de fallo por BFS (los hijos de la raíz fallan a la raíz).
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            current = queue.popleft()
+            for ch, child in goto[current].items():
+                queue.append(child)
+                state = fail[current]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(ch, 0)
+                # Heredamos las salidas del sufijo más largo.
+                if output[fail[child]]:
+                    output[child] = output[child] + output[fail[child]]
+
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def find(self, text: str) -> set[int]:
+        """
+        Devuelve los índices de los patrones que aparecen en `text`.
+
+        Args:
+            text (str): Texto donde buscar.
+
+        Returns:
+            set[int]: Índices sobre `self.patterns` (vacío si no hay coincidencias).
+        """
+        if not self.patterns or not text:
+            return set()
+
+        if self._automaton is not None:
+            return {idx for _, idx in self._automaton.iter(text)}
+
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
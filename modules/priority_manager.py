@@ -7,14 +7,61 @@ Estándares: Google Python Style Guide.
 Optimizaciones v18.0:
 - Vectorización de operaciones de string.
 - Agrupación de reglas por columna para evitar re-procesamiento redundante.
+- Caché LRU de columnas normalizadas (clave: versión del dataset) para
+  previsualizar reglas de forma interactiva.
+- Caché LRU de prioridades calculadas por (dataset, versión de datos, hash del
+  conjunto efectivo de reglas): volver a un conjunto de reglas ya calculado
+  (activar/desactivar una regla, alternar vistas) sustituye las columnas en vez
+  de recalcular.
+- Reglas multi-condición (AND) con operadores equals/contains/regex/starts_with.
+  Las condiciones se evalúan sobre los valores ÚNICOS de cada columna y todas las
+  palabras clave "contains" de una columna se buscan con un solo autómata.
+
+Esquema de regla (user_priority_rules.json):
+    Legado (igualdad simple):
+        {"column": "Assignee", "value": "x@y.com", "priority": "Alta", "reason": "...", "active": true}
+    Multi-condición:
+        {"id": "a1b2c3d4", "column": "Vendor Name", "priority": "Alta", "reason": "...", "active": true,
+         "conditions": [
+             {"column": "Vendor Name", "operator": "contains", "values": ["acme", "bimbo"]},
+             {"column": "Currency Code", "operator": "equals", "value": "USD"}
+         ]}
 """
 
-import pandas as pd
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sys
+import uuid
+from collections import OrderedDict
+
+from .column_types import allow_values, is_categorical
 from .json_manager import cargar_json, guardar_json
+from .lazy_import import lazy_import
+from .pattern_matcher import MultiPatternMatcher
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 # Constante que define la ruta del archivo JSON de persistencia.
 RULES_FILE = 'user_priority_rules.json'
 
+# Operadores soportados por las condiciones de una regla.
+OPERATORS = ('equals', 'contains', 'regex', 'starts_with')
+
+# Caché de columnas normalizadas: {(cache_key, columna): np.ndarray}.
+NORMALIZED_CACHE_SIZE = 64
+_normalized_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+# Caché de prioridades: {(file_id, versión de datos, hash de reglas): (_row_id, _priority, _priority_reason)}.
+PRIORITY_CACHE_SIZE = 16
+_priority_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+# Campos de una regla que influyen en el resultado (el id y el estado no).
+_RULE_FIELDS = ('column', 'value', 'conditions', 'priority', 'reason')
+
 
 def _load_data() -> dict:
     """
@@ -79,46 +126,162 @@ def save_settings(new_settings: dict) -> bool:
     return guardar_json(RULES_FILE, data)
 
 
+def rule_conditions(rule: dict) -> list[dict]:
+    """
+    Devuelve las condiciones de una regla, convirtiendo el formato legado.
+
+    Args:
+        rule (dict): Regla en formato legado ({column, value}) o multi-condición.
+
+    Returns:
+        list[dict]: Lista de condiciones {column, operator, value|values}.
+    """
+    if rule.get('conditions'):
+        return rule['conditions']
+    return [{'column': rule.get('column'), 'operator': 'equals', 'value': rule.get('value', '')}]
+
+
+def normalize_rule(rule: dict) -> dict:
+    """
+    Limpia una regla entrante y decide su formato de almacenamiento.
+
+    - Una sola condición de igualdad con un solo valor se guarda en formato
+      legado ({column, value}) para mantener compatibilidad.
+    - `operator`/`values` al nivel superior se tratan como una condición.
+    - Cualquier otra combinación se guarda con `conditions` y un `id` estable.
+
+    Args:
+        rule (dict): Regla recibida desde la API.
+
+    Returns:
+        dict: Regla normalizada (copia).
+    """
+    rule = dict(rule)
+    rule.setdefault('active', True)
+
+    # Operador/valores al nivel superior sin `conditions`: se convierten en una
+    # condición real en lugar de perderse (y acabar como igualdad con "").
+    if not rule.get('conditions') and ('operator' in rule or 'values' in rule):
+        cond = {'column': rule.get('column', ''), 'operator': rule.pop('operator', 'equals')}
+        if 'values' in rule:
+            cond['values'] = rule.pop('values')
+        else:
+            cond['value'] = rule.get('value', '')
+        rule['conditions'] = [cond]
+
+    if not rule.get('conditions'):
+        rule['column'] = str(rule.get('column', '')).strip()
+        rule['value'] = str(rule.get('value', '')).strip()
+        return rule
+
+    conditions = []
+    for cond in rule['conditions']:
+        clean = {
+            'column': str(cond.get('column', '')).strip(),
+            'operator': cond.get('operator', 'equals'),
+        }
+        if isinstance(cond.get('values'), list):
+            clean['values'] = [str(v).strip() for v in cond['values'] if str(v).strip()]
+        else:
+            clean['value'] = str(cond.get('value', '')).strip()
+        conditions.append(clean)
+
+    first = conditions[0]
+    if len(conditions) == 1 and first['operator'] == 'equals' and 'value' in first:
+        rule.pop('conditions', None)
+        rule.pop('id', None)
+        rule['column'], rule['value'] = first['column'], first['value']
+        return rule
+
+    rule['conditions'] = conditions
+    rule['column'] = first['column']  # Columna "principal": agrupación y visualización.
+    rule.pop('value', None)
+    rule.setdefault('id', uuid.uuid4().hex[:8])
+    return rule
+
+
+def validate_rule(rule: dict) -> str | None:
+    """
+    Valida una regla normalizada.
+
+    Args:
+        rule (dict): Regla devuelta por `normalize_rule`.
+
+    Returns:
+        str | None: Mensaje de error o None si la regla es válida.
+    """
+    for cond in rule_conditions(rule):
+        if not cond.get('column'):
+            return "Cada condición necesita una columna."
+        operator = cond.get('operator', 'equals')
+        if operator not in OPERATORS:
+            return f"Operador no soportado: '{operator}'."
+        values = cond.get('values') if 'values' in cond else [cond.get('value', '')]
+        if not any(str(v).strip() for v in values or []):
+            return f"La condición '{operator}' sobre '{cond['column']}' necesita un valor."
+        if operator == 'regex':
+            for pattern in values:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    return f"Expresión regular inválida '{pattern}': {e}"
+    return None
+
+
+def _same_rule(a: dict, b: dict) -> bool:
+    """Identidad de regla: por `id` si existe, si no por (column, value) legado."""
+    if a.get('id') or b.get('id'):
+        return bool(a.get('id')) and a.get('id') == b.get('id')
+    return a.get('column') == b.get('column') and a.get('value') == b.get('value')
+
+
+def merge_rule(rules: list[dict], new_rule: dict) -> list[dict]:
+    """
+    Devuelve una nueva lista de reglas con `new_rule` añadida al final,
+    reemplazando la regla equivalente si ya existía.
+
+    Args:
+        rules (list[dict]): Reglas actuales.
+        new_rule (dict): Regla normalizada.
+
+    Returns:
+        list[dict]: Lista resultante (no modifica `rules`).
+    """
+    conditions = new_rule.get('conditions')
+    return [
+        r for r in rules
+        if not (_same_rule(r, new_rule) or (conditions and r.get('conditions') == conditions))
+    ] + [new_rule]
+
+
 def save_rule(new_rule: dict) -> bool:
     """
     Guarda una nueva regla o actualiza una existente.
 
-    Si ya existe una regla para la misma columna y valor, la sobrescribe.
+    Si ya existe una regla para la misma columna y valor (o el mismo `id` /
+    mismas condiciones en reglas multi-condición), la sobrescribe.
 
     Args:
         new_rule (dict): Diccionario con la definición de la regla 
-                         (column, value, priority, reason, active).
+                         (column, value | conditions, priority, reason, active).
 
     Returns:
         bool: True si se guardó correctamente.
     """
     data = _load_data()
-    current_rules = data['rules']
-    
-    # Normalizamos los inputs para asegurar consistencia en la búsqueda.
-    target_col = new_rule.get('column', '').strip()
-    target_val = new_rule.get('value', '').strip()
-    
-    # Establecemos el estado 'active' por defecto en True si no viene definido.
-    if 'active' not in new_rule:
-        new_rule['active'] = True
-
-    # Filtramos la lista para eliminar la versión anterior de la regla (si existe).
-    # Esto evita duplicados lógicos.
-    updated_rules = [
-        r for r in current_rules 
-        if not (r.get('column') == target_col and r.get('value') == target_val)
-    ]
-    
-    # Añadimos la nueva regla a la lista.
-    updated_rules.append(new_rule)
-    data['rules'] = updated_rules
+    data['rules'] = merge_rule(data['rules'], normalize_rule(new_rule))
     
     # Guardamos el archivo actualizado.
     return guardar_json(RULES_FILE, data)
 
 
-def toggle_rule(column: str, value: str, active_status: bool) -> bool:
+def _find_rule(rules: list[dict], column: str, value: str, rule_id: str | None) -> dict | None:
+    """Busca una regla por `id` o, en reglas legadas, por columna y valor."""
+    target = {'id': rule_id} if rule_id else {'column': column, 'value': value}
+    return next((r for r in rules if _same_rule(r, target)), None)
+
+
+def toggle_rule(column: str, value: str, active_status: bool, rule_id: str | None = None) -> bool:
     """
     Cambia el estado de activación (On/Off) de una regla específica.
 
@@ -126,49 +289,38 @@ def toggle_rule(column: str, value: str, active_status: bool) -> bool:
         column (str): Nombre de la columna de la regla.
         value (str): Valor objetivo de la regla.
         active_status (bool): True para activar, False para desactivar.
+        rule_id (str, optional): Identificador de reglas multi-condición.
 
     Returns:
         bool: True si se encontró y actualizó la regla, False si no existía.
     """
     data = _load_data()
-    found = False
-    
-    # Iteramos sobre las reglas para encontrar la coincidencia.
-    for rule in data['rules']:
-        if rule.get('column') == column and rule.get('value') == value:
-            # Actualizamos el estado.
-            rule['active'] = active_status
-            found = True
-            break
+    rule = _find_rule(data['rules'], column, value, rule_id)
     
     # Solo guardamos si hubo cambios.
-    if found:
+    if rule is not None:
+        rule['active'] = active_status
         return guardar_json(RULES_FILE, data)
     return False
 
 
-def delete_rule(column: str, value: str) -> bool:
+def delete_rule(column: str, value: str, rule_id: str | None = None) -> bool:
     """
     Elimina permanentemente una regla de la base de datos JSON.
 
     Args:
         column (str): Columna objetivo de la regla a eliminar.
         value (str): Valor objetivo de la regla a eliminar.
+        rule_id (str, optional): Identificador de reglas multi-condición.
 
     Returns:
         bool: True si se eliminó (el tamaño de la lista cambió), False si no.
     """
     data = _load_data()
-    original_len = len(data['rules'])
+    rule = _find_rule(data['rules'], column, value, rule_id)
     
-    # Reconstruimos la lista excluyendo la regla coincidente.
-    data['rules'] = [
-        r for r in data['rules'] 
-        if not (r.get('column') == column and r.get('value') == value)
-    ]
-    
-    # Verificamos si se eliminó algo comparando longitudes.
-    if len(data['rules']) < original_len:
+    if rule is not None:
+        data['rules'] = [r for r in data['rules'] if r is not rule]
         return guardar_json(RULES_FILE, data)
     return False
 
@@ -187,14 +339,272 @@ def replace_all_rules(new_rules: list, new_settings: dict) -> bool:
     """
     # Construimos la estructura completa del archivo.
     data = {
-        "rules": new_rules,
+        "rules": [normalize_rule(r) for r in new_rules],
         "settings": new_settings
     }
     # Guardamos directamente, sobrescribiendo lo anterior.
     return guardar_json(RULES_FILE, data)
 
 
-def apply_priority_rules(df: pd.DataFrame) -> pd.DataFrame:
+def get_normalized_column(df: pd.DataFrame, col_name: str, cache_key=None) -> np.ndarray:
+    """
+    Devuelve la columna como texto normalizado (minúsculas, sin espacios).
+
+    Si se indica `cache_key` (p. ej. (file_id, data_version)), el resultado se
+    guarda en una caché LRU para que evaluaciones repetidas sobre la misma
+    versión del dataset no vuelvan a normalizar la columna.
+
+    Args:
+        df (pd.DataFrame): DataFrame de origen.
+        col_name (str): Columna a normalizar.
+        cache_key (hashable, optional): Identificador de la versión del dataset.
+
+    Returns:
+        np.ndarray: Valores normalizados, alineados posicionalmente con `df`.
+    """
+    key = (cache_key, col_name) if cache_key is not None else None
+    if key is not None and key in _normalized_cache:
+        _normalized_cache.move_to_end(key)
+        return _normalized_cache[key]
+
+    series = df[col_name]
+    if is_categorical(series):
+        # Solo se normalizan los valores distintos; las filas toman el suyo por código
+        cats = pd.Index(series.cat.categories.astype(str)).str.lower().str.strip().to_numpy(dtype=object)
+        normalized = np.append(cats, 'nan')[series.cat.codes.to_numpy()]
+    else:
+        normalized = series.astype(str).str.lower().str.strip().to_numpy(dtype=object)
+
+    if key is not None:
+        _normalized_cache[key] = normalized
+        if len(_normalized_cache) > NORMALIZED_CACHE_SIZE:
+            _normalized_cache.popitem(last=False)
+    return normalized
+
+
+def _factorized_column(df: pd.DataFrame, col_name: str, cache_key=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Factoriza la columna normalizada en (códigos, valores únicos), con caché.
+
+    Las condiciones se evalúan sobre los valores únicos (normalmente decenas o
+    cientos) y el resultado se expande a todas las filas con `codes`.
+    """
+    key = (cache_key, col_name, 'factorized') if cache_key is not None else None
+    if key is not None and key in _normalized_cache:
+        _normalized_cache.move_to_end(key)
+        return _normalized_cache[key]
+
+    series = df[col_name]
+    if is_categorical(series):
+        # Factorizar las categorías normalizadas (pocas) y traducir los códigos de las filas
+        cats = pd.Index(series.cat.categories.astype(str)).str.lower().str.strip().to_numpy(dtype=object)
+        cat_codes, uniques = pd.factorize(np.append(cats, 'nan'))
+        codes = cat_codes[series.cat.codes.to_numpy()]
+    else:
+        codes, uniques = pd.factorize(get_normalized_column(df, col_name, cache_key))
+    result = (codes, np.asarray(uniques, dtype=object))
+
+    if key is not None:
+        _normalized_cache[key] = result
+        if len(_normalized_cache) > NORMALIZED_CACHE_SIZE:
+            _normalized_cache.popitem(last=False)
+    return result
+
+
+def rules_hash(rules: list[dict], settings: dict) -> str:
+    """
+    Hash del conjunto efectivo de reglas: las activas (en orden) y la configuración.
+
+    Dos conjuntos con el mismo hash producen las mismas prioridades sobre los
+    mismos datos (las reglas inactivas, los ids y el orden de las claves no cuentan).
+    """
+    active = [
+        {k: rule.get(k) for k in _RULE_FIELDS if rule.get(k) is not None}
+        for rule in (normalize_rule(r) for r in rules) if rule.get('active', True)
+    ]
+    payload = json.dumps({'rules': active, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def cached_priorities(key: tuple, row_ids: pd.Series) -> tuple[pd.Series, pd.Series] | None:
+    """
+    Columnas (_priority, _priority_reason) guardadas para `key`.
+
+    Args:
+        key (tuple): (file_id, versión de datos, hash de reglas).
+        row_ids (pd.Series): `_row_id` actual; si las filas no coinciden (mismo
+            orden) el resultado guardado no sirve y se devuelve None.
+
+    Returns:
+        tuple[pd.Series, pd.Series] | None: Columnas alineadas con `row_ids`, o None.
+    """
+    entry = _priority_cache.get(key)
+    if entry is None:
+        return None
+    ids, priority, reason = entry
+    if len(ids) != len(row_ids) or not np.array_equal(ids.to_numpy(), row_ids.to_numpy()):
+        _priority_cache.pop(key, None)
+        return None
+    _priority_cache.move_to_end(key)
+    return priority.set_axis(row_ids.index), reason.set_axis(row_ids.index)
+
+
+def remember_priorities(key: tuple, row_ids: pd.Series, priority: pd.Series, reason: pd.Series) -> None:
+    """Guarda las prioridades calculadas para `key` (ver `cached_priorities`)."""
+    _priority_cache[key] = (row_ids.copy(), priority.copy(), reason.copy())
+    _priority_cache.move_to_end(key)
+    while len(_priority_cache) > PRIORITY_CACHE_SIZE:
+        _priority_cache.popitem(last=False)
+
+
+def _cached_entries(file_id: str) -> list[tuple]:
+    """Claves de la caché que pertenecen a `file_id` (cache_key = (file_id, data_version))."""
+    return [k for k in list(_normalized_cache) if isinstance(k[0], tuple) and k[0][:1] == (file_id,)]
+
+
+def cached_bytes(file_id: str) -> int:
+    """Memoria aproximada de las columnas normalizadas y prioridades en caché de un dataset."""
+    total = 0
+    for key in _cached_entries(file_id):
+        value = _normalized_cache.get(key)
+        for arr in (value if isinstance(value, tuple) else (value,)):
+            if arr is None:
+                continue
+            total += arr.nbytes
+            if arr.dtype == object:
+                total += sum(sys.getsizeof(v) for v in arr)
+    for key in [k for k in list(_priority_cache) if k[0] == file_id]:
+        entry = _priority_cache.get(key)
+        if entry is not None:
+            total += sum(int(s.memory_usage(index=False, deep=True)) for s in entry)
+    return total
+
+
+def forget_cached(file_id: str) -> None:
+    """Libera las columnas normalizadas y prioridades en caché de un dataset (p. ej. al descargarlo)."""
+    for key in _cached_entries(file_id):
+        _normalized_cache.pop(key, None)
+    for key in [k for k in list(_priority_cache) if k[0] == file_id]:
+        _priority_cache.pop(key, None)
+
+
+def _condition_values(cond: dict) -> list[str]:
+    """Valores normalizados (minúsculas, sin espacios) de una condición."""
+    values = cond.get('values') if 'values' in cond else [cond.get('value', '')]
+    return [str(v).lower().strip() for v in values]
+
+
+def _evaluate_column_conditions(uniques: np.ndarray, conditions: list[dict]) -> list[np.ndarray]:
+    """
+    Evalúa todas las condiciones de UNA columna sobre sus valores únicos.
+
+    Todas las palabras clave de las condiciones `contains` se combinan en un único
+    autómata Aho-Corasick, de modo que cada valor único se recorre una sola vez
+    sin importar cuántas reglas/palabras haya.
+
+    Returns:
+        list[np.ndarray]: Una máscara booleana (sobre `uniques`) por condición.
+    """
+    masks = [np.zeros(len(uniques), dtype=bool) for _ in conditions]
+    texts = pd.Series(uniques, dtype=object)
+
+    # 1. contains: un solo autómata para toda la columna.
+    keyword_owners = {}
+    for i, cond in enumerate(conditions):
+        if cond.get('operator') == 'contains':
+            for keyword in _condition_values(cond):
+                if keyword:
+                    keyword_owners.setdefault(keyword, []).append(i)
+
+    if keyword_owners:
+        matcher = MultiPatternMatcher(list(keyword_owners))
+        owners = [keyword_owners[p] for p in matcher.patterns]
+        for pos, text in enumerate(uniques):
+            for pattern_idx in matcher.find(text):
+                for i in owners[pattern_idx]:
+                    masks[i][pos] = True
+
+    # 2. Resto de operadores (vectorizados sobre los únicos).
+    for i, cond in enumerate(conditions):
+        operator = cond.get('operator', 'equals')
+        values = _condition_values(cond)
+
+        if operator == 'equals':
+            masks[i] = np.isin(uniques, values)
+        elif operator == 'starts_with':
+            prefixes = tuple(v for v in values if v)
+            if prefixes:
+                masks[i] = texts.str.startswith(prefixes).to_numpy(dtype=bool)
+        elif operator == 'regex':
+            for pattern in (cond.get('values') if 'values' in cond else [cond.get('value', '')]):
+                try:
+                    masks[i] |= texts.str.contains(pattern, flags=re.IGNORECASE, regex=True, na=False).to_numpy(dtype=bool)
+                except re.error as e:
+                    print(f"Advertencia: regex inválida '{pattern}': {e}")
+
+    return masks
+
+
+def _ordered_rules(rules: list[dict]) -> list[dict]:
+    """
+    Devuelve las reglas en el orden en que se aplican.
+
+    Las reglas se agrupan por columna (en orden de primera aparición) y dentro
+    de cada columna se respeta el orden original; la última que coincide gana.
+    Para reglas multi-condición se usa la columna de su primera condición.
+    """
+    rules_by_column = {}
+    for rule in rules:
+        col = rule.get('column') or rule_conditions(rule)[0].get('column')
+        if col:
+            rules_by_column.setdefault(col, []).append(rule)
+    return [rule for column_rules in rules_by_column.values() for rule in column_rules]
+
+
+def evaluate_rule_masks(df: pd.DataFrame, rules: list[dict], cache_key=None) -> list[tuple[dict, np.ndarray]]:
+    """
+    Evalúa cada regla (activa o no) sobre el DataFrame sin modificarlo.
+
+    Proceso:
+    1. Agrupa las condiciones de todas las reglas por columna.
+    2. Por columna: factoriza una vez y evalúa todas sus condiciones juntas.
+    3. Combina las condiciones de cada regla con AND (máscaras vectoriales).
+
+    Args:
+        df (pd.DataFrame): DataFrame de facturas.
+        rules (list[dict]): Reglas a evaluar.
+        cache_key (hashable, optional): Clave para la caché de columnas normalizadas.
+
+    Returns:
+        list[tuple[dict, np.ndarray]]: Pares (regla, máscara booleana) en orden de aplicación.
+    """
+    ordered = _ordered_rules(rules)
+
+    # 1. Condiciones agrupadas por columna: {col: [(idx_regla, condición), ...]}
+    by_column = {}
+    for rule_idx, rule in enumerate(ordered):
+        for cond in rule_conditions(rule):
+            by_column.setdefault(cond.get('column'), []).append((rule_idx, cond))
+
+    # 2. Evaluación por columna; columnas inexistentes => la condición no coincide.
+    rule_masks = [np.ones(len(df), dtype=bool) for _ in ordered]
+    for col_name, entries in by_column.items():
+        if col_name not in df.columns:
+            for rule_idx, _ in entries:
+                rule_masks[rule_idx][:] = False
+            continue
+
+        codes, uniques = _factorized_column(df, col_name, cache_key)
+        unique_masks = _evaluate_column_conditions(uniques, [cond for _, cond in entries])
+
+        # 3. AND entre condiciones de la misma regla.
+        for (rule_idx, _), unique_mask in zip(entries, unique_masks):
+            rule_masks[rule_idx] &= unique_mask[codes]
+
+    return list(zip(ordered, rule_masks))
+
+
+def apply_priority_rules(df: pd.DataFrame, rules: list[dict] | None = None, cache_key=None) -> pd.DataFrame:
     """
     Aplica las reglas de prioridad personalizadas al DataFrame de forma vectorizada.
 
@@ -204,54 +614,94 @@ def apply_priority_rules(df: pd.DataFrame) -> pd.DataFrame:
 
     Args:
         df (pd.DataFrame): El DataFrame principal de facturas.
+        rules (list[dict], optional): Reglas a aplicar. Por defecto, las guardadas.
+        cache_key (hashable, optional): Clave para la caché de columnas normalizadas.
 
     Returns:
         pd.DataFrame: El DataFrame con las columnas '_priority' y '_priority_reason' actualizadas.
     """
     # Cargamos todas las reglas.
-    rules = load_rules()
+    if rules is None:
+        rules = load_rules()
     
     # Aseguramos que exista la columna de razón.
     if '_priority_reason' not in df.columns:
         df['_priority_reason'] = ""
 
-    # Si no hay reglas, retornamos el DF intacto.
-    if not rules:
+    # Solo procesamos reglas activas.
+    active_rules = [r for r in rules if r.get('active', True)]
+    if not active_rules:
         return df
 
-    # 1. Agrupar reglas por columna para optimizar el procesamiento.
-    # Estructura: {'NombreColumna': [Regla1, Regla2, ...]}
-    rules_by_column = {}
-    for rule in rules:
-        if rule.get('active', True):  # Solo procesamos reglas activas.
-            col = rule.get('column')
-            if col:
-                if col not in rules_by_column:
-                    rules_by_column[col] = []
-                rules_by_column[col].append(rule)
-
-    # 2. Iterar por cada columna única que tenga reglas asociadas.
-    for col_name, column_rules in rules_by_column.items():
-        # Verificamos que la columna exista en el DataFrame.
-        if col_name in df.columns:
-            # --- OPTIMIZACIÓN ---
-            # Normalizamos la columna UNA SOLA VEZ para todas las reglas de esta columna.
-            # Convertimos a string, minúsculas y quitamos espacios.
-            col_normalized_series = df[col_name].astype(str).str.lower().str.strip()
-            
-            # Aplicamos cada regla asociada a esta columna.
-            for rule in column_rules:
-                # Obtenemos los valores de la regla.
-                val_rule = str(rule.get('value', '')).lower().strip()
-                prio = rule.get('priority')
-                reason = rule.get('reason', 'Regla personalizada')
-
-                # Creamos la máscara booleana vectorial.
-                mask = col_normalized_series == val_rule
-                
-                # Si hay coincidencias, aplicamos la actualización vectorizada.
-                if mask.any():
-                    df.loc[mask, '_priority'] = prio
-                    df.loc[mask, '_priority_reason'] = reason
-
-    return df
\ No newline at end of file
+    # Columnas categóricas: declarar antes las prioridades/razones que pueden escribir las reglas
+    allow_values(df, '_priority', {r.get('priority') for r in active_rules})
+    allow_values(df, '_priority_reason', {r.get('reason', 'Regla personalizada') for r in active_rules})
+
+    for rule, mask in evaluate_rule_masks(df, active_rules, cache_key):
+        # Si hay coincidencias, aplicamos la actualización vectorizada.
+        if mask.any():
+            df.loc[mask, '_priority'] = rule.get('priority')
+            df.loc[mask, '_priority_reason'] = rule.get('reason', 'Regla personalizada')
+
+    return df
+
+
+def preview_rules(df: pd.DataFrame, rules: list[dict], base_priority: np.ndarray, cache_key=None) -> dict:
+    """
+    Simula (dry-run) la aplicación de un conjunto de reglas sin tocar el DataFrame.
+
+    Para cada regla calcula cuántas filas coinciden (`matched`), cuántas quedan
+    finalmente con su prioridad (`effective`) y cuántas son pisadas por una regla
+    posterior (`overridden`). También cuenta cuántas filas cambiarían respecto a
+    la columna `_priority` actual.
+
+    Args:
+        df (pd.DataFrame): DataFrame de facturas (no se modifica).
+        rules (list[dict]): Conjunto de reglas candidato.
+        base_priority (np.ndarray): Prioridad base por fila (antes de reglas).
+        cache_key (hashable, optional): Clave para la caché de columnas normalizadas.
+
+    Returns:
+        dict: {'total_filas', 'filas_con_cambio', 'por_prioridad', 'reglas': [...]}.
+    """
+    # Las máscaras no dependen del orden: se evalúan todas las reglas de una vez
+    # (las inactivas solo aportan su `matched`).
+    evaluated = evaluate_rule_masks(df, rules, cache_key)
+    masks = {id(rule): mask for rule, mask in evaluated}
+
+    # El orden de aplicación se calcula solo sobre las activas, igual que
+    # `apply_priority_rules`; una inactiva no debe alterar el orden de columnas.
+    active = _ordered_rules([r for r in rules if r.get('active', True)])
+
+    # Índice de la regla ganadora por fila (-1 = se queda con la base).
+    winner = np.full(len(df), -1, dtype=np.int64)
+    for i, rule in enumerate(active):
+        winner[masks[id(rule)]] = i
+
+    final_priority = np.asarray(base_priority, dtype=object).copy()
+    effective_by_rule = {}
+    for i, rule in enumerate(active):
+        won = winner == i
+        final_priority[won] = rule.get('priority')
+        effective_by_rule[id(rule)] = int(won.sum())
+
+    stats = []
+    for rule, mask in evaluated:
+        matched = int(mask.sum())
+        effective = effective_by_rule.get(id(rule), 0)
+        stats.append({
+            **rule,
+            "matched": matched,
+            "effective": effective,
+            "overridden": matched - effective if rule.get('active', True) else 0,
+        })
+
+    current = df['_priority'].to_numpy(dtype=object) if '_priority' in df.columns else final_priority
+    values, counts = np.unique(final_priority.astype(str), return_counts=True)
+
+    return {
+        "total_filas": len(df),
+        "filas_con_cambio": int((final_priority != current).sum()),
+        "por_prioridad": {v: int(c) for v, c in zip(values, counts)},
+        "reglas": stats,
+    }
@@ -0,0 +1,154 @@
+"""
+refresh.py
+----------
+Actualización incremental de un dataset con un extracto nuevo del mismo reporte.
+
+Estándares: Google Python Style Guide.
+Al cargar un extracto, cada fila guarda el hash de su contenido original
+(`_src_hash`; las filas añadidas a mano llevan 0). Al subir el extracto del
+día siguiente en modo "actualizar", las filas se emparejan por número de
+factura (y, si se repite, por orden de aparición) y se clasifican:
+
+- nueva:      solo está en el extracto nuevo -> se añade.
+- modificada: su hash cambió respecto al extracto anterior -> toma los valores nuevos.
+- sin cambios: mismo hash -> se conserva la fila de trabajo tal cual
+  (ediciones del usuario, prioridad y razón incluidas).
+- eliminada:  venía de un extracto y ya no aparece -> se quita.
+
+Las filas añadidas a mano no se tocan. Las reglas solo se vuelven a evaluar
+sobre las filas nuevas y modificadas (lo hace quien llama). Si el extracto trae
+columnas nuevas se rellenan en todas las filas sin marcarlas como modificadas;
+las que desaparecen se conservan con su valor actual.
+"""
+
+from __future__ import annotations
+
+from .column_types import allow_values, concat_rows
+from .data_quality import user_columns
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+SOURCE_HASH = '_src_hash'
+# Valores iniciales de las columnas internas en filas nuevas (las recalcula el commit/reglas)
+NEW_ROW_DEFAULTS = {'_row_status': '', '_priority': 'Media', '_priority_reason': ''}
+
+
+def row_hashes(df: pd.DataFrame, columns=None) -> np.ndarray:
+    """
+    Hash del contenido de cada fila en `columns` (por defecto, las del usuario).
+
+    Columnas categóricas o de texto dan el mismo hash para los mismos valores.
+
+    Returns:
+        np.ndarray: Un int64 por fila (nunca 0, reservado para filas manuales).
+    """
+    columns = user_columns(df) if columns is None else list(columns)
+    h = np.zeros(len(df), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for col in columns:
+            h = h * np.uint64(1000003) ^ pd.util.hash_array(df[col].to_numpy(dtype=object), categorize=True)
+    h[h == 0] = 1
+    return h.view(np.int64)
+
+
+def stamp(df: pd.DataFrame) -> pd.DataFrame:
+    """Añade `_src_hash` (contenido original de cada fila del extracto)."""
+    df[SOURCE_HASH] = row_hashes(df)
+    return df
+
+
+def _occurrence_keys(keys: pd.Series) -> pd.Index:
+    """Clave única por fila: factura + número de aparición (para facturas repetidas)."""
+    k = keys.astype(str).str.strip()
+    return pd.Index(k + '\x1f' + k.groupby(k).cumcount().astype(str))
+
+
+def merge_extract(current: pd.DataFrame, fresh: pd.DataFrame, key_col: str) -> tuple[pd.DataFrame, dict, dict]:
+    """
+    Fusiona un extracto nuevo con el dataset de trabajo.
+
+    Args:
+        current (pd.DataFrame): Dataset de trabajo (con `_row_id` y columnas internas).
+        fresh (pd.DataFrame): Extracto nuevo, solo columnas del usuario (ver `leer_excel`).
+        key_col (str): Columna de número de factura (debe existir en ambos).
+
+    Returns:
+        tuple[pd.DataFrame, dict, dict]:
+            - Dataset fusionado (sin recalcular prioridades).
+            - Ids afectados: {'added', 'updated', 'removed'}.
+            - Conteos: {'nuevas', 'modificadas', 'sin_cambios', 'eliminadas', 'manuales'}.
+    """
+    fresh_cols = user_columns(fresh)
+    cur_cols = user_columns(current)
+    new_cols = [c for c in fresh_cols if c not in cur_cols]
+
+    # Se compara sobre las columnas del extracto anterior (las que faltan cuentan como "");
+    # el hash que se guarda incluye además las columnas nuevas.
+    view = fresh.reindex(columns=cur_cols + new_cols, fill_value="")
+    compare_hash = row_hashes(view, cur_cols)
+    fresh_hash = row_hashes(view, cur_cols + new_cols)
+
+    # Hash de referencia: el del extracto anterior (o, en datasets antiguos, el contenido actual)
+    if SOURCE_HASH in current.columns:
+        baseline = current[SOURCE_HASH].to_numpy(dtype=np.int64)
+    else:
+        baseline = row_hashes(current, cur_cols)
+    from_extract = baseline != 0
+
+    ext_pos = np.flatnonzero(from_extract)
+    match = _occurrence_keys(current[key_col].iloc[ext_pos]).get_indexer(_occurrence_keys(fresh[key_col]))
+    matched = match >= 0
+    cur_matched = ext_pos[match[matched]]
+
+    changed = compare_hash[matched] != baseline[cur_matched]
+    changed_cur, changed_fresh = cur_matched[changed], np.flatnonzero(matched)[changed]
+    removed_cur = np.setdiff1d(ext_pos, cur_matched)
+    new_fresh = np.flatnonzero(~matched)
+
+    row_ids = current['_row_id'].to_numpy()
+    ids = {
+        'updated': [r.item() for r in row_ids[changed_cur]],
+        'removed': [r.item() for r in row_ids[removed_cur]],
+    }
+
+    merged = current.drop(index=current.index[removed_cur]).reset_index(drop=True)
+    if SOURCE_HASH not in merged.columns:
+        merged[SOURCE_HASH] = baseline[np.setdiff1d(np.arange(len(current)), removed_cur)]
+    for col in new_cols:
+        merged[col] = ""
+
+    def _write(cur_pos, fresh_pos, columns):
+        pos = pd.Index(merged['_row_id']).get_indexer(row_ids[cur_pos])
+        for col in columns:
+            values = view[col].to_numpy(dtype=object)[fresh_pos]
+            allow_values(merged, col, values)
+            merged.iloc[pos, merged.columns.get_loc(col)] = values
+        merged.iloc[pos, merged.columns.get_loc(SOURCE_HASH)] = fresh_hash[fresh_pos]
+
+    # Columnas nuevas: sus valores en todas las filas emparejadas (sin contar como modificadas);
+    # filas modificadas: todas las columnas del extracto nuevo
+    if new_cols and len(cur_matched):
+        _write(cur_matched, np.flatnonzero(matched), new_cols)
+    if len(changed_cur):
+        _write(changed_cur, changed_fresh, fresh_cols)
+
+    # Filas nuevas: ids a continuación del máximo actual
+    start = int(row_ids.max()) + 1 if len(row_ids) else 0
+    ids['added'] = list(range(start, start + len(new_fresh)))
+    if len(new_fresh):
+        added = view.iloc[new_fresh].reset_index(drop=True)
+        added.insert(0, '_row_id', ids['added'])
+        added[SOURCE_HASH] = fresh_hash[new_fresh]
+        for col in merged.columns:
+            if col not in added.columns:
+                added[col] = NEW_ROW_DEFAULTS.get(col, "")
+        merged = concat_rows([merged, added[merged.columns]])
+
+    report = {
+        'nuevas': len(new_fresh), 'modificadas': len(changed_cur),
+        'sin_cambios': int(matched.sum()) - len(changed_cur), 'eliminadas': len(removed_cur),
+        'manuales': int((~from_extract).sum()),
+    }
+    return merged, ids, report
@@ -0,0 +1,292 @@
+"""
+saved_views.py
+--------------
+Vistas guardadas en el servidor y sus resultados materializados.
+
+Estándares: Google Python Style Guide.
+Una vista es la configuración de trabajo del equipo: filtros, columnas
+visibles, tipo de vista (detallada/agrupada), columna de agrupación y,
+opcionalmente, las reglas de prioridad con las que se usa
+(user_saved_views.json).
+
+Materialización (`ViewCache`): por cada (dataset, vista) se guarda qué filas
+cumplen los filtros, su monto ya convertido a número y su valor de agrupación,
+junto con la versión del dataset. Al volver a abrir la vista:
+- Misma versión: se responde con lo guardado.
+- Versión posterior: se piden al dataset los cambios desde entonces
+  (`changes_since`) y solo esas filas se vuelven a evaluar. Los filtros miran
+  cada fila por separado, así que el resultado es el mismo que filtrar todo.
+- Sin registro de cambios suficiente (reemplazo completo, otro proceso...):
+  se reconstruye desde cero.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+
+from .column_profile import parse_amounts
+from .filters import aplicar_filtros_dinamicos
+from .json_manager import cargar_json, guardar_json
+from .lazy_import import lazy_import
+from .priority_manager import normalize_rule
+
+pd = lazy_import('pandas')
+
+VIEWS_FILE = 'user_saved_views.json'
+VIEW_TYPES = ('detailed', 'grouped')
+# Materializaciones que se conservan (LRU, entre todos los datasets)
+MATERIALIZED_LIMIT = 64
+
+AMOUNT = '_tm'
+GROUP = '_grupo'
+
+
+# ==============================================================================
+# DEFINICIONES
+# ==============================================================================
+
+def normalize_view(view: dict) -> dict:
+    """
+    Devuelve la vista con el esquema canónico.
+
+    Esquema:
+        {"id": "a1b2c3d4", "name": "Cierre USD", "view_type": "detailed",
+         "filters": [{"columna": "Currency Code", "valor": "USD"}],
+         "visible_columns": [...], "group_by": "Assignee",
+         "rules": [...], "settings": {...}}   # reglas opcionales
+    """
+    filters = [
+        {'columna': f.get('columna'), 'valor': str(f.get('valor'))}
+        for f in view.get('filters') or [] if f.get('columna') and f.get('valor') not in (None, '')
+    ]
+    view_type = view.get('view_type') if view.get('view_type') in VIEW_TYPES else 'detailed'
+    out = {
+        'id': str(view.get('id') or uuid.uuid4().hex[:8]),
+        'name': str(view.get('name') or '').strip(),
+        'view_type': view_type,
+        'filters': filters,
+        'visible_columns': list(view.get('visible_columns') or []),
+        'group_by': view.get('group_by') or '',
+    }
+    if view.get('rules') is not None or view.get('settings') is not None:
+        out['rules'] = [normalize_rule(r) for r in view.get('rules') or []]
+        out['settings'] = view.get('settings') or {}
+    return out
+
+
+def load_views() -> list[dict]:
+    """Lista de vistas guardadas."""
+    return cargar_json(VIEWS_FILE).get('views', [])
+
+
+def get_view(view_id: str) -> dict | None:
+    """Vista por id (None si no existe)."""
+    return next((v for v in load_views() if v.get('id') == view_id), None)
+
+
+def save_view(view: dict) -> dict:
+    """
+    Crea o sustituye una vista (mismo id o, si no trae id, mismo nombre).
+
+    Returns:
+        dict: La vista guardada (con su id).
+    """
+    views = load_views()
+    if not view.get('id'):
+        same_name = next((v for v in views if v.get('name') == str(view.get('name') or '').strip()), None)
+        if same_name:
+            view = {**view, 'id': same_name['id']}
+    view = normalize_view(view)
+    views = [v for v in views if v.get('id') != view['id']] + [view]
+    guardar_json(VIEWS_FILE, {'views': views})
+    materialized.forget_view(view['id'])
+    return view
+
+
+def delete_view(view_id: str) -> bool:
+    """Elimina una vista. Devuelve False si no existía."""
+    views = load_views()
+    kept = [v for v in views if v.get('id') != view_id]
+    if len(kept) == len(views):
+        return False
+    guardar_json(VIEWS_FILE, {'views': kept})
+    materialized.forget_view(view_id)
+    return True
+
+
+# ==============================================================================
+# AGREGADOS
+# ==============================================================================
+
+def group_totals(keys: pd.Series, amounts: pd.Series | None) -> pd.DataFrame:
+    """
+    Totales por grupo con las columnas que espera la vista agrupada.
+
+    Args:
+        keys (pd.Series): Valor de agrupación de cada fila (su nombre es el de la columna).
+        amounts (pd.Series | None): Monto numérico de cada fila (None si no hay columna de monto).
+
+    Returns:
+        pd.DataFrame: [<columna>, Total_sum, Total_mean, Total_min, Total_max, Total_count].
+    """
+    col = keys.name
+    if amounts is None:
+        gb = keys.to_frame().groupby(col).size().reset_index(name='Total_count')
+        for c in ['Total_sum', 'Total_mean', 'Total_min', 'Total_max']: gb[c] = 0
+        return gb
+
+    frame = pd.DataFrame({col: keys.to_numpy(), AMOUNT: amounts.to_numpy()})
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        frame[col] = frame[col].astype(keys.dtype)
+    gb = frame.groupby(col)[AMOUNT].agg(['sum', 'mean', 'min', 'max', 'count']).reset_index()
+    gb = gb.rename(columns={
+        'sum': 'Total_sum', 'mean': 'Total_mean', 'min': 'Total_min', 'max': 'Total_max', 'count': 'Total_count'
+    })
+    gb[['Total_sum', 'Total_mean', 'Total_min', 'Total_max']] = \
+        gb[['Total_sum', 'Total_mean', 'Total_min', 'Total_max']].round(2)
+    return gb
+
+
+# ==============================================================================
+# MATERIALIZACIÓN
+# ==============================================================================
+
+class MaterializedView:
+    """
+    Resultado de una vista sobre una versión concreta de un dataset.
+
+    Attributes:
+        version (int): Versión del dataset a la que corresponde.
+        signature (tuple): Filtros, agrupación y columna de monto con los que se calculó.
+        members (pd.DataFrame): Una fila por factura visible, indexada por `_row_id`
+            (texto), con el monto numérico y el valor de agrupación.
+        rebuilt (bool): La última actualización fue completa (no incremental).
+    """
+
+    def __init__(self, signature: tuple, version: int, members: pd.DataFrame):
+        self.signature = signature
+        self.version = version
+        self.members = members
+        self.rebuilt = True
+
+    @property
+    def row_ids(self) -> list[str]:
+        return list(self.members.index)
+
+    @property
+    def nbytes(self) -> int:
+        total = int(self.members.memory_usage(index=False, deep=True).sum())
+        return total + sum(sys.getsizeof(r) for r in self.members.index)
+
+    def totals(self) -> tuple[int, float, float]:
+        """(facturas, monto total, monto promedio)."""
+        amounts = self.members[AMOUNT]
+        return len(amounts), float(amounts.sum()), float(amounts.mean()) if len(amounts) else 0.0
+
+    def groups(self) -> pd.DataFrame | None:
+        """Totales por grupo (None si la vista no agrupa)."""
+        group_col, amount_col = self.signature[1], self.signature[2]
+        if not group_col:
+            return None
+        keys = self.members[GROUP].rename(group_col)
+        return group_totals(keys, self.members[AMOUNT] if amount_col else None)
+
+
+def _signature(view: dict, amount_col: str | None) -> tuple:
+    filters = tuple((f['columna'], f['valor']) for f in view['filters'])
+    return filters, view.get('group_by') or '', amount_col
+
+
+def _members(dataset, rows: pd.DataFrame, group_col: str, amount_col: str | None) -> pd.DataFrame:
+    """Columnas materializadas de `rows` (ya filtradas); los montos, ya convertidos si están en memoria."""
+    members = pd.DataFrame(index=pd.Index(rows['_row_id'].astype(str).to_numpy(), name='_row_id'))
+    if not amount_col:
+        members[AMOUNT] = 0.0
+    elif dataset.resident:
+        members[AMOUNT] = dataset.parsed.values(amount_col, rows['_row_id']).fillna(0).to_numpy()
+    else:
+        members[AMOUNT] = parse_amounts(rows[amount_col]).to_numpy()
+    if group_col and group_col in rows.columns:
+        members[GROUP] = rows[group_col].to_numpy()
+        if isinstance(rows[group_col].dtype, pd.CategoricalDtype):
+            members[GROUP] = members[GROUP].astype(rows[group_col].dtype)
+    elif group_col:
+        members[GROUP] = ""
+    return members
+
+
+class ViewCache:
+    """Materializaciones por (file_id, view_id), en LRU y seguras entre hilos."""
+
+    def __init__(self, limit: int = MATERIALIZED_LIMIT):
+        self.limit = limit
+        self._entries: "OrderedDict[tuple, MaterializedView]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dataset, view: dict, amount_col: str | None) -> MaterializedView:
+        """
+        Materialización de `view` sobre la versión actual de `dataset`.
+
+        Debe llamarse con `dataset.lock` tomado (la lee y la deja al día).
+        """
+        key = (dataset.file_id, view['id'])
+        signature = _signature(view, amount_col)
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and (entry.signature != signature or entry.version > dataset.version):
+            entry = None
+        if entry is not None and entry.version < dataset.version:
+            self._refresh(dataset, view, entry)
+        if entry is None or entry.version != dataset.version:
+            rows = dataset.query(view['filters'])
+            entry = MaterializedView(signature, dataset.version, _members(dataset, rows, signature[1], amount_col))
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.limit:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _refresh(dataset, view: dict, entry: MaterializedView) -> None:
+        """Aplica los cambios desde `entry.version`; si no hay registro, no hace nada."""
+        delta = dataset.changes_since(entry.version)
+        if delta is None:
+            return
+        touched = delta['upserted'] | delta['removed']
+        members = entry.members[~entry.members.index.isin(touched)]
+        if delta['upserted']:
+            rows = aplicar_filtros_dinamicos(dataset.rows(delta['upserted']), view['filters'])
+            if len(rows):
+                fresh = _members(dataset, rows, entry.signature[1], entry.signature[2])
+                members = pd.concat([members, fresh]) if len(members) else fresh
+        entry.members = members
+        entry.version = dataset.version
+        entry.rebuilt = False
+
+    def nbytes(self, file_id: str) -> int:
+        """Memoria de las materializaciones de un dataset."""
+        with self._lock:
+            entries = [e for (fid, _), e in self._entries.items() if fid == file_id]
+        return sum(e.nbytes for e in entries)
+
+    def forget(self, file_id: str) -> None:
+        """Descarta las materializaciones de un dataset."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == file_id]:
+                del self._entries[key]
+
+    def forget_view(self, view_id: str) -> None:
+        """Descarta las materializaciones de una vista (al modificarla o borrarla)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == view_id]:
+                del self._entries[key]
+
+
+# Instancia única del proceso.
+materialized = ViewCache()
@@ -0,0 +1,238 @@
+"""
+search_index.py
+---------------
+Búsqueda global (en todas las columnas del usuario) con un índice por dataset.
+
+Estándares: Google Python Style Guide.
+Buscar un texto con `str.contains` en 40+ columnas recorre todas las celdas.
+`SearchIndex` guarda, por columna, el vocabulario de valores distintos (en
+minúsculas) y el código de valor de cada fila:
+
+- Los valores distintos de una columna se concatenan en un solo texto y la
+  búsqueda parcial es una pasada de `re.finditer` sobre él (código C); cada
+  coincidencia se traduce a su valor con `np.searchsorted`.
+- Las filas se obtienen expandiendo los valores encontrados por sus códigos
+  (una indexación de numpy por columna con coincidencias).
+- Se ordena por tipo de coincidencia (exacta, prefijo, parcial) y por campo
+  (número de factura y proveedor primero, ver `FIELD_PRIORITY`).
+
+Se mantiene como `QualityIndex`: se construye en el primer uso y después cada
+commit actualiza solo las filas tocadas (`update`, `remove`).
+
+La misma búsqueda está disponible como filtro con la columna `ANY_COLUMN`
+("*") en `aplicar_filtros_dinamicos`, `Dataset.query` y SQLite.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+
+from .column_types import is_categorical
+from .data_quality import user_columns
+from .filters import ANY_COLUMN  # noqa: F401 (reexportado)
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Campos que se listan primero ante coincidencias del mismo tipo (en este orden).
+FIELD_PRIORITY = ('invoice #', 'invoice number', 'n° factura', 'factura', 'invoice id', 'vendor name')
+# Máximo de resultados por búsqueda.
+SEARCH_LIMIT = 50
+
+EXACT, PREFIX, PARTIAL, NO_MATCH = 0, 1, 2, 3
+MATCH_NAMES = {EXACT: 'exacta', PREFIX: 'prefijo', PARTIAL: 'parcial'}
+
+# Separador entre valores del texto concatenado (no aparece en las celdas).
+_SEP = '\x00'
+
+
+def normalized_values(series: pd.Series) -> np.ndarray:
+    """Valores en minúsculas (texto vacío para nulos), igual que el filtro parcial."""
+    if is_categorical(series):
+        cats = pd.Index(series.cat.categories.astype(str)).str.lower().to_numpy(dtype=object)
+        return np.append(cats, '')[series.cat.codes.to_numpy()]
+    return series.astype(str).str.lower().where(series.notna(), '').to_numpy(dtype=object)
+
+
+class _Vocabulary:
+    """Valores distintos de una columna y su texto concatenado para buscar."""
+
+    def __init__(self, uniques):
+        self.values = [str(v) for v in uniques]
+        self._ids = {v: i for i, v in enumerate(self.values)}
+        self._text = None
+        self._starts = None
+
+    def encode(self, values) -> np.ndarray:
+        """Código de cada valor (los nuevos se añaden al vocabulario)."""
+        inverse, uniques = pd.factorize(values)
+        codes = np.empty(len(uniques), dtype=np.int32)
+        for i, v in enumerate(uniques):
+            code = self._ids.get(v)
+            if code is None:
+                code = self._ids[v] = len(self.values)
+                self.values.append(v)
+                self._text = None
+            codes[i] = code
+        return codes[inverse]
+
+    def matching(self, needle: str) -> np.ndarray:
+        """Ids de los valores que contienen `needle`."""
+        if self._text is None:
+            self._text = _SEP.join(self.values)
+            lengths = np.fromiter((len(v) + 1 for v in self.values), dtype=np.int64, count=len(self.values))
+            self._starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        offsets = np.fromiter((m.start() for m in re.finditer(re.escape(needle), self._text)), dtype=np.int64)
+        if not len(offsets):
+            return offsets
+        return np.unique(np.searchsorted(self._starts, offsets, side='right') - 1)
+
+    @property
+    def nbytes(self) -> int:
+        text = sys.getsizeof(self._text) if self._text is not None else 0
+        starts = self._starts.nbytes if self._starts is not None else 0
+        values = sum(sys.getsizeof(v) for v in self.values) + sys.getsizeof(self.values)
+        return values + sys.getsizeof(self._ids) + text + starts
+
+
+class SearchIndex:
+    """
+    Índice de búsqueda global de un dataset.
+
+    Attributes:
+        columns (list): Columnas del usuario indexadas.
+        order (list): Posiciones de `columns` en orden de prioridad para ordenar resultados.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = user_columns(df)
+        ids = df['_row_id'].to_numpy(dtype=object)
+        self._slot = {str(r): i for i, r in enumerate(ids)}
+        self._row_ids = ids.copy()
+        self._free = []
+
+        self._vocab, self._codes = [], []
+        for col in self.columns:
+            codes, uniques = pd.factorize(normalized_values(df[col]))
+            self._vocab.append(_Vocabulary(uniques))
+            self._codes.append(codes.astype(np.int32))
+
+        lower = [str(c).lower().strip() for c in self.columns]
+        rank = {name: i for i, name in enumerate(FIELD_PRIORITY)}
+        self.order = sorted(range(len(self.columns)), key=lambda i: (rank.get(lower[i], len(rank)), i))
+
+    @property
+    def num_rows(self) -> int:
+        return len(self._slot)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria aproximada del índice."""
+        codes = sum(c.nbytes for c in self._codes)
+        vocab = sum(v.nbytes for v in self._vocab)
+        ids = sum(sys.getsizeof(r) for r in self._slot) + self._row_ids.nbytes
+        return codes + vocab + ids + sys.getsizeof(self._slot)
+
+    def compatible(self, df: pd.DataFrame) -> bool:
+        """False si cambiaron las columnas del dataset (hay que reconstruir)."""
+        return user_columns(df) == self.columns
+
+    def _take_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+        # Sin huecos libres: ampliar al doble (las altas son poco frecuentes)
+        size = len(self._row_ids)
+        grow = max(size, 16)
+        self._codes = [np.concatenate([c, np.full(grow, -1, dtype=np.int32)]) for c in self._codes]
+        self._row_ids = np.concatenate([self._row_ids, np.full(grow, None, dtype=object)])
+        self._free = list(range(size + grow - 1, size, -1))
+        return size
+
+    def update(self, rows: pd.DataFrame) -> None:
+        """Reindexa filas nuevas o modificadas (solo esas filas)."""
+        if rows.empty:
+            return
+        ids = rows['_row_id'].to_numpy(dtype=object)
+        slots = np.empty(len(ids), dtype=np.int64)
+        for i, rid in enumerate(ids):
+            key = str(rid)
+            if key not in self._slot:
+                self._slot[key] = self._take_slot()
+            slots[i] = self._slot[key]
+        self._row_ids[slots] = ids
+        for vocab, codes, col in zip(self._vocab, self._codes, self.columns):
+            codes[slots] = vocab.encode(normalized_values(rows[col]))
+
+    def remove(self, row_ids) -> None:
+        """Quita filas eliminadas del índice."""
+        slots = [s for s in (self._slot.pop(str(r), None) for r in row_ids) if s is not None]
+        if not slots:
+            return
+        for codes in self._codes:
+            codes[slots] = -1
+        self._row_ids[slots] = None
+        self._free.extend(slots)
+
+    def _best_matches(self, needle: str) -> tuple[np.ndarray, np.ndarray]:
+        """Mejor coincidencia de cada hueco: (tipo, posición de columna), NO_MATCH si ninguna."""
+        kind = np.full(len(self._row_ids), NO_MATCH, dtype=np.int8)
+        field = np.full(len(self._row_ids), -1, dtype=np.int32)
+        stripped = needle.strip()
+        for c in self.order:
+            vocab = self._vocab[c]
+            hits = vocab.matching(needle)
+            if not len(hits):
+                continue
+            # Tipo de coincidencia de cada valor encontrado; el último hueco (-1) = sin coincidencia
+            value_kind = np.full(len(vocab.values) + 1, NO_MATCH, dtype=np.int8)
+            value_kind[hits] = [
+                EXACT if v.strip() == stripped else PREFIX if v.lstrip().startswith(stripped) else PARTIAL
+                for v in (vocab.values[h] for h in hits)
+            ]
+            k = value_kind[self._codes[c]]
+            better = k < kind  # Columnas en orden de prioridad: ante empate gana la primera
+            kind[better], field[better] = k[better], c
+        return kind, field
+
+    def matching(self, needles) -> list:
+        """`_row_id` de las filas con alguna coincidencia parcial de alguno de `needles` (OR)."""
+        found = np.zeros(len(self._row_ids), dtype=bool)
+        for needle in needles:
+            needle = str(needle).lower()
+            if not needle or _SEP in needle:
+                continue
+            for vocab, codes in zip(self._vocab, self._codes):
+                hits = vocab.matching(needle)
+                if len(hits):
+                    mask = np.zeros(len(vocab.values) + 1, dtype=bool)
+                    mask[hits] = True
+                    found |= mask[codes]
+        return self._row_ids[found].tolist()
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> dict:
+        """
+        Busca `query` (texto parcial, sin distinguir mayúsculas) en todas las columnas.
+
+        Returns:
+            dict: {'total': filas con coincidencia,
+                   'resultados': [{'_row_id', 'columna', 'coincidencia'}]} ordenados por
+                   tipo de coincidencia (exacta, prefijo, parcial), campo y orden de carga.
+        """
+        needle = str(query or '').lower()
+        if not needle.strip() or _SEP in needle:
+            return {'total': 0, 'resultados': []}
+
+        kind, field = self._best_matches(needle)
+        slots = np.flatnonzero(kind < NO_MATCH)
+        rank = np.empty(len(self.columns), dtype=np.int32)
+        rank[self.order] = np.arange(len(self.columns))
+        top = slots[np.lexsort((slots, rank[field[slots]], kind[slots]))][:limit]
+        return {
+            'total': int(len(slots)),
+            'resultados': [
+                {'_row_id': self._row_ids[s], 'columna': self.columns[field[s]], 'coincidencia': MATCH_NAMES[int(kind[s])]}
+                for s in top
+            ],
+        }
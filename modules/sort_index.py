@@ -0,0 +1,294 @@
+"""
+sort_index.py
+-------------
+Ordenación en el servidor por varias columnas, con permutaciones precalculadas.
+
+Estándares: Google Python Style Guide.
+Hasta ahora Tabulator ordenaba en el navegador, así que el cliente necesitaba
+todas las filas. `SortIndex` guarda, por dataset:
+
+- Por cada orden pedido (lista de columnas y sentidos) la permutación de las
+  posiciones de fila ya ordenadas (LRU de `SORT_CACHE_SIZE`).
+- Por cada conjunto de filtros, la máscara de filas visibles (LRU de
+  `MASK_CACHE_SIZE`), calculada con `Dataset.query`.
+- Por cada combinación orden + filtros (LRU de `PAGE_CACHE_SIZE`), las
+  posiciones visibles en orden: una página es un corte de ese array y
+  `df.iloc` de sus filas, O(tamaño de página).
+
+Mismo criterio que el ordenador de la tabla: `_priority` por rango (Alta >
+Media > Baja > vacío) y, si `enable_age_sort`, después por 'Invoice Date Age';
+montos y fechas por su valor convertido (`column_profile.py`); columnas con
+solo números, numéricas; el resto como texto sin distinguir mayúsculas. Las
+celdas vacías van siempre al final y los empates se resuelven por posición.
+
+Se mantiene como `QualityIndex`: se construye en el primer uso y cada commit
+solo con ediciones recoloca las filas tocadas (búsqueda binaria en cada
+permutación) y reevalúa sus máscaras. Si el commit añade o elimina filas las
+posiciones cambian y el índice se descarta (se reconstruye en el próximo uso).
+"""
+
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+
+from .column_profile import AMOUNT, DATE, parse_amounts, parse_dates
+from .filters import aplicar_filtros_dinamicos
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Permutaciones, máscaras y combinaciones de ambas que se conservan por dataset.
+SORT_CACHE_SIZE = 8
+MASK_CACHE_SIZE = 16
+PAGE_CACHE_SIZE = 8
+# Con más filas tocadas en un commit, la permutación se recalcula entera.
+INCREMENTAL_LIMIT = 256
+
+PRIORITY_COLUMN = '_priority'
+AGE_COLUMN = 'Invoice Date Age'
+PRIORITY_RANK = {'Alta': 3, 'Media': 2, 'Baja': 1}
+
+# Tipos de clave (además de AMOUNT y DATE de `column_profile.py`).
+NUMBER, TEXT, PRIORITY, AGE = 'number', 'text', 'priority', 'age'
+
+
+def _lru_put(cache: OrderedDict, key, value, size: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+    return value
+
+
+def sort_spec(sort: list, columns, age_sort: bool = True) -> tuple:
+    """
+    Normaliza el orden pedido por el cliente.
+
+    Args:
+        sort (list): [{'column': str, 'dir': 'asc' | 'desc'}] (el primero manda).
+        columns (iterable): Columnas del dataset (las desconocidas se ignoran).
+        age_sort (bool): Desempatar la prioridad por antigüedad (`enable_age_sort`).
+
+    Returns:
+        tuple: ((columna, descendente), ...) sin columnas repetidas.
+    """
+    spec, seen = [], set()
+    for item in sort or []:
+        col = item.get('column')
+        if col not in columns or col in seen:
+            continue
+        seen.add(col)
+        desc = str(item.get('dir', 'asc')).lower() == 'desc'
+        spec.append((col, desc))
+        if col == PRIORITY_COLUMN and age_sort and AGE_COLUMN in columns:
+            spec.append(((AGE, AGE_COLUMN), desc))  # Desempate del ordenador de la tabla
+    return tuple(spec)
+
+
+def filter_key(filtros) -> tuple:
+    """Clave estable de un conjunto de filtros (el orden no importa)."""
+    return tuple(sorted(
+        (str(f['columna']), str(f['valor'])) for f in filtros or [] if f.get('columna') and f.get('valor')
+    ))
+
+
+def _convert(kind: str, values: pd.Series) -> tuple | None:
+    """
+    Claves comparables de `values` para un tipo de clave.
+
+    Returns:
+        tuple | None: (valores, vacías), arrays propios (se actualizan en sitio);
+            None si hay valores que no son números en una columna de tipo NUMBER.
+    """
+    if kind == AGE:  # Desempate por antigüedad: lo que no es número vale 0 (como `Number(x) || 0`)
+        nums = pd.to_numeric(values.astype(str).str.strip(), errors='coerce').fillna(0)
+        return nums.to_numpy(dtype=float, copy=True), np.zeros(len(values), dtype=bool)
+    if kind == PRIORITY:
+        rank = values.astype(str).map(PRIORITY_RANK).fillna(0)
+        return rank.to_numpy(dtype=float, copy=True), np.zeros(len(values), dtype=bool)
+
+    text = values.astype(str).str.strip()
+    empty = (values.isna() | text.eq('')).to_numpy(copy=True)
+    if kind == AMOUNT:
+        return parse_amounts(values).to_numpy(dtype=float, copy=True), empty
+    if kind == DATE:
+        dates = parse_dates(values)
+        stamps = dates.to_numpy(dtype='datetime64[ns]').astype('int64').astype(float)
+        return stamps, dates.isna().to_numpy(copy=True)
+    if kind == NUMBER:
+        nums = pd.to_numeric(text.where(~empty), errors='coerce')
+        if not (nums.notna().to_numpy() | empty).all():
+            return None
+        return nums.to_numpy(dtype=float, copy=True), empty
+    return text.str.lower().to_numpy(dtype=object, copy=True), empty
+
+
+class SortIndex:
+    """
+    Permutaciones de orden y máscaras de filtro de un dataset, por posición de fila.
+
+    Attributes:
+        num_rows (int): Filas del DataFrame sobre el que se construyó.
+    """
+
+    def __init__(self, df: pd.DataFrame, kinds: dict | None = None):
+        """
+        Args:
+            df (pd.DataFrame): Borrador (con `_row_id`).
+            kinds (dict, optional): Tipos de columna (`ColumnProfile.kinds`).
+        """
+        self.num_rows = len(df)
+        self._row_ids = df['_row_id'].to_numpy().copy()
+        self._kinds = dict(kinds or {})
+        self._keys = {}  # {columna o (AGE, columna): (tipo, valores, vacías)}
+        self._orders = OrderedDict()  # {spec: posiciones ordenadas}
+        self._masks = OrderedDict()  # {filtros: (filtros originales, máscara)}
+        self._pages = OrderedDict()  # {(spec, filtros): posiciones visibles en orden}
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria aproximada del índice."""
+        size = self._row_ids.nbytes + sum(o.nbytes for o in self._orders.values())
+        size += sum(m.nbytes for _, m in self._masks.values()) + sum(p.nbytes for p in self._pages.values())
+        for kind, values, empty in self._keys.values():
+            size += values.nbytes + empty.nbytes
+            if values.dtype == object:
+                size += sum(sys.getsizeof(v) for v in values)
+        return size
+
+    def compatible(self, df: pd.DataFrame) -> bool:
+        """False si cambiaron las filas o su orden (las posiciones ya no valen)."""
+        return len(df) == self.num_rows and np.array_equal(df['_row_id'].to_numpy(), self._row_ids)
+
+    # --- Claves de orden ---
+
+    def _keys_for(self, df: pd.DataFrame, column) -> tuple:
+        """(tipo, valores comparables, vacías) de una columna (se calculan en el primer uso)."""
+        if column not in self._keys:
+            values = df[column[1] if isinstance(column, tuple) else column]
+            if isinstance(column, tuple):
+                kind = AGE
+            elif column == PRIORITY_COLUMN:
+                kind = PRIORITY
+            else:
+                kind = self._kinds.get(column)
+            if kind in (AGE, PRIORITY, AMOUNT, DATE):
+                self._keys[column] = (kind, *_convert(kind, values))
+            else:
+                converted = _convert(NUMBER, values)  # Solo números (o vacías): numérica
+                self._keys[column] = (NUMBER, *converted) if converted is not None else \
+                    (TEXT, *_convert(TEXT, values))
+        return self._keys[column]
+
+    def _build_order(self, df: pd.DataFrame, spec: tuple) -> np.ndarray:
+        """Permutación completa (vectorizada): np.lexsort con la primera columna como clave principal."""
+        keys = [np.arange(self.num_rows)]  # Desempate final: posición
+        for column, desc in reversed(spec):
+            kind, values, empty = self._keys_for(df, column)
+            if kind == TEXT:
+                values = pd.factorize(values, sort=True)[0].astype(float)
+            values = np.where(empty, 0, -values if desc else values)
+            keys.extend([values, empty])
+        return np.lexsort(keys)
+
+    def _before(self, spec: tuple, a: int, b: int) -> bool:
+        """True si la fila en posición `a` va antes que la de `b`."""
+        for column, desc in spec:
+            _, values, empty = self._keys[column]
+            if empty[a] != empty[b]:
+                return bool(empty[b])
+            if empty[a]:
+                continue
+            va, vb = values[a], values[b]
+            if va != vb:
+                return bool(va > vb) if desc else bool(va < vb)
+        return a < b
+
+    def order(self, df: pd.DataFrame, spec: tuple) -> np.ndarray:
+        """Posiciones de fila ordenadas según `spec` (de la caché si ya se calculó)."""
+        if spec in self._orders:
+            self._orders.move_to_end(spec)
+            return self._orders[spec]
+        order = self._build_order(df, spec) if spec else np.arange(self.num_rows)
+        return _lru_put(self._orders, spec, order, SORT_CACHE_SIZE)
+
+    # --- Filtros ---
+
+    def mask(self, dataset, filtros) -> np.ndarray | None:
+        """Máscara de filas visibles con `filtros` (None = todas)."""
+        key = filter_key(filtros)
+        if not key:
+            return None
+        if key in self._masks:
+            self._masks.move_to_end(key)
+            return self._masks[key][1]
+        ids = dataset.query(filtros)['_row_id'].to_numpy()
+        return _lru_put(self._masks, key, (list(filtros), np.isin(self._row_ids, ids)), MASK_CACHE_SIZE)[1]
+
+    def visible(self, dataset, spec: tuple, filtros) -> np.ndarray:
+        """Posiciones visibles con `filtros`, en el orden de `spec`."""
+        key = (spec, filter_key(filtros))
+        if key in self._pages:
+            self._pages.move_to_end(key)
+            return self._pages[key]
+        order = self.order(dataset.df, spec)
+        mask = self.mask(dataset, filtros)
+        return _lru_put(self._pages, key, order if mask is None else order[mask[order]], PAGE_CACHE_SIZE)
+
+    # --- Mantenimiento ---
+
+    def update(self, df: pd.DataFrame, positions) -> None:
+        """
+        Recoloca filas editadas (mismas posiciones, valores nuevos).
+
+        Args:
+            df (pd.DataFrame): Borrador ya modificado.
+            positions (iterable): Posiciones de las filas tocadas.
+        """
+        positions = np.unique(np.asarray(list(positions), dtype=np.int64))
+        if not len(positions):
+            return
+        rows = df.iloc[positions]
+
+        changed = set()
+        for column, (kind, values, empty) in list(self._keys.items()):
+            converted = _convert(kind, rows[column[1] if isinstance(column, tuple) else column])
+            if converted is None:
+                # Un texto en una columna numérica: cambia el tipo de clave, se reconstruye
+                del self._keys[column]
+                changed.add(column)
+                continue
+            new_values, new_empty = converted
+            moved = (values[positions] != new_values) | (empty[positions] != new_empty)
+            if moved.any():
+                values[positions], empty[positions] = new_values, new_empty
+                changed.add(column)
+
+        for spec in list(self._orders):
+            if not any(col in changed for col, _ in spec):
+                continue
+            if len(positions) > INCREMENTAL_LIMIT or any(col not in self._keys for col, _ in spec):
+                self._orders[spec] = self._build_order(df, spec)
+            else:
+                self._orders[spec] = self._reinsert(spec, self._orders[spec], positions)
+
+        for key, (filtros, mask) in self._masks.items():
+            visibles = aplicar_filtros_dinamicos(rows, filtros)['_row_id'].to_numpy()
+            mask[positions] = np.isin(rows['_row_id'].to_numpy(), visibles)
+        self._pages.clear()  # Se recomponen en la próxima página (vectorizado)
+
+    def _reinsert(self, spec: tuple, order: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Quita `positions` de `order` y las vuelve a insertar en su sitio (búsqueda binaria)."""
+        order = order[~np.isin(order, positions)]
+        for pos in positions:
+            lo, hi = 0, len(order)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._before(spec, int(order[mid]), int(pos)):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            order = np.insert(order, lo, pos)
+        return order
@@ -0,0 +1,646 @@
+"""
+storage.py
+----------
+Backends de almacenamiento para los borradores de `dataset_store`.
+
+Estándares: Google Python Style Guide.
+
+- `MemoryStorage`: sin persistencia (el borrador solo vive en el proceso).
+- `SQLiteStorage`: base de datos embebida (sqlite3 de la librería estándar).
+  Cada dataset es una tabla con `_row_id` como clave primaria e índices en las
+  columnas más filtradas/agrupadas. Sobrevive a reinicios y es compartida por
+  varios workers (gunicorn) sobre el mismo archivo.
+- `SnapshotStorage`: snapshot columnar compacto por dataset (Parquet si hay
+  `pyarrow`, si no pickle) + registro de escritura anticipada (WAL) con las
+  filas modificadas desde ese snapshot. Restaurar = leer snapshot + reaplicar
+  el WAL, mucho más rápido que volver a procesar el Excel. Un solo proceso.
+
+Con SQLite los filtros, agrupaciones y lecturas por fila se ejecutan en el motor
+(push-down) cuando el DataFrame no está cargado en memoria, y las ediciones se
+escriben fila a fila en lugar de volver a guardar el borrador completo.
+
+Selección: `create_storage('sqlite' | 'snapshot' | 'memory', carpeta)`.
+"""
+
+from __future__ import annotations
+
+import glob
+import importlib.util
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from .column_types import concat_rows
+from .filters import ANY_COLUMN
+from .lazy_import import lazy_import
+
+pd = lazy_import('pandas')
+
+# Opcional: snapshots en Parquet si está `pyarrow` (se comprueba sin importarlo).
+SNAPSHOT_FORMAT = 'parquet' if importlib.util.find_spec('pyarrow') else 'pkl'
+
+# Columnas internas que siempre se indexan (filtros y agrupaciones habituales).
+DEFAULT_INDEXES = ('_priority', '_row_status')
+
+# Límite de parámetros por sentencia (SQLite admite 999 en versiones antiguas).
+SQL_CHUNK = 900
+
+# Compactación del WAL: nuevo snapshot cada N entradas o cada N segundos.
+SNAPSHOT_EVERY = 200
+SNAPSHOT_INTERVAL = 300
+
+
+class StaleDatasetError(Exception):
+    """Otro proceso modificó el dataset después de la versión que se quería escribir."""
+
+
+def _quote(name: str) -> str:
+    """Cita un identificador SQL (nombres de columna arbitrarios del Excel)."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _lower_text(value) -> str:
+    """Equivalente a `astype(str).str.lower()` de pandas (Unicode, no solo ASCII)."""
+    return str(value).lower()
+
+
+def _to_number(value) -> float:
+    """Equivalente a limpiar '$' y ',' + `pd.to_numeric(errors='coerce').fillna(0)`."""
+    try:
+        return float(re.sub(r'[$,]', '', str(value)))
+    except ValueError:
+        return 0.0
+
+
+def _records(df: pd.DataFrame):
+    """Filas como tuplas de tipos nativos de Python (sqlite3 no acepta tipos numpy)."""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+class MemoryStorage:
+    """Backend nulo: no persiste nada (comportamiento original)."""
+
+    pushdown = False
+    persistent = False
+
+    def save(self, file_id, df, meta, index_columns=()): pass
+    def write_rows(self, file_id, expected_version, new_version, rows, removed): pass
+    def version(self, file_id): return None
+    def meta(self, file_id): return None
+    def load(self, file_id): return None
+    def list_ids(self): return []
+    def drop(self, file_id): pass
+    def snapshot_due(self, file_id): return False
+    def snapshot(self, file_id, df, version): pass
+    def seal(self, file_id, df, version): pass
+    def touch(self, file_id, when): pass
+    def usage(self): return []
+    def compact(self): pass
+
+
+class SQLiteStorage:
+    """
+    Backend SQLite.
+
+    Catálogo `datasets` (file_id, tabla, metadatos, versión) + una tabla por dataset.
+    Las columnas se crean sin tipo declarado para conservar el tipo de cada valor.
+    """
+
+    pushdown = True
+    persistent = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # Solo tiene efecto al crear la base: permite devolver espacio al disco (`compact`).
+        self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.create_function('lower_text', 1, _lower_text, deterministic=True)
+        self._conn.create_function('to_number', 1, _to_number, deterministic=True)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS datasets (
+                    file_id TEXT PRIMARY KEY, table_name TEXT NOT NULL, filename TEXT,
+                    pay_group_col TEXT, columns TEXT NOT NULL, version INTEGER NOT NULL,
+                    created REAL NOT NULL, updated REAL, preview INTEGER NOT NULL DEFAULT 0,
+                    accessed REAL
+                )""")
+            existing = {r[1] for r in self._conn.execute('PRAGMA table_info(datasets)')}
+            if 'updated' not in existing:
+                self._conn.execute('ALTER TABLE datasets ADD COLUMN updated REAL')
+            if 'preview' not in existing:
+                self._conn.execute('ALTER TABLE datasets ADD COLUMN preview INTEGER NOT NULL DEFAULT 0')
+            if 'accessed' not in existing:
+                self._conn.execute('ALTER TABLE datasets ADD COLUMN accessed REAL')
+
+    # --- Catálogo -----------------------------------------------------------
+
+    def _catalog(self, file_id: str):
+        """(tabla, columnas) del dataset; lanza Exception si no existe."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT table_name, columns FROM datasets WHERE file_id = ?', (file_id,)
+            ).fetchone()
+        if row is None:
+            raise Exception("Datos de sesión no encontrados.")
+        return _quote(row[0]), json.loads(row[1])
+
+    def version(self, file_id: str) -> int | None:
+        """Versión guardada del dataset (None si no existe)."""
+        with self._lock:
+            row = self._conn.execute('SELECT version FROM datasets WHERE file_id = ?', (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def meta(self, file_id: str) -> dict | None:
+        """Metadatos del dataset: filename, pay_group_col, columns, version, preview."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT filename, pay_group_col, columns, version, preview FROM datasets WHERE file_id = ?',
+                (file_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'filename': row[0], 'pay_group_col': row[1], 'columns': json.loads(row[2]), 'version': row[3],
+                'preview': bool(row[4])}
+
+    def list_ids(self) -> list[str]:
+        """Datasets guardados, del más reciente al más antiguo."""
+        with self._lock:
+            return [r[0] for r in self._conn.execute('SELECT file_id FROM datasets ORDER BY created DESC')]
+
+    def count(self, file_id: str) -> int:
+        """Número de filas del dataset."""
+        with self._lock:
+            table, _ = self._catalog(file_id)
+            return self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    # --- Escritura ----------------------------------------------------------
+
+    def save(self, file_id: str, df: pd.DataFrame, meta: dict, index_columns=()) -> None:
+        """
+        Guarda un dataset nuevo (tabla + índices + entrada de catálogo).
+
+        Args:
+            file_id (str): Identificador del dataset.
+            df (pd.DataFrame): Borrador inicial (debe incluir `_row_id`).
+            meta (dict): filename, pay_group_col, version y preview (vista previa parcial).
+            index_columns (iterable): Columnas adicionales a indexar.
+        """
+        table_name = 'staging_' + re.sub(r'\W', '', file_id)
+        table, cols = _quote(table_name), list(df.columns)
+        col_defs = ', '.join(
+            f'{_quote(c)} INTEGER PRIMARY KEY' if c == '_row_id' else _quote(c) for c in cols
+        )
+        placeholders = ', '.join('?' * len(cols))
+
+        with self._lock, self._conn:
+            self._conn.execute(f'DROP TABLE IF EXISTS {table}')
+            self._conn.execute(f'CREATE TABLE {table} ({col_defs})')
+            self._conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', _records(df))
+
+            # `_row_id` ya está indexado (clave primaria).
+            for idx, col in enumerate(dict.fromkeys([*DEFAULT_INDEXES, *index_columns])):
+                if col and col in cols and col != '_row_id':
+                    self._conn.execute(
+                        f'CREATE INDEX {_quote(f"{table_name}_ix{idx}")} ON {table} ({_quote(col)})'
+                    )
+
+            now = time.time()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (file_id, table_name, meta.get('filename'), meta.get('pay_group_col'),
+                 json.dumps(cols), meta.get('version', 1), now, now, int(bool(meta.get('preview'))), now)
+            )
+
+    def write_rows(self, file_id: str, expected_version: int, new_version: int,
+                   rows: pd.DataFrame | None, removed) -> None:
+        """
+        Escribe solo las filas afectadas por un cambio, de forma atómica.
+
+        Raises:
+            StaleDatasetError: Si la versión guardada ya no es `expected_version`
+                (otro proceso escribió antes); no se aplica nada.
+        """
+        with self._lock, self._conn:
+            table, cols = self._catalog(file_id)
+            cur = self._conn.execute(
+                'UPDATE datasets SET version = ?, updated = ? WHERE file_id = ? AND version = ?',
+                (new_version, time.time(), file_id, expected_version)
+            )
+            if cur.rowcount == 0:
+                raise StaleDatasetError("Otro proceso modificó estos datos. Recargue la página.")
+
+            if rows is not None and not rows.empty:
+                placeholders = ', '.join('?' * len(cols))
+                self._conn.executemany(
+                    f'INSERT OR REPLACE INTO {table} VALUES ({placeholders})', _records(rows[cols])
+                )
+            removed = [int(r) for r in removed]
+            if removed:
+                self._conn.executemany(f'DELETE FROM {table} WHERE "_row_id" = ?', [(r,) for r in removed])
+
+    def snapshot_due(self, file_id: str) -> bool:
+        return False  # Las escrituras ya son por fila; no hay log que compactar.
+
+    def touch(self, file_id: str, when: float) -> None:
+        """Guarda el último acceso (lo ve la limpieza de temporales de todos los workers)."""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute('UPDATE datasets SET accessed = ? WHERE file_id = ?', (when, file_id))
+        except sqlite3.OperationalError as e:  # Base ocupada: se reintenta en el próximo acceso
+            print(f"WARN: No se pudo guardar el último acceso de {file_id}: {e}")
+
+    def usage(self) -> list[dict]:
+        """Uso de disco por dataset: [{'file_id', 'updated', 'accessed', 'bytes'}]."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT file_id, table_name, COALESCE(updated, created), accessed FROM datasets'
+            ).fetchall()
+            try:
+                pages = self._conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall()
+            except sqlite3.OperationalError:
+                pages = []  # SQLite compilado sin dbstat: tamaño desconocido
+
+        usage = []
+        for file_id, table_name, updated, accessed in rows:
+            size = sum(b for name, b in pages if name == table_name or name.startswith(table_name + '_ix'))
+            usage.append({'file_id': file_id, 'updated': updated, 'accessed': max(updated, accessed or 0),
+                          'bytes': size})
+        return usage
+
+    def compact(self) -> None:
+        """Devuelve al disco las páginas libres que dejaron los datasets eliminados."""
+        with self._lock:
+            self._conn.execute('PRAGMA incremental_vacuum')
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def snapshot(self, file_id: str, df: pd.DataFrame, version: int) -> None:
+        pass
+
+    def seal(self, file_id: str, df: pd.DataFrame, version: int) -> None:
+        pass  # La tabla ya es la forma compacta
+
+    def drop(self, file_id: str) -> None:
+        """Elimina el dataset (tabla y catálogo)."""
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT table_name FROM datasets WHERE file_id = ?', (file_id,)).fetchone()
+            if row:
+                self._conn.execute(f'DROP TABLE IF EXISTS {_quote(row[0])}')
+                self._conn.execute('DELETE FROM datasets WHERE file_id = ?', (file_id,))
+
+    # --- Lectura (push-down) ------------------------------------------------
+
+    def _read(self, sql: str, params=()) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def load(self, file_id: str) -> pd.DataFrame | None:
+        """Carga el dataset completo como DataFrame (None si no existe)."""
+        if self.version(file_id) is None:
+            return None
+        table, _ = self._catalog(file_id)
+        return self._read(f'SELECT * FROM {table} ORDER BY "_row_id"')
+
+    def fetch_rows(self, file_id: str, row_ids) -> pd.DataFrame:
+        """Filas concretas por `_row_id` (sin cargar el resto)."""
+        table, cols = self._catalog(file_id)
+        ids = [int(r) for r in row_ids]
+        parts = [
+            self._read(
+                f'SELECT * FROM {table} WHERE "_row_id" IN ({", ".join("?" * len(chunk))})',
+                chunk
+            )
+            for chunk in (ids[i:i + SQL_CHUNK] for i in range(0, len(ids), SQL_CHUNK))
+        ]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=cols)
+
+    def _where(self, filtros: list, cols: list) -> tuple[str, list]:
+        """
+        Traduce los filtros de `aplicar_filtros_dinamicos` a SQL:
+        OR entre valores de la misma columna, AND entre columnas, búsqueda parcial
+        sin distinguir mayúsculas, `_row_id` en base 1 y `ANY_COLUMN` en todas
+        las columnas del usuario.
+        """
+        agrupados = defaultdict(list)
+        for f in filtros or []:
+            if f.get('columna') and f.get('valor'):
+                agrupados[f['columna']].append(f['valor'])
+
+        clauses, params = [], []
+        for columna, valores in agrupados.items():
+            if columna == '_row_id':
+                ids = [int(v) - 1 for v in valores if str(v).lstrip('-').isdigit()]
+                if ids:
+                    clauses.append(f'"_row_id" IN ({", ".join("?" * len(ids))})')
+                    params.extend(ids)
+            elif columna == ANY_COLUMN:
+                user_cols = [_quote(c) for c in cols if not str(c).startswith('_')]
+                clauses.append('(' + ' OR '.join(
+                    f'instr(lower_text({col}), ?) > 0' for _ in valores for col in user_cols
+                ) + ')')
+                params.extend(str(v).lower() for v in valores for _ in user_cols)
+            elif columna in cols:
+                col = _quote(columna)
+                clauses.append('(' + ' OR '.join(f'instr(lower_text({col}), ?) > 0' for _ in valores) + ')')
+                params.extend(str(v).lower() for v in valores)
+
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def query(self, file_id: str, filtros: list) -> pd.DataFrame:
+        """Filas que cumplen los filtros, evaluados en SQLite."""
+        table, cols = self._catalog(file_id)
+        where, params = self._where(filtros, cols)
+        return self._read(f'SELECT * FROM {table}{where} ORDER BY "_row_id"', params)
+
+    def group_by(self, file_id: str, columna: str, monto_col: str | None, filtros: list) -> pd.DataFrame:
+        """
+        Agrupación en SQLite con las mismas columnas que `/api/group_by`
+        (Total_sum, Total_mean, Total_min, Total_max, Total_count).
+        """
+        table, cols = self._catalog(file_id)
+        where, params = self._where(filtros, cols)
+        key = _quote(columna)
+
+        if monto_col:
+            m = f'to_number({_quote(monto_col)})'
+            select = (f'SUM({m}) AS Total_sum, AVG({m}) AS Total_mean, MIN({m}) AS Total_min, '
+                      f'MAX({m}) AS Total_max, COUNT(*) AS Total_count')
+        else:
+            select = ('0 AS Total_sum, 0 AS Total_mean, 0 AS Total_min, '
+                      '0 AS Total_max, COUNT(*) AS Total_count')
+
+        gb = self._read(
+            f'SELECT {key} AS {key}, {select} FROM {table}{where} '
+            f'GROUP BY {key} HAVING {key} IS NOT NULL ORDER BY {key}', params
+        )
+        totals = ['Total_sum', 'Total_mean', 'Total_min', 'Total_max']
+        gb[totals] = gb[totals].round(2)
+        return gb
+
+
+class SnapshotStorage:
+    """
+    Backend de snapshots + WAL (un directorio por dataset).
+
+    Estructura de `<carpeta>/<file_id>/`:
+        meta.json              filename, pay_group_col, columns.
+        snapshot-<v>.<ext>     Estado completo en la versión v.
+        wal.jsonl              Una línea por cambio posterior:
+                               {"v": versión, "upsert": [filas], "remove": [ids]}.
+
+    El WAL guarda la imagen final de cada fila tocada (ediciones de celda, filas
+    añadidas/eliminadas y recálculos por reglas), así que reaplicarlo es
+    idempotente: un corte entre escribir el snapshot y recortar el WAL no
+    corrompe nada, se ignoran las entradas con versión <= snapshot.
+    """
+
+    pushdown = False
+    persistent = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._state = {}  # file_id -> {'version', 'snapshot_version', 'pending', 'snapshot_at'}
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, file_id: str) -> str:
+        return os.path.join(self.path, re.sub(r'[^\w-]', '', file_id))
+
+    @staticmethod
+    def _write_atomic(path: str, writer) -> None:
+        """Escribe en un temporal y lo renombra (nunca deja archivos a medias)."""
+        tmp = path + '.tmp'
+        writer(tmp)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _write_text(path: str, lines) -> None:
+        """Escribe líneas de texto con fsync (para meta.json y el WAL recortado)."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _snapshots(self, file_id: str) -> list[tuple[int, str]]:
+        """Snapshots existentes [(versión, ruta)], del más nuevo al más antiguo."""
+        found = []
+        for path in glob.glob(os.path.join(self._dir(file_id), 'snapshot-*.*')):
+            match = re.search(r'snapshot-(\d+)\.(parquet|pkl)$', path)
+            if match:
+                found.append((int(match.group(1)), path))
+        return sorted(found, reverse=True)
+
+    def _read_wal(self, file_id: str, after: int, repair: bool = False) -> list[dict]:
+        """
+        Entradas del WAL con versión > `after`.
+
+        Una última línea incompleta (corte a mitad de escritura) se ignora; con
+        `repair=True` además se recorta del archivo para poder seguir añadiendo.
+        """
+        entries, valid_bytes = [], 0
+        wal = os.path.join(self._dir(file_id), 'wal.jsonl')
+        if not os.path.exists(wal):
+            return entries
+
+        with open(wal, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_bytes += len(line)
+                if entry['v'] > after:
+                    entries.append(entry)
+
+        if repair and valid_bytes < os.path.getsize(wal):
+            with open(wal, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return entries
+
+    def _state_for(self, file_id: str) -> dict | None:
+        """Estado de versiones del dataset (se reconstruye del disco si hace falta)."""
+        with self._lock:
+            if file_id not in self._state:
+                snapshots = self._snapshots(file_id)
+                if not snapshots:
+                    return None
+                snap_v = snapshots[0][0]
+                wal = self._read_wal(file_id, snap_v, repair=True)
+                self._state[file_id] = {
+                    'version': wal[-1]['v'] if wal else snap_v, 'snapshot_version': snap_v,
+                    'pending': len(wal), 'snapshot_at': os.path.getmtime(snapshots[0][1]),
+                }
+            return self._state[file_id]
+
+    def save(self, file_id: str, df: pd.DataFrame, meta: dict, index_columns=()) -> None:
+        """Crea el directorio del dataset con su snapshot inicial."""
+        with self._lock:
+            os.makedirs(self._dir(file_id), exist_ok=True)
+            info = json.dumps({'filename': meta.get('filename'), 'pay_group_col': meta.get('pay_group_col'),
+                               'columns': list(df.columns), 'preview': bool(meta.get('preview'))},
+                              ensure_ascii=False)
+            self._write_atomic(os.path.join(self._dir(file_id), 'meta.json'),
+                               lambda tmp: self._write_text(tmp, [info]))
+            self._state.pop(file_id, None)
+            self.snapshot(file_id, df, meta.get('version', 1))
+
+    def write_rows(self, file_id: str, expected_version: int, new_version: int,
+                   rows: pd.DataFrame | None, removed) -> None:
+        """Añade el cambio al WAL (con fsync) antes de confirmarlo."""
+        with self._lock:
+            state = self._state_for(file_id)
+            if state is None:
+                raise Exception("Datos de sesión no encontrados.")
+            if state['version'] != expected_version:
+                raise StaleDatasetError("Otro proceso modificó estos datos. Recargue la página.")
+
+            entry = {
+                'v': new_version,
+                'upsert': rows.to_dict('records') if rows is not None else [],
+                'remove': [int(r) for r in removed],
+            }
+            with open(os.path.join(self._dir(file_id), 'wal.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+            state['version'] = new_version
+            state['pending'] += 1
+
+    def snapshot_due(self, file_id: str) -> bool:
+        """True si el WAL ya es largo o el último snapshot es antiguo."""
+        state = self._state_for(file_id)
+        return bool(state and state['pending'] and (
+            state['pending'] >= SNAPSHOT_EVERY or time.time() - state['snapshot_at'] >= SNAPSHOT_INTERVAL
+        ))
+
+    def snapshot(self, file_id: str, df: pd.DataFrame, version: int) -> None:
+        """Guarda el estado completo en la versión `version` y recorta el WAL."""
+        with self._lock:
+            base = os.path.join(self._dir(file_id), f'snapshot-{version}.{SNAPSHOT_FORMAT}')
+            if SNAPSHOT_FORMAT == 'parquet':
+                self._write_atomic(base, lambda tmp: df.to_parquet(tmp, index=False))
+            else:
+                self._write_atomic(base, lambda tmp: df.reset_index(drop=True).to_pickle(tmp))
+
+            # Solo después de tener el snapshot nuevo se borra lo anterior.
+            wal = os.path.join(self._dir(file_id), 'wal.jsonl')
+            pending = self._read_wal(file_id, version)
+            self._write_atomic(wal, lambda tmp: self._write_text(
+                tmp, (json.dumps(e, ensure_ascii=False, default=str) + '\n' for e in pending)
+            ))
+            for old_version, path in self._snapshots(file_id):
+                if old_version < version:
+                    os.remove(path)
+
+            self._state[file_id] = {
+                'version': max(version, pending[-1]['v'] if pending else version),
+                'snapshot_version': version, 'pending': len(pending), 'snapshot_at': time.time(),
+            }
+
+    def seal(self, file_id: str, df: pd.DataFrame, version: int) -> None:
+        """Snapshot si hay WAL pendiente: la próxima carga lee un solo archivo."""
+        state = self._state_for(file_id)
+        if state and state['pending']:
+            self.snapshot(file_id, df, version)
+
+    def version(self, file_id: str) -> int | None:
+        state = self._state_for(file_id)
+        return state['version'] if state else None
+
+    def meta(self, file_id: str) -> dict | None:
+        state = self._state_for(file_id)
+        if state is None:
+            return None
+        with open(os.path.join(self._dir(file_id), 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['version'] = state['version']
+        return meta
+
+    def load(self, file_id: str) -> pd.DataFrame | None:
+        """Restaura el dataset: último snapshot + entradas posteriores del WAL."""
+        with self._lock:
+            snapshots = self._snapshots(file_id)
+            if not snapshots:
+                return None
+            snap_v, path = snapshots[0]
+            df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+
+            # Última imagen de cada fila tocada (None = eliminada).
+            final = {}
+            for entry in self._read_wal(file_id, snap_v):
+                for row in entry['upsert']:
+                    final[int(row['_row_id'])] = row
+                for rid in entry['remove']:
+                    final[int(rid)] = None
+            if not final:
+                return df
+
+            columns = list(df.columns)
+            kept = df[~df['_row_id'].astype(int).isin(final)]
+            upserts = pd.DataFrame([r for r in final.values() if r is not None], columns=columns)
+            # Las categóricas no se fuerzan (perderían los valores nuevos): `concat_rows` las rehace
+            dtypes = {c: t for c, t in kept.dtypes.items() if not isinstance(t, pd.CategoricalDtype)}
+            df = concat_rows([kept, upserts.astype(dtypes)])
+            return df.sort_values('_row_id', kind='stable').reset_index(drop=True)
+
+    def touch(self, file_id: str, when: float) -> None:
+        """Guarda el último acceso como fecha de modificación de meta.json (solo se escribe al crear)."""
+        try:
+            os.utime(os.path.join(self._dir(file_id), 'meta.json'), (when, when))
+        except OSError:
+            pass  # Dataset ya eliminado
+
+    def usage(self) -> list[dict]:
+        """Uso de disco por dataset: [{'file_id', 'updated', 'accessed', 'bytes'}]."""
+        usage = []
+        for file_id in self.list_ids():
+            files = {f: os.path.join(self._dir(file_id), f) for f in os.listdir(self._dir(file_id))}
+            stats = {f: os.stat(path) for f, path in files.items() if os.path.isfile(path)}
+            updated = max((st.st_mtime for f, st in stats.items() if f != 'meta.json'), default=0)
+            usage.append({
+                'file_id': file_id, 'updated': updated,
+                'accessed': max((st.st_mtime for st in stats.values()), default=0),
+                'bytes': sum(st.st_size for st in stats.values()),
+            })
+        return usage
+
+    def compact(self) -> None:
+        pass  # Cada dataset es su propio directorio: borrarlo ya libera el espacio.
+
+    def list_ids(self) -> list[str]:
+        """Datasets guardados, del más reciente al más antiguo."""
+        dirs = [d for d in glob.glob(os.path.join(self.path, '*')) if os.path.isdir(d)]
+        dirs.sort(key=os.path.getmtime, reverse=True)
+        return [os.path.basename(d) for d in dirs if self._snapshots(os.path.basename(d))]
+
+    def drop(self, file_id: str) -> None:
+        with self._lock:
+            self._state.pop(file_id, None)
+            shutil.rmtree(self._dir(file_id), ignore_errors=True)
+
+
+def create_storage(kind: str, folder: str):
+    """
+    Crea el backend de almacenamiento.
+
+    Args:
+        kind (str): 'sqlite' (por defecto), 'snapshot' o 'memory'.
+        folder (str): Carpeta de datos (`staging.db` o `snapshots/`).
+    """
+    if kind == 'memory':
+        return MemoryStorage()
+    if kind == 'sqlite':
+        return SQLiteStorage(os.path.join(folder, 'staging.db'))
+    if kind == 'snapshot':
+        return SnapshotStorage(os.path.join(folder, 'snapshots'))
+    raise ValueError(f"Backend de almacenamiento desconocido: {kind}")
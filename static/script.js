@@ -29,11 +29,27 @@ const COLUMNAS_AGRUPABLES = [
 // Instancias de Tabulator
 let tabulatorInstance = null;
 let groupedTabulatorInstance = null;
+let lastClickedCell = null; // Ancla para pegar bloques desde Excel
+// 'remote': la tabla pide páginas ya filtradas y ordenadas a /api/sorted_page.
+// 'local': se pintan filas dadas (duplicados, vistas guardadas) y Tabulator ordena en el navegador.
+let tableMode = null;
+let tableSearchTerm = ''; // Búsqueda rápida de la tabla (en remoto, filtro "Todas las columnas")
+let tableSearchTimer = null;
+let pendingResumen = false; // La próxima página trae también los KPIs (cambio de filtros)
+const TABLE_PAGE_SIZE = 100;
+let datasetVersion = 0; // Última versión del dataset sincronizada con el servidor
+let syncTimer = null;
+let eventSource = null; // Canal SSE del dataset (avisos de versión y progreso)
+const SYNC_INTERVAL_MS = 5000; // Solo navegadores sin EventSource
+const SYNC_RETRY_MS = 1000;
 
 // Datos Auxiliares
 let i18n = {}; 
 let activeFilters = []; 
 let autocompleteOptions = {};
+let columnKinds = {}; // Tipo inferido por el servidor: amount | date | identifier | email | category | text
+// Columnas de fecha conocidas (datasets cuyo servidor no envía tipos)
+const DEFAULT_DATE_COLUMNS = new Set(["Invoice Date", "Intake Date", "Assigned Date", "Due Date", "Terms Date", "GL Date", "Updated Date", "Batch Matching Date"]);
 let systemSettings = {
     enable_scf_intercompany: true,
     enable_age_sort: true
@@ -131,6 +147,7 @@ function populateColumnDropdowns() {
     const colSelect = document.getElementById('select-columna');
     if (!colSelect) return; 
     colSelect.innerHTML = `<option value="">${i18n['column_select'] || 'Select col...'}</option>`;
+    if (todasLasColumnas.length) colSelect.innerHTML += `<option value="*">Todas las columnas</option>`;
     
     todasLasColumnas.forEach(col => {
         if (col === 'Priority') return;
@@ -177,35 +194,220 @@ async function handleFileUpload(event) {
             <div class="file-details"><span class="file-name">${file.name}</span><span class="file-size">${fileSizeMB}MB</span></div>
         </div>`;    
 
+    // Progreso en vivo (lectura, prioridades, guardado) mientras dura la petición
+    const sizeLabel = fileUploadList.querySelector('.file-size');
+    const progress = await openProgressChannel(evt => { if (sizeLabel) sizeLabel.textContent = `${fileSizeMB}MB · ${evt.mensaje}`; });
+
+    // Modo actualizar: fusiona el extracto nuevo con el dataset actual (conserva ediciones)
+    const refresh = currentFileId && document.getElementById('chk-refresh-mode')?.checked;
     const formData = new FormData(); formData.append('file', file);
+    if (progress.id) formData.append('progress_id', progress.id);
+    if (refresh) formData.append('mode', 'refresh');
     try {
         const response = await fetch('/api/upload', { method: 'POST', body: formData });
         const result = await response.json(); if (!response.ok) throw new Error(result.error);
 
-        if (tabulatorInstance) { tabulatorInstance.destroy(); tabulatorInstance = null; }
-        if (groupedTabulatorInstance) { groupedTabulatorInstance.destroy(); groupedTabulatorInstance = null; }
-
-        currentFileId = result.file_id;
-        todasLasColumnas = result.columnas; 
-        columnasVisibles = [...todasLasColumnas];
-        autocompleteOptions = result.autocomplete_options || {};
-        
-        populateColumnDropdowns(); 
-        renderColumnSelector(); 
-        updateVisibleColumnsFromCheckboxes();
-        updateFilterInputAutocomplete();
-        resetResumenCard(); 
-        
-        activeFilters = []; 
-        document.getElementById('input-search-table').value = ''; 
-        undoHistoryCount = 0; 
-        updateActionButtonsVisibility(); 
-        toggleView('detailed', true); 
+        initDataset(result);
+        if (refresh && sizeLabel) {
+            const r = result.resumen_actualizacion;
+            sizeLabel.textContent = `${r.nuevas} nuevas · ${r.modificadas} modificadas · ${r.sin_cambios} sin cambios · ${r.eliminadas} eliminadas`;
+        }
 
     } catch (error) { 
         console.error('Error Upload:', error); 
         fileUploadList.innerHTML = `<p style="color: red;">Error al cargar el archivo.</p>`;
+    } finally { progress.close(); }
+}
+
+/**
+ * Inicializa la UI para un dataset (recién subido o compartido por otro usuario).
+ */
+function initDataset(result) {
+    setPreviewState(result.preview);
+    setRefreshModeVisible(true);
+    if (tabulatorInstance) { tabulatorInstance.destroy(); tabulatorInstance = null; }
+    if (groupedTabulatorInstance) { groupedTabulatorInstance.destroy(); groupedTabulatorInstance = null; }
+
+    currentFileId = result.file_id;
+    datasetVersion = result.version || 0;
+    todasLasColumnas = result.columnas; 
+    columnasVisibles = [...todasLasColumnas];
+    columnKinds = result.tipos_columna || {};
+    autocompleteOptions = result.autocomplete_options || {};
+    
+    populateColumnDropdowns(); 
+    renderColumnSelector(); 
+    updateVisibleColumnsFromCheckboxes();
+    updateFilterInputAutocomplete();
+    resetResumenCard(); 
+    
+    activeFilters = []; 
+    document.getElementById('input-search-table').value = ''; 
+    undoHistoryCount = 0; 
+    updateActionButtonsVisibility(); 
+    toggleView('detailed', true); 
+    startSync();
+}
+
+// --- Sesión compartida ---
+
+async function loadSharedDatasets() {
+    const sel = document.getElementById('select-shared-dataset'); if (!sel) return;
+    try {
+        const response = await fetch('/api/dataset/list');
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        sel.innerHTML = '<option value="">Seleccione...</option>';
+        result.datasets.filter(d => d.file_id !== currentFileId).forEach(d => {
+            sel.innerHTML += `<option value="${d.file_id}">${d.filename} (${d.filas} filas, ${d.usuarios} usuarios)</option>`;
+        });
+    } catch (error) { console.error('Error datasets compartidos:', error); }
+}
+
+async function handleJoinDataset() {
+    const fileId = document.getElementById('select-shared-dataset').value;
+    if (!fileId) return alert("Seleccione un archivo.");
+    try {
+        const response = await fetch('/api/dataset/attach', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ file_id: fileId })
+        });
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        initDataset(result);
+        loadSharedDatasets();
+    } catch (error) { alert("Error al unirse: " + error.message); }
+}
+
+/**
+ * Escucha el canal SSE del dataset: solo se piden cambios cuando el servidor
+ * avisa de una versión nueva (sin sondeo periódico).
+ */
+function startSync() {
+    clearTimeout(syncTimer); clearInterval(syncTimer); syncTimer = null;
+    if (eventSource) { eventSource.close(); eventSource = null; }
+    if (!currentFileId) return;
+    if (!window.EventSource) { syncTimer = setInterval(syncChanges, SYNC_INTERVAL_MS); return; }
+
+    eventSource = new EventSource(`/api/events/${currentFileId}`);
+    eventSource.addEventListener('version', e => {
+        if (JSON.parse(e.data).version > datasetVersion) scheduleSync();
+    });
+    eventSource.addEventListener('progress', e => showProgress(JSON.parse(e.data)));
+}
+
+/** Sincroniza ahora o, si hay una edición en curso / pestaña oculta, reintenta en breve. */
+async function scheduleSync() {
+    clearTimeout(syncTimer);
+    if (!(await syncChanges())) syncTimer = setTimeout(scheduleSync, SYNC_RETRY_MS);
+}
+
+/** Muestra el avance de una operación larga (subida, recálculo de reglas, exportación). */
+function showProgress(evt) {
+    const el = document.getElementById('progress-status'); if (!el) return;
+    el.textContent = `${evt.mensaje} ${evt.pct < 100 ? `(${evt.pct}%)` : ''}`;
+    el.style.display = 'inline-block';
+    clearTimeout(el._hideTimer);
+    if (evt.pct >= 100) el._hideTimer = setTimeout(() => { el.style.display = 'none'; }, 2000);
+}
+
+/** Opción "actualizar el archivo actual" (solo con un dataset cargado). */
+function setRefreshModeVisible(flag) {
+    const el = document.getElementById('refresh-mode-label'); if (el) el.style.display = flag ? 'block' : 'none';
+}
+
+/**
+ * Vista previa de un archivo grande: se ven las primeras filas mientras el
+ * servidor lee el resto. Al completarse llega una versión nueva (recarga completa).
+ */
+function setPreviewState(flag) {
+    const el = document.getElementById('preview-status'); if (!el) return;
+    el.style.display = flag ? 'inline-block' : 'none';
+}
+
+/**
+ * Abre un canal efímero de progreso (p. ej. para una subida, que aún no tiene
+ * file_id). Resuelve cuando el canal está listo (o a los 1000 ms).
+ */
+function openProgressChannel(onProgress) {
+    const id = 'op-' + (window.crypto?.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+    if (!window.EventSource) return Promise.resolve({ id: null, close: () => {} });
+    const es = new EventSource(`/api/events/${id}`);
+    es.addEventListener('progress', e => onProgress(JSON.parse(e.data)));
+    const channel = { id, close: () => es.close() };
+    return new Promise(resolve => {
+        es.onopen = () => resolve(channel);
+        setTimeout(() => resolve(channel), 1000);
+    });
+}
+
+/**
+ * Trae solo los cambios hechos desde `datasetVersion` (propios o de otros usuarios)
+ * y los aplica sobre la tabla, sin volver a descargar todos los datos.
+ *
+ * @returns {boolean} false si se pospuso (edición en curso o pestaña oculta).
+ */
+async function syncChanges() {
+    if (!currentFileId || !tabulatorInstance || currentView !== 'detailed') return true;
+    if (document.hidden || document.querySelector('#results-table .tabulator-editing')) return false; // No pisar una edición en curso
+    try {
+        const response = await fetch('/api/dataset/changes', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ file_id: currentFileId, since: datasetVersion, filtros_activos: activeFilters })
+        });
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+
+        if (result.full_reload) { await getFilteredData(); return; }
+        if (tableMode === 'remote') {
+            // Filas de la página: en sitio. Filas nuevas o de otras páginas pueden cambiar la página: se recarga
+            const rows = result.rows || [], presentes = rows.filter(r => tabulatorInstance.getRow(r._row_id));
+            if (presentes.length) {
+                await tabulatorInstance.updateData(presentes);
+                presentes.forEach(r => tabulatorInstance.getRow(r._row_id)?.reformat());
+            }
+            if (presentes.length < rows.length || (result.removed || []).some(id => tabulatorInstance.getRow(id))) await reloadTablePage();
+        } else {
+            if (result.rows?.length) {
+                await tabulatorInstance.updateOrAddData(result.rows);
+                result.rows.forEach(r => tabulatorInstance.getRow(r._row_id)?.reformat());
+            }
+            (result.removed || []).forEach(id => tabulatorInstance.getRow(id)?.delete());
+            tableData = tabulatorInstance.getData();
+        }
+        if (result.resumen) updateResumenCard(result.resumen);
+        datasetVersion = result.version;
+    } catch (error) { console.error('Error sync:', error); }
+    return true;
+}
+
+/**
+ * Aplica el delta de una mutación (celdas cambiadas, filas añadidas/eliminadas)
+ * sobre la tabla en sitio, sin volver a pedir /api/filter.
+ */
+async function applyDelta(result) {
+    if (result.resumen) updateResumenCard(result.resumen);
+    const delta = result.delta;
+    if (!delta || !tabulatorInstance || currentView !== 'detailed') { await refreshActiveView(); return; }
+
+    const patches = (delta.updated || []).filter(r => tabulatorInstance.getRow(r._row_id));
+    if (patches.length) await tabulatorInstance.updateData(patches);
+    if (tableMode === 'remote') {
+        // Las celdas se parchean en la página; si entran o salen filas se pide la página de nuevo
+        patches.forEach(r => tabulatorInstance.getRow(r._row_id)?.reformat());
+        if (delta.added?.length || (delta.removed || []).some(id => tabulatorInstance.getRow(id))) await reloadTablePage();
+    } else {
+        if (delta.added?.length) await tabulatorInstance.updateOrAddData(delta.added);
+        (delta.removed || []).forEach(id => tabulatorInstance.getRow(id)?.delete());
+        [...patches, ...(delta.added || [])].forEach(r => tabulatorInstance.getRow(r._row_id)?.reformat());
+        tableData = tabulatorInstance.getData();
     }
+
+    // Si entre medias hubo cambios de otros usuarios, la sincronización los traerá
+    if (result.version === datasetVersion + 1) datasetVersion = result.version;
+}
+
+/** Otro usuario cambió las mismas celdas: avisar y recargar la versión actual. */
+async function handleEditConflict(result) {
+    alert(result.error);
+    await getFilteredData();
 }
 
 async function handleDownloadExcel() {
@@ -266,12 +468,20 @@ async function handleDownloadAuditLog() {
 // 4. MOTOR DE TABLAS (TABULATOR)
 // ============================================================================
 
+/** Columna de fecha según los tipos inferidos al cargar (o por nombre si no llegaron). */
+function isDateColumn(colName) {
+    return columnKinds[colName] ? columnKinds[colName] === 'date' : DEFAULT_DATE_COLUMNS.has(colName);
+}
+
 /** Renderiza la tabla detallada principal */
 function renderTable(data = null, forceClear = false) {
     const resultsTableDiv = document.getElementById('results-table');
     if (!resultsTableDiv) return; 
 
-    if (forceClear && tabulatorInstance) { tabulatorInstance.destroy(); tabulatorInstance = null; }
+    // Con filas dadas la tabla es local; sin ellas conserva su modo (por defecto, remoto)
+    const mode = data ? 'local' : (tableMode || 'remote');
+    if (tabulatorInstance && (forceClear || mode !== tableMode)) { tabulatorInstance.destroy(); tabulatorInstance = null; }
+    tableMode = mode;
     
     const dataToRender = data || tableData;
 
@@ -281,13 +491,12 @@ function renderTable(data = null, forceClear = false) {
         return; 
     }
     
-    const dateColumns = new Set(["Invoice Date", "Intake Date", "Assigned Date", "Due Date", "Terms Date", "GL Date", "Updated Date", "Batch Matching Date"]);
-    
     // --- HANDLER INTELIGENTE (FIX 6.6) ---
     // 1. Detiene la selección de la fila (stopPropagation).
     // 2. Forza la apertura del editor con un ligero retraso para saltarse el bloqueo.
     const handleCellClick = function(e, cell) { 
         e.stopPropagation(); 
+        lastClickedCell = cell;
         
         const colDef = cell.getColumn().getDefinition();
         if (colDef.editor) {
@@ -336,7 +545,7 @@ function renderTable(data = null, forceClear = false) {
         let editorType = "input", editorParams = {}, formatter = undefined, mutatorEdit = undefined, isEditable = true;
         
         if (colName === '_row_status') { isEditable = false; editorType = undefined; }
-        else if (dateColumns.has(colName)) {
+        else if (isDateColumn(colName)) {
             editorType = "date";
             mutatorEdit = (v) => v ? v.split(" ")[0] : v;
             formatter = (cell) => { const v = cell.getValue(); return v ? (v.split ? v.split(" ")[0] : v) : ""; }
@@ -359,9 +568,15 @@ function renderTable(data = null, forceClear = false) {
         });
     });
 
+    // Remoto: paginación y orden en el servidor (el ordenador de `_priority` de arriba solo aplica en local)
+    const dataOptions = mode === 'remote'
+        ? { pagination: true, paginationMode: "remote", paginationSize: TABLE_PAGE_SIZE, paginationCounter: "rows",
+            sortMode: "remote", ajaxURL: '/api/sorted_page', ajaxRequestFunc: fetchTablePage }
+        : { data: dataToRender };
+
     if (tabulatorInstance) {
         tabulatorInstance.setColumns(columnDefs); 
-        tabulatorInstance.setData(dataToRender);
+        if (mode === 'local') tabulatorInstance.setData(dataToRender);
     } else {
         tabulatorInstance = new Tabulator(resultsTableDiv, {
             // --- CONFIGURACIÓN: ACTIVAMOS MULTI-SELECCIÓN REAL ---
@@ -375,7 +590,7 @@ function renderTable(data = null, forceClear = false) {
                 else if (d._priority === 'Media') el.classList.add('priority-media');
                 else if (d._priority === 'Baja') el.classList.add('priority-baja');
             },
-            index: "_row_id", virtualDom: true, data: dataToRender, columns: columnDefs, 
+            index: "_row_id", virtualDom: true, ...dataOptions, columns: columnDefs, 
             layout: "fitData", movableColumns: true, placeholder: `<p>${i18n['info_upload'] || 'Upload file'}</p>`,
         });
 
@@ -462,7 +677,14 @@ async function handleRemoveFilter(event) {
 
 function handleSearchTable() {
     const searchTerm = document.getElementById('input-search-table').value.toLowerCase();
-    if (tabulatorInstance) {
+    if (tabulatorInstance && tableMode === 'remote') {
+        // En el servidor, sobre todas las columnas (la tabla solo tiene la página actual)
+        clearTimeout(tableSearchTimer);
+        tableSearchTimer = setTimeout(() => {
+            const term = searchTerm.trim(); if (term === tableSearchTerm) return;
+            tableSearchTerm = term; tabulatorInstance.setData().catch(() => {});
+        }, 300);
+    } else if (tabulatorInstance) {
         if (!searchTerm) tabulatorInstance.clearFilter(); 
         else tabulatorInstance.setFilter(data => columnasVisibles.some(col => 
             String(col === '_row_id' ? data[col] + 1 : data[col]).toLowerCase().includes(searchTerm)
@@ -482,7 +704,7 @@ function renderFilters() {
     if (!filtersListDiv || activeFilters.length === 0) return;
     
     activeFilters.forEach((filtro, index) => {
-        let colName = filtro.columna === '_row_id' ? 'N° Fila' : (filtro.columna === '_row_status' ? 'Row Status' : (filtro.columna === '_priority' ? 'Prioridad' : filtro.columna));
+        let colName = filtro.columna === '_row_id' ? 'N° Fila' : (filtro.columna === '_row_status' ? 'Row Status' : (filtro.columna === '_priority' ? 'Prioridad' : (filtro.columna === '*' ? 'Todas' : filtro.columna)));
         filtersListDiv.innerHTML += `
             <div class="filtro-chip">
                 <span>${colName}: <strong>${filtro.valor}</strong></span>
@@ -491,33 +713,115 @@ function renderFilters() {
     });
 }
 
+/**
+ * `ajaxRequestFunc` de la tabla remota: una página de /api/sorted_page con los
+ * filtros activos, la búsqueda rápida y el orden de las cabeceras.
+ */
+async function fetchTablePage(url, config, params) {
+    const size = params.size || TABLE_PAGE_SIZE, page = params.page || 1;
+    const filtros = tableSearchTerm ? [...activeFilters, { columna: '*', valor: tableSearchTerm }] : activeFilters;
+    const resumen = pendingResumen; pendingResumen = false;
+    try {
+        const response = await fetch(url, {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                file_id: currentFileId, filtros_activos: filtros, offset: (page - 1) * size, limit: size, resumen,
+                sort: (params.sort || []).map(s => ({ column: s.field, dir: s.dir }))
+            })
+        });
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+
+        if (result.version) datasetVersion = result.version;
+        setPreviewState(result.preview);
+        if (result.resumen) updateResumenCard(result.resumen);
+        return { data: result.data, last_page: Math.max(1, Math.ceil(result.num_filas / size)), last_row: result.num_filas };
+    } catch (error) {
+        console.error('Error filter:', error); alert('Error al filtrar: ' + error.message);
+        if (resumen) resetResumenCard();
+        throw error;
+    }
+}
+
+/** Vuelve a pedir la página actual de la tabla remota (entraron o salieron filas). */
+async function reloadTablePage() {
+    if (!tabulatorInstance || tableMode !== 'remote') return;
+    const page = tabulatorInstance.getPage() || 1;
+    await tabulatorInstance.setPage(page).catch(() => tabulatorInstance.setPage(1)); // La última página pudo quedar vacía
+}
+
 async function getFilteredData() {
     const resultsHeader = document.getElementById('results-header');
+    currentData = []; tableData = [];
     if (!currentFileId) { 
-        currentData = []; tableData = []; renderFilters(); renderTable(null, true); resetResumenCard(); 
+        renderFilters(); renderTable(null, true); resetResumenCard(); 
         if (resultsHeader) resultsHeader.textContent = 'Results'; 
         return; 
     }
+    // La tabla pide sus páginas a /api/sorted_page; la primera trae los KPIs de la vista
+    tableSearchTerm = (document.getElementById('input-search-table')?.value || '').trim();
+    pendingResumen = true;
+    renderFilters();
+    const reuse = tabulatorInstance && tableMode === 'remote';
+    if (tabulatorInstance && !reuse) { tabulatorInstance.destroy(); tabulatorInstance = null; } // Venía de una tabla local
+    tableMode = 'remote';
+    renderTable();
+    if (reuse) await tabulatorInstance.setData().catch(() => {});
+}
+
+// --- Búsqueda global (índice del servidor sobre todas las columnas) ---
+
+let globalSearchTimer = null;
+
+function scheduleGlobalSearch() {
+    clearTimeout(globalSearchTimer);
+    globalSearchTimer = setTimeout(handleGlobalSearch, 200);
+}
+
+async function handleGlobalSearch() {
+    const q = document.getElementById('input-global-search').value.trim();
+    const box = document.getElementById('global-search-results');
+    if (!currentFileId || q.length < 2) { box.innerHTML = ''; return; }
     try {
-        const response = await fetch('/api/filter', {
+        const response = await fetch('/api/search', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId, filtros_activos: activeFilters })
+            body: JSON.stringify({ file_id: currentFileId, q, limit: 20 })
         });
         const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        if (document.getElementById('input-global-search').value.trim() !== q) return; // Llegó tarde
+
+        box.innerHTML = `<div class="global-search-total">${result.total} filas</div>`;
+        result.resultados.forEach(r => {
+            const item = document.createElement('div');
+            item.className = 'global-search-item'; item.dataset.rowId = r._row_id;
+            item.title = `${r.columna}: ${r.valor} (${r.coincidencia})`;
+            item.textContent = `Fila ${r._row_id + 1} · ${r.columna}: ${r.valor}`;
+            box.appendChild(item);
+        });
+    } catch (error) { box.innerHTML = ''; console.error('Error búsqueda:', error); }
+}
 
-        currentData = result.data; tableData = [...currentData];
-        if (result.resumen) updateResumenCard(result.resumen);
-        renderFilters(); renderTable(result.data); 
+/** Enter: la búsqueda pasa a ser un filtro "Todas las columnas". */
+async function handleGlobalSearchKey(event) {
+    if (event.key !== 'Enter') return;
+    const q = event.target.value.trim(); if (!q || !currentFileId) return;
+    activeFilters.push({ columna: '*', valor: q });
+    event.target.value = ''; document.getElementById('global-search-results').innerHTML = '';
+    await refreshActiveView();
+}
 
-    } catch (error) { 
-        console.error('Error filter:', error); alert('Error al filtrar: ' + error.message);
-        resetResumenCard(); renderTable(null, true);
-    }
+/** Clic en un resultado: lleva a la fila si está en la tabla; si no, filtra por ella. */
+async function handleGlobalSearchPick(event) {
+    const item = event.target.closest('.global-search-item'); if (!item) return;
+    const rowId = parseInt(item.dataset.rowId, 10);
+    const row = (currentView === 'detailed' && tabulatorInstance) ? tabulatorInstance.getRow(rowId) : false;
+    if (row) { tabulatorInstance.scrollToRow(row, "center", false); row.select(); return; }
+    activeFilters.push({ columna: '_row_id', valor: String(rowId + 1) });
+    await refreshActiveView();
 }
 
 // --- Lógica de Vistas (Detailed / Grouped) ---
 
-function toggleView(view, force = false) {
+function toggleView(view, force = false, refresh = true) {
     if (view === currentView && !force) return; 
     currentView = view;
     
@@ -534,7 +838,7 @@ function toggleView(view, force = false) {
         if (selectAgrupar && !selectAgrupar.value) selectAgrupar.value = selectAgrupar.querySelector('option:not([value=""])')?.value || "";
     }
     
-    refreshActiveView();
+    if (refresh) refreshActiveView();
 }
 
 async function refreshActiveView() {
@@ -618,8 +922,7 @@ async function handleCellEdited(cell) {
     const rowEl = row.getElement();
 
     // Validaciones
-    const isDate = ["Invoice Date", "Intake Date", "Assigned Date", "Due Date"].includes(colField);
-    if (isDate && (!newVal) && oldVal) { cell.restoreOldValue(); return; }
+    if (isDateColumn(colField) && (!newVal) && oldVal) { cell.restoreOldValue(); return; }
     if (newVal === oldVal) return;
 
     if (rowEl) rowEl.style.backgroundColor = "#FFF9E5";
@@ -627,9 +930,11 @@ async function handleCellEdited(cell) {
     try {
         const response = await fetch('/api/update_cell', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId, row_id: rowId, columna: colField, valor: newVal })
+            body: JSON.stringify({ file_id: currentFileId, row_id: rowId, columna: colField, valor: newVal, base_version: datasetVersion })
         });
-        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        const result = await response.json();
+        if (response.status === 409) { if (rowEl) rowEl.style.backgroundColor = ""; await handleEditConflict(result); return; }
+        if (!response.ok) throw new Error(result.error);
 
         if (result.resumen) updateResumenCard(result.resumen);
         undoHistoryCount = result.history_count;
@@ -653,24 +958,87 @@ async function handleCellEdited(cell) {
     }
 }
 
+/**
+ * Pegado de bloques (Excel -> Tabla).
+ * Si el portapapeles trae varias celdas (tabs / saltos de línea), se mapea el
+ * bloque a partir de la última celda clicada y se envía en UNA sola petición
+ * a /api/update_cells_batch en lugar de una por celda.
+ */
+async function handleTablePaste(e) {
+    if (!tabulatorInstance || !currentFileId || !lastClickedCell) return;
+    const text = (e.clipboardData || window.clipboardData)?.getData('text') || '';
+    if (!text.includes('\t') && !text.trim().includes('\n')) return; // Valor simple: pegado normal en el editor
+
+    e.preventDefault();
+    if (lastClickedCell.cancelEdit) lastClickedCell.cancelEdit();
+
+    const block = text.replace(/\r/g, '').replace(/\n$/, '').split('\n').map(line => line.split('\t'));
+    const rows = tabulatorInstance.getRows("active");
+    const cols = tabulatorInstance.getColumns().filter(c => c.isVisible() && c.getDefinition().editor);
+    const anchorId = lastClickedCell.getRow().getData()._row_id, anchorField = lastClickedCell.getField();
+    const startRow = rows.findIndex(r => r.getData()._row_id === anchorId);
+    const startCol = cols.findIndex(c => c.getField() === anchorField);
+    if (startRow < 0 || startCol < 0) return;
+
+    const edits = [];
+    block.forEach((values, i) => {
+        const row = rows[startRow + i]; if (!row) return;
+        values.forEach((valor, j) => {
+            const col = cols[startCol + j]; if (!col) return;
+            edits.push({ row_id: row.getData()._row_id, columna: col.getField(), valor: valor });
+        });
+    });
+    if (edits.length === 0) return;
+
+    try {
+        const response = await fetch('/api/update_cells_batch', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ file_id: currentFileId, edits: edits, base_version: datasetVersion })
+        });
+        const result = await response.json();
+        if (response.status === 409) { await handleEditConflict(result); return; }
+        if (!response.ok) throw new Error(result.error);
+        if (result.status === 'no_change') return;
+
+        // Parche local: valores pegados + prioridad/estado devueltos por el servidor
+        // (las celdas en conflicto no se aplicaron y llegarán con la sincronización)
+        const conflictos = new Set((result.conflicts || []).map(c => `${c.row_id}|${c.columna}`));
+        const patches = {};
+        edits.filter(ed => !conflictos.has(`${ed.row_id}|${ed.columna}`)).forEach(ed => { (patches[ed.row_id] = patches[ed.row_id] || {})[ed.columna] = ed.valor; });
+        (result.rows || []).forEach(r => Object.assign(patches[r._row_id] = patches[r._row_id] || {}, r));
+        Object.entries(patches).forEach(([rid, patch]) => {
+            const row = tabulatorInstance.getRow(Number(rid));
+            if (row) { row.update(patch); row.reformat(); }
+        });
+
+        if (result.resumen) updateResumenCard(result.resumen);
+        undoHistoryCount = result.history_count;
+        updateActionButtonsVisibility();
+        if (conflictos.size) { alert(`${conflictos.size} celdas no se pegaron: otro usuario las modificó.`); syncChanges(); }
+    } catch (error) {
+        console.error("Error pegado por lote:", error); alert("Error pegando bloque: " + error.message);
+    }
+}
+
 async function handleAddRow() {
     if (!currentFileId) { alert("Cargue archivo primero."); return; }
     try {
         const response = await fetch('/api/add_row', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId })
+            body: JSON.stringify({ file_id: currentFileId, filtros_activos: activeFilters })
         });
         const result = await response.json(); if (!response.ok) throw new Error(result.error);
         
         undoHistoryCount = result.history_count;
         updateActionButtonsVisibility(); 
-        await getFilteredData();
+        await applyDelta(result);
         
         // Scroll y highlight
         if (result.new_row_id && tabulatorInstance) {
             setTimeout(() => {
-                tabulatorInstance.scrollToRow(result.new_row_id, "bottom", false);
                 const row = tabulatorInstance.getRow(result.new_row_id);
+                if (!row) return; // En remoto la fila nueva puede caer en otra página
+                tabulatorInstance.scrollToRow(row, "bottom", false);
                 if (row?.getElement()) {
                     const el = row.getElement(); el.style.backgroundColor = "#FFF9E5";
                     setTimeout(() => { if(el) el.style.backgroundColor = ""; row.reformat(); }, 2000);
@@ -685,12 +1053,12 @@ async function handleDeleteRow(row_id) {
     try {
         const response = await fetch('/api/delete_row', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId, row_id: row_id })
+            body: JSON.stringify({ file_id: currentFileId, row_id: row_id, filtros_activos: activeFilters })
         });
         const result = await response.json(); if (!response.ok) throw new Error(result.error);
         undoHistoryCount = result.history_count;
         updateActionButtonsVisibility(); 
-        await getFilteredData();
+        await applyDelta(result);
     } catch (error) { alert("Error eliminar fila: " + error.message); }
 }
 
@@ -699,18 +1067,18 @@ async function handleUndoChange() {
     try {
         const response = await fetch('/api/undo_change', {
             method: 'POST', headers: { 'Content-Type': 'application/json' }, 
-            body: JSON.stringify({ file_id: currentFileId }) 
+            body: JSON.stringify({ file_id: currentFileId, filtros_activos: activeFilters }) 
         });
         const result = await response.json(); if (!response.ok) throw new Error(result.error);
         
         undoHistoryCount = result.history_count;
         updateActionButtonsVisibility(); 
+        await applyDelta(result);
 
         if (result.affected_row_id && result.affected_row_id !== 'bulk' && tabulatorInstance) {
             const row = tabulatorInstance.getRow(result.affected_row_id);
             if (row) tabulatorInstance.scrollToRow(row, "center", false);
         }
-        await getFilteredData();
     } catch (error) { alert("Error Undo: " + error.message); }
 }
 
@@ -782,14 +1150,15 @@ async function handleBulkEditApply() {
     try {
         const response = await fetch('/api/bulk_update', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId, row_ids: rows.map(r => r._row_id), column: col, new_value: val })
+            body: JSON.stringify({ file_id: currentFileId, row_ids: rows.map(r => r._row_id), column: col, new_value: val, base_version: datasetVersion, filtros_activos: activeFilters })
         });
-        const res = await response.json(); if (!response.ok) throw new Error(res.error);
+        const res = await response.json();
+        if (response.status === 409) { closeModal('bulk-edit-modal'); await handleEditConflict(res); return; }
+        if (!response.ok) throw new Error(res.error);
         
         alert(res.message); undoHistoryCount = res.history_count;
-        if (res.resumen) updateResumenCard(res.resumen);
         closeModal('bulk-edit-modal'); tabulatorInstance.deselectRow();
-        await getFilteredData();
+        await applyDelta(res);
     } catch (e) { alert("Error Bulk Edit: " + e.message); }
 }
 
@@ -801,34 +1170,39 @@ function openFindReplaceModal() {
     
     document.getElementById('find-replace-count').textContent = `En ${rows.length} filas seleccionadas.`;
     const sel = document.getElementById('find-replace-column');
-    sel.innerHTML = '<option value="">Seleccione...</option>';
+    sel.innerHTML = '';
     todasLasColumnas.forEach(col => { if (!col.startsWith('_') && col !== 'Priority') sel.innerHTML += `<option value="${col}">${col}</option>`; });
     
     document.getElementById('find-replace-find-text').value = '';
     document.getElementById('find-replace-replace-text').value = '';
+    document.getElementById('find-replace-mode').value = 'exact';
+    document.getElementById('find-replace-match-case').checked = true;
     openModal('find-replace-modal');
 }
 
 async function handleFindReplaceApply() {
-    const col = document.getElementById('find-replace-column').value;
+    const cols = Array.from(document.getElementById('find-replace-column').selectedOptions).map(o => o.value);
     const findT = document.getElementById('find-replace-find-text').value;
     const replT = document.getElementById('find-replace-replace-text').value;
-    if (!col) return alert("Seleccione columna");
+    const mode = document.getElementById('find-replace-mode').value;
+    const matchCase = document.getElementById('find-replace-match-case').checked;
+    if (cols.length === 0) return alert("Seleccione columna");
 
     const rows = tabulatorInstance.getSelectedData();
-    if (!confirm(`Buscar "${findT}" y reemplazar con "${replT}" en ${rows.length} filas de "${col}"?`)) return;
+    if (!confirm(`Buscar "${findT}" y reemplazar con "${replT}" en ${rows.length} filas de "${cols.join('", "')}"?`)) return;
 
     try {
         const response = await fetch('/api/find_replace_in_selection', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId, row_ids: rows.map(r => r._row_id), columna: col, find_text: findT, replace_text: replT })
+            body: JSON.stringify({ file_id: currentFileId, row_ids: rows.map(r => r._row_id), columnas: cols, find_text: findT, replace_text: replT, mode: mode, match_case: matchCase, base_version: datasetVersion, filtros_activos: activeFilters })
         });
-        const res = await response.json(); if (!response.ok) throw new Error(res.error);
+        const res = await response.json();
+        if (response.status === 409) { closeModal('find-replace-modal'); await handleEditConflict(res); return; }
+        if (!response.ok) throw new Error(res.error);
 
         alert(res.message); undoHistoryCount = res.history_count;
-        if (res.resumen) updateResumenCard(res.resumen);
         closeModal('find-replace-modal'); tabulatorInstance.deselectRow();
-        await getFilteredData();
+        await applyDelta(res);
     } catch (e) { alert("Error Find/Replace: " + e.message); }
 }
 
@@ -841,7 +1215,7 @@ async function handleBulkDelete() {
     try {
         const response = await fetch('/api/bulk_delete_rows', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId, row_ids: rows.map(r => r._row_id) })
+            body: JSON.stringify({ file_id: currentFileId, row_ids: rows.map(r => r._row_id), filtros_activos: activeFilters })
         });
         const res = await response.json(); if (!response.ok) throw new Error(res.error);
 
@@ -850,14 +1224,12 @@ async function handleBulkDelete() {
         // Actualizamos el conteo de historial
         undoHistoryCount = res.history_count;
         
-        if (res.resumen) updateResumenCard(res.resumen);
-        
         tabulatorInstance.deselectRow(); 
         
         // Hacemos visibles los botones de acción (Deshacer)
         updateActionButtonsVisibility(); 
         
-        await getFilteredData();
+        await applyDelta(res);
     } catch (e) { alert("Error Bulk Delete: " + e.message); }
 }
 
@@ -873,7 +1245,7 @@ async function handleShowDuplicates() {
         
         if (res.num_filas > 0) {
             alert(`Encontrados ${res.num_filas} duplicados.`);
-            renderTable(res.data); activeFilters = []; renderFilters();
+            tableData = res.data; renderTable(res.data); activeFilters = []; renderFilters();
         } else alert("No hay duplicados.");
     } catch (e) { alert("Error Duplicados: " + e.message); }
 }
@@ -884,13 +1256,12 @@ async function handleCleanupDuplicates() {
     try {
         const response = await fetch('/api/cleanup_duplicate_invoices', {
             method: 'POST', headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ file_id: currentFileId })
+            body: JSON.stringify({ file_id: currentFileId, filtros_activos: activeFilters })
         });
         const res = await response.json(); if (!response.ok) throw new Error(res.error);
         
         alert(res.message); undoHistoryCount = res.history_count;
-        if (res.resumen) updateResumenCard(res.resumen);
-        updateActionButtonsVisibility(); await getFilteredData();
+        updateActionButtonsVisibility(); await applyDelta(res);
     } catch (e) { alert("Error Cleanup: " + e.message); }
 }
 
@@ -1060,9 +1431,14 @@ async function handleImportAutocomplete() {
 async function openPriorityRulesModal() {
     openModal('priority-rules-modal', async () => {
         // 1. Llenar columnas
-        const sel = document.getElementById('rule-column');
+        const sel = document.getElementById('rule-column'), sel2 = document.getElementById('rule-column-2');
         sel.innerHTML = '<option value="">Seleccione...</option>';
-        todasLasColumnas.forEach(col => { if(!col.startsWith('_') && col !== 'Priority') sel.innerHTML += `<option value="${col}">${col}</option>`; });
+        sel2.innerHTML = '<option value="">(Ninguna)</option>';
+        todasLasColumnas.forEach(col => {
+            if (col.startsWith('_') || col === 'Priority') return;
+            sel.innerHTML += `<option value="${col}">${col}</option>`;
+            sel2.innerHTML += `<option value="${col}">${col}</option>`;
+        });
 
         // 2. Cargar reglas
         document.getElementById('rules-list-container').innerHTML = '<em>Cargando...</em>';
@@ -1077,6 +1453,40 @@ async function openPriorityRulesModal() {
     });
 }
 
+const RULE_OPERATOR_LABELS = { equals: '=', contains: 'contiene', starts_with: 'empieza con', regex: '~' };
+
+/** Texto legible de una regla (formato legado o multi-condición) */
+function describeRule(r) {
+    const conds = r.conditions || [{ column: r.column, operator: 'equals', value: r.value }];
+    return conds.map(c => {
+        const vals = c.values ? c.values : [c.value];
+        const shown = vals.length > 3 ? `${vals.slice(0, 3).join(' | ')} … (+${vals.length - 3})` : vals.join(' | ');
+        return `<strong>${c.column}</strong> ${RULE_OPERATOR_LABELS[c.operator] || c.operator} <strong>"${shown}"</strong>`;
+    }).join(' Y ');
+}
+
+/** Construye la regla desde el formulario (1 o 2 condiciones) */
+function buildRuleFromForm() {
+    const splitVals = (op, txt) => op === 'regex' ? [txt.trim()] : txt.split('|').map(v => v.trim()).filter(Boolean);
+    const conditions = [];
+    [['rule-column', 'rule-operator', 'rule-value'], ['rule-column-2', 'rule-operator-2', 'rule-value-2']].forEach(([c, o, v]) => {
+        const column = document.getElementById(c).value, operator = document.getElementById(o).value;
+        const values = splitVals(operator, document.getElementById(v).value);
+        if (column && values.length) conditions.push({ column, operator, values });
+    });
+    if (conditions.length === 0) return null;
+
+    const rule = {
+        priority: document.getElementById('rule-priority').value,
+        reason: document.getElementById('rule-reason').value, active: true
+    };
+    const first = conditions[0];
+    if (conditions.length === 1 && first.operator === 'equals' && first.values.length === 1) {
+        return { ...rule, column: first.column, value: first.values[0] }; // Formato legado
+    }
+    return { ...rule, conditions };
+}
+
 function renderRulesList(rules) {
     const c = document.getElementById('rules-list-container');
     c.innerHTML = (!rules || !rules.length) ? '<em>Sin reglas.</em>' : '';
@@ -1086,13 +1496,13 @@ function renderRulesList(rules) {
         div.style.opacity = r.active ? '1' : '0.5';
         div.innerHTML = `
             <div style="display:flex;gap:10px;align-items:center;flex:1;">
-                <input type="checkbox" class="toggle-rule" ${r.active?'checked':''} data-col="${r.column}" data-val="${r.value}">
-                <span>Si <strong>${r.column}</strong> = <strong>"${r.value}"</strong> &rarr; ${r.priority}</span>
+                <input type="checkbox" class="toggle-rule" ${r.active?'checked':''}>
+                <span>Si ${describeRule(r)} &rarr; ${r.priority}</span>
             </div>
             <button class="btn-delete-rule">&times;</button>`;
         
-        div.querySelector('.btn-delete-rule').onclick = () => confirm(`¿Borrar regla "${r.value}"?`) && handleDeleteRule(r.column, r.value);
-        div.querySelector('.toggle-rule').onchange = (e) => handleToggleRule(r.column, r.value, e.target.checked);
+        div.querySelector('.btn-delete-rule').onclick = () => confirm(`¿Borrar regla "${r.reason || r.value}"?`) && handleDeleteRule(r.column, r.value, r.id);
+        div.querySelector('.toggle-rule').onchange = (e) => handleToggleRule(r.column, r.value, e.target.checked, r.id);
         c.appendChild(div);
     });
 }
@@ -1101,52 +1511,87 @@ async function handleSaveSettings() {
     const scf = document.getElementById('setting-scf').checked;
     const age = document.getElementById('setting-age-sort').checked;
     try {
-        await fetch('/api/priority_rules/save_settings', {
+        const res = await fetch('/api/priority_rules/save_settings', {
             method: 'POST', headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({ enable_scf_intercompany: scf, enable_age_sort: age })
+            body: JSON.stringify({ enable_scf_intercompany: scf, enable_age_sort: age, filtros_activos: activeFilters })
         });
         systemSettings.enable_age_sort = age; alert("Configuración guardada.");
-        if (currentFileId) await getFilteredData();
+        if (currentFileId) await applyDelta(await res.json());
     } catch (e) { alert(e.message); }
 }
 
 async function handleAddRule() {
-    const col = document.getElementById('rule-column').value, val = document.getElementById('rule-value').value;
-    const prio = document.getElementById('rule-priority').value, reason = document.getElementById('rule-reason').value;
-    if (!col || !val || !reason) return alert("Complete campos.");
+    const rule = buildRuleFromForm();
+    if (!rule || !rule.reason) return alert("Complete campos.");
 
     try {
         const res = await fetch('/api/priority_rules/save', {
             method: 'POST', headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({ column: col, value: val, priority: prio, reason: reason, active: true })
+            body: JSON.stringify({ ...rule, filtros_activos: activeFilters })
         });
-        if (!res.ok) throw new Error((await res.json()).error);
+        const result = await res.json(); if (!res.ok) throw new Error(result.error);
         
         alert("Regla guardada."); 
-        document.getElementById('rule-value').value = ''; document.getElementById('rule-reason').value = '';
+        ['rule-value', 'rule-value-2', 'rule-reason'].forEach(id => document.getElementById(id).value = '');
+        document.getElementById('rule-column-2').value = '';
+        document.getElementById('rule-preview').innerHTML = '';
         
         const listRes = await fetch('/api/priority_rules/get');
         renderRulesList((await listRes.json()).rules);
-        if (currentFileId) await getFilteredData();
+        if (currentFileId) await applyDelta(result);
     } catch (e) { alert(e.message); }
 }
 
-async function handleToggleRule(col, val, status) {
-    await fetch('/api/priority_rules/toggle', {
+// --- Dry-run de reglas (vista previa mientras se escribe) ---
+let rulePreviewTimer = null;
+
+/** Pide al servidor el impacto de un conjunto de reglas sin guardarlas */
+async function fetchRulesPreview(payload) {
+    const res = await fetch('/api/priority_rules/preview', {
+        method: 'POST', headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ file_id: currentFileId, ...payload })
+    });
+    const data = await res.json(); if (!res.ok) throw new Error(data.error);
+    return data;
+}
+
+function scheduleRulePreview() {
+    clearTimeout(rulePreviewTimer);
+    rulePreviewTimer = setTimeout(handleRulePreview, 250);
+}
+
+async function handleRulePreview() {
+    const box = document.getElementById('rule-preview');
+    if (!box) return;
+    const rule = buildRuleFromForm();
+    if (!currentFileId || !rule) { box.innerHTML = ''; return; }
+
+    try {
+        const data = await fetchRulesPreview({ rule });
+        const stats = data.reglas.find(r => r.candidate) || { matched: 0, overridden: 0 };
+        box.innerHTML = `Coinciden <strong>${stats.matched}</strong> facturas` +
+            (stats.overridden ? ` (${stats.overridden} pisadas por otras reglas)` : '') +
+            ` &middot; <strong>${data.filas_con_cambio}</strong> cambiarían de prioridad.`;
+    } catch (e) { box.textContent = e.message; }
+}
+
+async function handleToggleRule(col, val, status, id = null) {
+    const res = await fetch('/api/priority_rules/toggle', {
         method: 'POST', headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ column: col, value: val, active: status })
+        body: JSON.stringify({ column: col, value: val, active: status, id: id, filtros_activos: activeFilters })
     });
-    if (currentFileId) await getFilteredData();
+    if (currentFileId) await applyDelta(await res.json());
 }
 
-async function handleDeleteRule(col, val) {
-    await fetch('/api/priority_rules/delete', {
+async function handleDeleteRule(col, val, id = null) {
+    const res = await fetch('/api/priority_rules/delete', {
         method: 'POST', headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ column: col, value: val })
+        body: JSON.stringify({ column: col, value: val, id: id, filtros_activos: activeFilters })
     });
+    const result = await res.json();
     const listRes = await fetch('/api/priority_rules/get');
     renderRulesList((await listRes.json()).rules);
-    if (currentFileId) await getFilteredData();
+    if (currentFileId) await applyDelta(result);
 }
 
 // ============================================================================
@@ -1200,7 +1645,13 @@ function handleLoadView(event) {
 
             // --- RESTAURAR REGLAS SI EXISTEN ---
             if (c.priorityRules || c.prioritySettings) {
-                if(confirm("Esta vista contiene reglas de prioridad. ¿Desea sobrescribir las reglas actuales con las del archivo?")) {
+                let impacto = '';
+                try {
+                    const prev = await fetchRulesPreview({ rules: c.priorityRules || [], settings: c.prioritySettings || {} });
+                    impacto = `\n\n${prev.reglas.length} reglas; ${prev.filas_con_cambio} de ${prev.total_filas} facturas cambiarían de prioridad.`;
+                } catch (err) { console.error('Error vista previa vista:', err); }
+
+                if(confirm("Esta vista contiene reglas de prioridad. ¿Desea sobrescribir las reglas actuales con las del archivo?" + impacto)) {
                     try {
                         const res = await fetch('/api/priority_rules/import_view', {
                             method: 'POST', 
@@ -1226,6 +1677,121 @@ function handleLoadView(event) {
     reader.readAsText(file); event.target.value = null;
 }
 
+// --- Vistas guardadas en el servidor (materializadas por dataset) ---
+
+let savedViews = [];
+
+function renderSavedViews(selectedId = '') {
+    const sel = document.getElementById('select-saved-view'); if (!sel) return;
+    sel.innerHTML = '<option value="">Vistas del equipo...</option>';
+    savedViews.forEach(v => {
+        const option = document.createElement('option'); option.value = v.id;
+        option.textContent = v.rules ? `${v.name} (con reglas)` : v.name;
+        sel.appendChild(option);
+    });
+    sel.value = selectedId;
+}
+
+async function loadSavedViews() {
+    try {
+        const response = await fetch('/api/views');
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        savedViews = result.views;
+        renderSavedViews(document.getElementById('select-saved-view')?.value || '');
+    } catch (error) { console.error('Error vistas guardadas:', error); }
+}
+
+async function handleSaveServerView() {
+    if (!currentFileId) return alert("No hay datos.");
+    const selected = savedViews.find(v => v.id === document.getElementById('select-saved-view').value);
+    const name = prompt("Nombre de la vista:", selected?.name || "");
+    if (!name || !name.trim()) return;
+
+    try {
+        const response = await fetch('/api/views/save', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                name: name.trim(),
+                view_type: currentView,
+                filters: activeFilters,
+                visible_columns: columnasVisibles,
+                group_by: document.getElementById('select-columna-agrupar')?.value || "",
+                include_rules: confirm("¿Incluir las reglas de prioridad actuales en la vista?")
+            })
+        });
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        savedViews = result.views;
+        renderSavedViews(result.view.id);
+    } catch (error) { alert("Error al guardar la vista: " + error.message); }
+}
+
+async function handleDeleteServerView() {
+    const id = document.getElementById('select-saved-view').value;
+    const view = savedViews.find(v => v.id === id);
+    if (!view || !confirm(`¿Eliminar la vista "${view.name}" para todo el equipo?`)) return;
+    try {
+        const response = await fetch('/api/views/delete', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ id })
+        });
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        savedViews = result.views;
+        renderSavedViews();
+    } catch (error) { alert("Error al eliminar la vista: " + error.message); }
+}
+
+/**
+ * Abre una vista del servidor: el resultado ya viene calculado (filas o
+ * totales por grupo), así que se pinta sin pedir /api/filter ni /api/group_by.
+ */
+async function handleOpenSavedView() {
+    const id = document.getElementById('select-saved-view').value;
+    if (!id || !currentFileId) return;
+    try {
+        const response = await fetch('/api/views/open', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ file_id: currentFileId, id })
+        });
+        const result = await response.json(); if (!response.ok) throw new Error(result.error);
+        const v = result.view;
+
+        activeFilters = v.filters;
+        if (v.visible_columns.length) {
+            columnasVisibles = v.visible_columns.filter(col => todasLasColumnas.includes(col));
+            document.querySelectorAll('#column-selector-wrapper input').forEach(cb => cb.checked = columnasVisibles.includes(cb.value));
+        }
+        document.getElementById('input-search-table').value = '';
+        toggleView(v.view_type, true, false);
+        if (v.group_by) {
+            const sel = document.getElementById('select-columna-agrupar');
+            if (sel && sel.querySelector(`option[value="${v.group_by}"]`)) sel.value = v.group_by;
+        }
+
+        datasetVersion = result.version || datasetVersion;
+        setPreviewState(result.preview);
+        if (result.resumen) updateResumenCard(result.resumen);
+        renderFilters();
+        if (v.view_type === 'detailed') {
+            currentData = result.data; tableData = [...currentData];
+            renderTable(result.data);
+            if (tabulatorInstance) tabulatorInstance.redraw();
+        } else if (result.grupos) {
+            renderGroupedTable(result.grupos, v.group_by, false);
+        } else {
+            await getGroupedData();
+        }
+        updateActionButtonsVisibility();
+
+        if (result.reglas_distintas && confirm("Esta vista tiene reglas de prioridad distintas de las actuales. ¿Desea aplicarlas?")) {
+            const res = await fetch('/api/priority_rules/import_view', {
+                method: 'POST', headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ rules: v.rules, settings: v.settings, filtros_activos: activeFilters })
+            });
+            const rulesResult = await res.json(); if (!res.ok) throw new Error(rulesResult.error);
+            await refreshActiveView();
+        }
+    } catch (error) { alert("Error al abrir la vista: " + error.message); }
+}
+
 // ============================================================================
 // 10. INICIALIZACIÓN Y EVENT LISTENERS
 // ============================================================================
@@ -1239,6 +1805,7 @@ function setupEventListeners() {
     on('btn-lang-en', 'click', () => setLanguage('en'));
     on('btn-fullscreen', 'click', handleFullscreen);
     on('btn-fullscreen-grouped', 'click', handleFullscreen);
+    on('results-table', 'paste', handleTablePaste);
 
     // Filtros
     on('btn-add-filter', 'click', handleAddFilter);
@@ -1246,6 +1813,9 @@ function setupEventListeners() {
     on('btn-clear-filters-grouped', 'click', handleClearFilters);
     on('input-search-table', 'keyup', handleSearchTable);
     on('select-columna', 'change', updateFilterInputAutocomplete);
+    on('input-global-search', 'input', scheduleGlobalSearch);
+    on('input-global-search', 'keydown', handleGlobalSearchKey);
+    on('global-search-results', 'click', handleGlobalSearchPick);
     document.getElementById('active-filters-list')?.addEventListener('click', handleRemoveFilter);
     document.getElementById('active-filters-list-grouped')?.addEventListener('click', handleRemoveFilter);
 
@@ -1260,6 +1830,9 @@ function setupEventListeners() {
     on('select-columna-agrupar', 'change', handleGroupColumnChange);
     on('btn-save-view', 'click', handleSaveView);
     on('input-load-view', 'change', handleLoadView);
+    on('select-saved-view', 'change', handleOpenSavedView);
+    on('btn-save-server-view', 'click', handleSaveServerView);
+    on('btn-delete-server-view', 'click', handleDeleteServerView);
 
     // Descargas
     on('btn-download-excel', 'click', handleDownloadExcel);
@@ -1294,7 +1867,10 @@ function setupEventListeners() {
     on('rule-column', 'change', () => {
         const col = document.getElementById('rule-column').value, list = document.getElementById('rule-value-datalist');
         list.innerHTML = ''; autocompleteOptions[col]?.forEach(v => list.innerHTML += `<option value="${v}"></option>`);
+        scheduleRulePreview();
     });
+    ['rule-value', 'rule-value-2'].forEach(id => on(id, 'input', scheduleRulePreview));
+    ['rule-priority', 'rule-operator', 'rule-column-2', 'rule-operator-2'].forEach(id => on(id, 'change', scheduleRulePreview));
 
     on('btn-manage-lists', 'click', openManageListsModal);
     on('btn-manage-save', 'click', handleManageListsSave);
@@ -1308,6 +1884,10 @@ function setupEventListeners() {
     on('btn-show-duplicates', 'click', handleShowDuplicates);
     on('btn-cleanup-duplicates', 'click', handleCleanupDuplicates);
 
+    // Sesión compartida
+    on('btn-join-dataset', 'click', handleJoinDataset);
+    on('select-shared-dataset', 'focus', loadSharedDatasets);
+
     // Atajos Globales
     document.addEventListener('keydown', (e) => {
         if (['INPUT','SELECT','TEXTAREA'].includes(e.target.tagName) || e.target.isContentEditable) return;
@@ -1336,13 +1916,19 @@ document.addEventListener('DOMContentLoaded', async () => {
         currentFileId = SESSION_DATA.file_id;
         todasLasColumnas = SESSION_DATA.columnas;
         columnasVisibles = [...todasLasColumnas];
+        columnKinds = SESSION_DATA.tipos_columna || {};
         autocompleteOptions = SESSION_DATA.autocomplete_options || {};
         undoHistoryCount = SESSION_DATA.history_count || 0;
+        datasetVersion = SESSION_DATA.version || 0;
+        setPreviewState(SESSION_DATA.preview);
+        setRefreshModeVisible(true);
 
         populateColumnDropdowns(); renderColumnSelector(); updateVisibleColumnsFromCheckboxes();
-        updateActionButtonsVisibility(); refreshActiveView();
+        updateActionButtonsVisibility(); refreshActiveView(); startSync();
     } else {
         renderColumnSelector(); updateActionButtonsVisibility();
     }
     setupEventListeners();
+    loadSharedDatasets();
+    loadSavedViews();
 });
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+conftest.py
+-----------
+Fixtures comunes de las pruebas: una carpeta de trabajo temporal por prueba
+(las rutas de la aplicación son relativas: `temp_uploads/`, `user_*.json`),
+la aplicación creada con `create_app` y un Excel de facturas de ejemplo.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+# Configuración de pruebas: sin hilos de fondo ni vista previa parcial.
+TEST_CONFIG = {
+    'STAGING_RESTORE': 0,
+    'JANITOR_INTERVAL_MIN': 0,
+    'MEMORY_BUDGET_MB': 0,
+    'PREVIEW_ROWS': 0,
+}
+
+
+def facturas(filas: int = 30) -> pd.DataFrame:
+    """Extracto de facturas de ejemplo (mismas columnas que el reporte real)."""
+    return pd.DataFrame({
+        'Invoice #': [f'INV{i}' for i in range(filas)],
+        'Vendor Name': [['ACME Corp', 'Tech Supplies', 'Global Foods'][i % 3] for i in range(filas)],
+        'Pay group': [['SCF', 'DIST', 'PAY GROUP 1', 'RENTS', 'INTERCOMPANY'][i % 5] for i in range(filas)],
+        'Total': [f'{100 + i * 7.5:.2f}' for i in range(filas)],
+        'Status': [['Open', 'Closed', 'Hold'][i % 3] for i in range(filas)],
+        'Assignee': [['ana', 'luis', ''][i % 3] for i in range(filas)],
+        'Currency Code': ['USD' if i % 4 else 'MXN' for i in range(filas)],
+    })
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Carpeta de trabajo temporal (reglas, vistas y temporales aislados por prueba)."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_app(workdir):
+    """Crea la aplicación con el backend de almacenamiento indicado."""
+    def factory(backend: str = 'memory'):
+        return create_app({**TEST_CONFIG, 'STAGING_BACKEND': backend})
+    return factory
+
+
+@pytest.fixture
+def upload(workdir):
+    """Sube el Excel de ejemplo con un cliente de pruebas y devuelve el `file_id`."""
+    def do_upload(client, df: pd.DataFrame | None = None) -> str:
+        path = workdir / 'facturas.xlsx'
+        (facturas() if df is None else df).to_excel(path, index=False)
+        with open(path, 'rb') as f:
+            r = client.post('/api/upload', data={'file': (f, 'facturas.xlsx')},
+                            content_type='multipart/form-data')
+        assert r.status_code == 200, r.json
+        return r.json['file_id']
+    return do_upload
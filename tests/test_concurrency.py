@@ -0,0 +1,100 @@
+"""
+Ediciones concurrentes sobre un dataset compartido: detección de conflictos
+(409) con `base_version` y deshacer cuando otro usuario editó después.
+"""
+
+import pytest
+
+from modules.dataset_store import store
+
+
+@pytest.fixture
+def shared(make_app, upload):
+    """Dos clientes (navegadores) conectados al mismo dataset."""
+    app = make_app('memory')
+    alice, bob = app.test_client(), app.test_client()
+    file_id = upload(alice)
+    r = bob.post('/api/dataset/attach', json={'file_id': file_id})
+    assert r.status_code == 200, r.json
+    return alice, bob, file_id
+
+
+def edit(client, file_id, row_id, columna, valor, base_version=None):
+    body = {'file_id': file_id, 'row_id': row_id, 'columna': columna, 'valor': valor}
+    if base_version is not None:
+        body['base_version'] = base_version
+    return client.post('/api/update_cell', json=body)
+
+
+def cell(file_id, row_id, columna):
+    df = store.get(file_id).df
+    return df.loc[df['_row_id'].astype(str) == str(row_id), columna].iloc[0]
+
+
+def test_stale_edit_of_same_cell_is_rejected(shared):
+    alice, bob, file_id = shared
+    base = store.get(file_id).version
+
+    assert edit(alice, file_id, 1, 'Status', 'Paid', base).status_code == 200
+    r = edit(bob, file_id, 1, 'Status', 'Rejected', base)
+
+    assert r.status_code == 409
+    assert r.json['conflicts'] == [{'row_id': 1, 'columna': 'Status', 'valor_actual': 'Paid'}]
+    assert r.json['version'] == base + 1
+    assert cell(file_id, 1, 'Status') == 'Paid'
+
+
+def test_stale_edit_of_other_cell_is_merged(shared):
+    alice, bob, file_id = shared
+    base = store.get(file_id).version
+
+    assert edit(alice, file_id, 1, 'Status', 'Paid', base).status_code == 200
+    assert edit(bob, file_id, 1, 'Assignee', 'maria', base).status_code == 200
+    assert edit(bob, file_id, 2, 'Status', 'Paid', base).status_code == 200
+
+    assert cell(file_id, 1, 'Status') == 'Paid'
+    assert cell(file_id, 1, 'Assignee') == 'maria'
+
+
+def test_edit_on_current_version_is_accepted(shared):
+    alice, bob, file_id = shared
+    base = store.get(file_id).version
+
+    r = edit(alice, file_id, 1, 'Status', 'Paid', base)
+    assert edit(bob, file_id, 1, 'Status', 'Rejected', r.json['version']).status_code == 200
+    assert cell(file_id, 1, 'Status') == 'Rejected'
+
+
+def test_own_edits_never_conflict(shared):
+    alice, _, file_id = shared
+    base = store.get(file_id).version
+
+    assert edit(alice, file_id, 1, 'Status', 'Paid', base).status_code == 200
+    assert edit(alice, file_id, 1, 'Status', 'Void', base).status_code == 200
+
+
+def test_undo_after_another_users_edit_keeps_their_change(shared):
+    alice, bob, file_id = shared
+    original = cell(file_id, 1, 'Status')
+
+    assert edit(alice, file_id, 1, 'Status', 'Paid').status_code == 200
+    assert edit(bob, file_id, 2, 'Vendor Name', 'Nuevo Proveedor').status_code == 200
+
+    r = alice.post('/api/undo_change', json={'file_id': file_id})
+    assert r.status_code == 200, r.json
+    assert r.json['history_count'] == 0
+
+    assert cell(file_id, 1, 'Status') == original
+    assert cell(file_id, 2, 'Vendor Name') == 'Nuevo Proveedor'
+    assert r.json['version'] == store.get(file_id).version
+
+
+def test_undo_without_other_edits_restores_previous_state(shared):
+    alice, _, file_id = shared
+    before = store.get(file_id).df.copy()
+
+    assert edit(alice, file_id, 1, 'Pay group', 'SCF').status_code == 200
+    assert alice.post('/api/undo_change', json={'file_id': file_id}).status_code == 200
+
+    after = store.get(file_id).df
+    assert after.astype(str).equals(before.astype(str))
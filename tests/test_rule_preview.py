@@ -0,0 +1,106 @@
+"""
+La vista previa de reglas (`/api/priority_rules/preview`) debe anticipar
+exactamente lo que deja aplicar esas mismas reglas: prioridades finales,
+filas que cambian y filas que gana cada regla.
+"""
+
+import pytest
+
+from modules.dataset_store import store
+
+SETTINGS = {'enable_scf_intercompany': True, 'enable_age_sort': True}
+
+
+def cond(column, operator, *values):
+    return {'column': column, 'operator': operator, 'values': list(values)}
+
+
+RULE_SETS = {
+    # Una regla inactiva no debe alterar el orden de aplicación de las activas
+    'inactive_rule_first': [
+        {'conditions': [cond('Vendor Name', 'equals', 'ACME Corp')], 'priority': 'Baja',
+         'reason': 'A inactiva', 'active': False},
+        {'conditions': [cond('Status', 'equals', 'Open')], 'priority': 'Media', 'reason': 'B'},
+        {'conditions': [cond('Vendor Name', 'equals', 'ACME Corp')], 'priority': 'Alta', 'reason': 'C'},
+    ],
+    'legacy_and_overlapping': [
+        {'column': 'Vendor Name', 'value': 'Tech Supplies', 'priority': 'Alta', 'reason': 'legada'},
+        {'conditions': [cond('Vendor Name', 'contains', 'tech', 'foods')], 'priority': 'Baja',
+         'reason': 'contiene'},
+        {'conditions': [cond('Assignee', 'equals', 'ana')], 'priority': 'Media', 'reason': 'asignada'},
+    ],
+    'multi_condition_and_regex': [
+        {'conditions': [cond('Vendor Name', 'contains', 'acme'), cond('Currency Code', 'equals', 'usd')],
+         'priority': 'Baja', 'reason': 'multi'},
+        {'conditions': [cond('Invoice #', 'regex', r'^INV1\d$')], 'priority': 'Alta', 'reason': 'regex'},
+        {'conditions': [cond('Pay group', 'starts_with', 'pay group')], 'priority': 'Alta',
+         'reason': 'prefijo', 'active': False},
+    ],
+}
+
+
+@pytest.fixture
+def session(make_app, upload):
+    client = make_app('memory').test_client()
+    return client, upload(client)
+
+
+def priorities(file_id):
+    df = store.get(file_id).df
+    return df['_priority'].astype(str).tolist(), df['_priority_reason'].astype(str).tolist()
+
+
+def assert_preview_matches(preview, before, file_id, rules):
+    prioridad, razon = priorities(file_id)
+    counts = {p: prioridad.count(p) for p in set(prioridad)}
+
+    assert preview['total_filas'] == len(prioridad)
+    assert preview['por_prioridad'] == counts
+    assert preview['filas_con_cambio'] == sum(a != b for a, b in zip(before, prioridad))
+    stats = {r['reason']: r for r in preview['reglas']}
+    for rule in rules:
+        effective = razon.count(rule['reason']) if rule.get('active', True) else 0
+        assert stats[rule['reason']]['effective'] == effective, rule['reason']
+        assert stats[rule['reason']]['overridden'] <= stats[rule['reason']]['matched']
+
+
+@pytest.mark.parametrize('name', RULE_SETS)
+def test_preview_matches_applied_rule_set(session, name):
+    client, file_id = session
+    rules = RULE_SETS[name]
+    before, _ = priorities(file_id)
+
+    r = client.post('/api/priority_rules/preview', json={'file_id': file_id, 'rules': rules, 'settings': SETTINGS})
+    assert r.status_code == 200, r.json
+    preview = r.json
+
+    r = client.post('/api/priority_rules/import_view', json={'file_id': file_id, 'rules': rules, 'settings': SETTINGS})
+    assert r.status_code == 200, r.json
+    assert_preview_matches(preview, before, file_id, rules)
+
+
+def test_preview_of_candidate_matches_saving_it(session):
+    client, file_id = session
+    rules = RULE_SETS['inactive_rule_first']
+    client.post('/api/priority_rules/import_view', json={'file_id': file_id, 'rules': rules, 'settings': SETTINGS})
+    before, _ = priorities(file_id)
+
+    candidate = {'conditions': [cond('Status', 'equals', 'Hold')], 'priority': 'Baja', 'reason': 'candidata'}
+    r = client.post('/api/priority_rules/preview', json={'file_id': file_id, 'rule': candidate})
+    assert r.status_code == 200, r.json
+    preview = r.json
+
+    r = client.post('/api/priority_rules/save', json={**candidate, 'file_id': file_id})
+    assert r.status_code == 200, r.json
+    assert_preview_matches(preview, before, file_id, [*rules, candidate])
+
+
+def test_inactive_rules_still_report_matches(session):
+    client, file_id = session
+    rules = RULE_SETS['inactive_rule_first']
+
+    r = client.post('/api/priority_rules/preview', json={'file_id': file_id, 'rules': rules, 'settings': SETTINGS})
+    inactive = next(s for s in r.json['reglas'] if s['reason'] == 'A inactiva')
+    df = store.get(file_id).df
+    assert inactive['matched'] == int((df['Vendor Name'].astype(str) == 'ACME Corp').sum())
+    assert inactive['effective'] == inactive['overridden'] == 0
@@ -0,0 +1,234 @@
+"""
+batch_process.py
+----------------
+Procesamiento por lotes sin interfaz: reglas de prioridad y limpieza de
+duplicados sobre una carpeta de extractos, en paralelo.
+
+Estándares: Google Python Style Guide.
+
+Cada archivo pasa por los mismos pasos que en la aplicación:
+
+    cargar_datos (lectura, `_row_status`, prioridad base y reglas)
+    → quitar facturas duplicadas (se conserva la primera, como
+      /api/cleanup_duplicate_invoices)
+    → exportar a Excel (xlsxwriter, como /api/download_excel)
+
+Por cada extracto se escriben en --out `<nombre>.xlsx` (hoja 'Datos' y, si
+se quitaron duplicados, hoja 'Duplicados') y `<nombre>.json` con el resumen:
+filas, duplicados, filas por prioridad, filas incompletas, tiempos por etapa
+(ms) y memoria máxima del worker. `resumen.json` reúne todos los archivos.
+
+Los archivos se reparten en un pool de procesos (--workers). --max-memory-mb
+limita la memoria virtual de cada worker: un archivo que no cabe falla con
+MemoryError sin afectar a los demás. Cada worker se reinicia tras
+--files-per-worker archivos para devolver la memoria al sistema.
+
+Las reglas son las de `user_priority_rules.json` (o las de --rules).
+
+Uso (desde la raíz del repositorio):
+    python tools/batch_process.py extractos/ [--out procesados/] [--workers 4]
+    python tools/batch_process.py extractos/ --rules reglas_noche.json --max-memory-mb 2048
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Columnas internas que no se exportan.
+HIDDEN_COLUMNS = ('_row_id', '_src_hash')
+
+# Orden de las etapas en el informe.
+STAGES = ('load', 'duplicates', 'export')
+
+
+# ==============================================================================
+# WORKER
+# ==============================================================================
+
+def _init_worker(rules_file: str | None, max_memory_mb: int) -> None:
+    """Configura cada proceso del pool: archivo de reglas y límite de memoria."""
+    if max_memory_mb:
+        try:
+            import resource
+            limit = max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:  # Windows o límite no permitido
+            print(f"WARN: No se pudo limitar la memoria del worker: {e}", file=sys.stderr)
+    if rules_file:
+        from modules import priority_manager
+        priority_manager.RULES_FILE = rules_file
+
+
+def _peak_memory_mb() -> float | None:
+    """Memoria residente máxima de este proceso (None si no se puede medir)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)  # bytes en macOS, KB en Linux
+
+
+def process_file(path: str, out_dir: str, dedupe: bool = True) -> dict:
+    """
+    Procesa un extracto y escribe su Excel y su resumen JSON.
+
+    Returns:
+        dict: Resumen del archivo ('status' = 'ok' o 'error').
+    """
+    from modules.loader import cargar_datos
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    summary = {'file': os.path.basename(path), 'status': 'ok', 'timings_ms': {}}
+    timings = summary['timings_ms']
+    t_start = time.perf_counter()
+    try:
+        t0 = time.perf_counter()
+        df, profile = cargar_datos(path)
+        timings['load'] = round((time.perf_counter() - t0) * 1000, 1)
+        if df.empty:
+            raise Exception("Archivo vacío o corrupto.")
+        summary.update(rows_in=len(df), invoice_column=profile.invoice, pay_group_column=profile.pay_group)
+
+        t0 = time.perf_counter()
+        duplicates = df.iloc[0:0]
+        if dedupe and profile.invoice:
+            mask = df.duplicated(subset=[profile.invoice], keep='first')
+            duplicates, df = df[mask], df[~mask].reset_index(drop=True)
+        timings['duplicates'] = round((time.perf_counter() - t0) * 1000, 1)
+
+        t0 = time.perf_counter()
+        import pandas as pd
+        export = os.path.join(out_dir, f"{name}.xlsx")
+        columns = [c for c in df.columns if c not in HIDDEN_COLUMNS]
+        with pd.ExcelWriter(export, engine='xlsxwriter') as writer:
+            df[columns].to_excel(writer, sheet_name='Datos', index=False)
+            if not duplicates.empty:
+                duplicates[columns].to_excel(writer, sheet_name='Duplicados', index=False)
+        timings['export'] = round((time.perf_counter() - t0) * 1000, 1)
+
+        summary.update(
+            rows_out=len(df), duplicates_removed=len(duplicates), export=os.path.basename(export),
+            priorities={str(k): int(v) for k, v in df['_priority'].value_counts().items()},
+            incomplete=int((df['_row_status'] == 'Incompleto').sum()),
+        )
+    except MemoryError:
+        summary.update(status='error', error="Memoria insuficiente (ver --max-memory-mb).")
+    except Exception as e:
+        summary.update(status='error', error=str(e))
+
+    timings['total'] = round((time.perf_counter() - t_start) * 1000, 1)
+    summary['peak_memory_mb'] = _peak_memory_mb()
+    with open(os.path.join(out_dir, f"{name}.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+# ==============================================================================
+# LOTE
+# ==============================================================================
+
+def find_workbooks(input_dir: str, pattern: str) -> list[str]:
+    """Extractos de `input_dir` que cumplen `pattern` (sin temporales de Excel '~$')."""
+    return sorted(
+        os.path.join(input_dir, f) for f in os.listdir(input_dir)
+        if fnmatch.fnmatch(f, pattern) and not f.startswith('~$') and os.path.isfile(os.path.join(input_dir, f))
+    )
+
+
+def run_batch(files: list[str], out_dir: str, workers: int, rules_file: str | None = None,
+              max_memory_mb: int = 0, files_per_worker: int = 4, dedupe: bool = True) -> list[dict]:
+    """
+    Procesa `files` en un pool de procesos.
+
+    Returns:
+        list[dict]: Resumen de cada archivo, en el orden de `files`.
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(rules_file, max_memory_mb),
+                             max_tasks_per_child=files_per_worker or None) as pool:
+        futures = {pool.submit(process_file, path, out_dir, dedupe): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:  # El worker murió (p. ej. lo terminó el sistema por memoria)
+                summary = {'file': os.path.basename(path), 'status': 'error', 'error': f"Worker terminado: {e}",
+                           'timings_ms': {}}
+            results[path] = summary
+            estado = 'OK' if summary['status'] == 'ok' else f"ERROR: {summary['error']}"
+            print(f"{summary['file']}: {estado} ({summary['timings_ms'].get('total', 0):.0f}ms)")
+    return [results[path] for path in files]
+
+
+def print_report(results: list[dict], elapsed: float) -> None:
+    ok = sum(1 for r in results if r['status'] == 'ok')
+    print(f"\n{len(results)} archivos ({ok} correctos) en {elapsed:.1f}s\n")
+    print(f"{'archivo':<30} {'filas':>8} {'duplic.':>8} " + ' '.join(f"{s:>11}" for s in STAGES) +
+          f" {'total':>9} {'mem. MB':>8}")
+    for r in results:
+        t = r['timings_ms']
+        stages = ' '.join(f"{t[s]:>9.0f}ms" if s in t else f"{'-':>11}" for s in STAGES)
+        memory = f"{r['peak_memory_mb']:>8.0f}" if r.get('peak_memory_mb') is not None else f"{'-':>8}"
+        print(f"{r['file'][:30]:<30} {r.get('rows_in', 0):>8} {r.get('duplicates_removed', 0):>8} "
+              f"{stages} {t.get('total', 0):>7.0f}ms {memory}")
+
+
+# ==============================================================================
+# MAIN
+# ==============================================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='Carpeta con los extractos.')
+    parser.add_argument('--out', help='Carpeta de salida (por defecto <input>/procesados).')
+    parser.add_argument('--pattern', default='*.xlsx', help='Archivos a procesar (patrón glob).')
+    parser.add_argument('--rules', help='Archivo de reglas (por defecto user_priority_rules.json).')
+    parser.add_argument('--no-dedupe', action='store_true', help='No quitar facturas duplicadas.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos en paralelo.')
+    parser.add_argument('--max-memory-mb', type=int, default=0,
+                        help='Memoria virtual máxima por worker (0 = sin límite; solo Unix).')
+    parser.add_argument('--files-per-worker', type=int, default=4,
+                        help='Archivos por worker antes de reiniciarlo (0 = sin reinicio).')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input):
+        print(f"No existe la carpeta {args.input}", file=sys.stderr)
+        return 1
+    rules_file = os.path.abspath(args.rules) if args.rules else os.path.join(ROOT, 'user_priority_rules.json')
+    if not os.path.isfile(rules_file):
+        print(f"No existe el archivo de reglas {rules_file}", file=sys.stderr)
+        return 1
+    files = find_workbooks(args.input, args.pattern)
+    if not files:
+        print(f"No hay archivos '{args.pattern}' en {args.input}", file=sys.stderr)
+        return 1
+
+    out_dir = args.out or os.path.join(args.input, 'procesados')
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(args.workers, len(files)))
+    print(f"{len(files)} archivos, {workers} workers, reglas: {rules_file}")
+
+    t0 = time.perf_counter()
+    results = run_batch(files, out_dir, workers, rules_file, args.max_memory_mb, args.files_per_worker,
+                        dedupe=not args.no_dedupe)
+    elapsed = time.perf_counter() - t0
+
+    print_report(results, elapsed)
+    with open(os.path.join(out_dir, 'resumen.json'), 'w', encoding='utf-8') as f:
+        json.dump({'elapsed_s': round(elapsed, 2), 'workers': workers, 'rules': rules_file, 'files': results},
+                  f, indent=2, ensure_ascii=False)
+    return 0 if all(r['status'] == 'ok' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+bench_startup.py
+----------------
+Mide el arranque en frío de la aplicación (cada medición en un proceso nuevo).
+
+Estándares: Google Python Style Guide.
+
+Escenarios:
+- lazy:  importar `app`, `create_app()` y servir `/api/get_translations`
+         (pandas/numpy siguen sin cargarse).
+- eager: lo mismo, pero importando pandas antes (equivale al arranque anterior,
+         cuando `app.py` importaba pandas al inicio).
+
+Uso (desde la raíz del repositorio):
+    python tools/bench_startup.py [--runs 7]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que se ejecuta en cada proceso hijo; imprime un JSON con los tiempos.
+_CHILD = """
+import json, sys, tempfile, time
+t0 = time.perf_counter()
+if {eager}:
+    import pandas, numpy
+import app as appmod
+t_import = time.perf_counter()
+flask_app = appmod.create_app({{
+    'STAGING_BACKEND': 'memory', 'STAGING_RESTORE': 0, 'JANITOR_INTERVAL_MIN': 0, 'MEMORY_BUDGET_MB': 0,
+    'SESSION_FILE_DIR': tempfile.mkdtemp()
+}})
+t_app = time.perf_counter()
+resp = flask_app.test_client().get('/api/get_translations')
+t_req = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (t_import - t0) * 1000, 'create_app_ms': (t_app - t_import) * 1000,
+    'first_request_ms': (t_req - t_app) * 1000, 'total_ms': (t_req - t0) * 1000,
+    'status': resp.status_code, 'pandas_loaded': 'pandas' in sys.modules,
+}}))
+"""
+
+
+def _run_once(eager: bool) -> dict:
+    """Lanza un intérprete nuevo y devuelve sus tiempos."""
+    out = subprocess.run(
+        [sys.executable, '-c', _CHILD.format(eager=eager)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7, help='Procesos por escenario (se informa la mediana).')
+    args = parser.parse_args()
+
+    print(f"{'escenario':<8} {'import':>9} {'create_app':>11} {'1ª petición':>12} {'total':>9}  pandas")
+    for nombre, eager in (('lazy', False), ('eager', True)):
+        runs = [_run_once(eager) for _ in range(args.runs)]
+        med = {k: statistics.median(r[k] for r in runs)
+               for k in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms')}
+        print(f"{nombre:<8} {med['import_ms']:>7.0f}ms {med['create_app_ms']:>9.0f}ms "
+              f"{med['first_request_ms']:>10.0f}ms {med['total_ms']:>7.0f}ms  "
+              f"{'cargado' if runs[0]['pandas_loaded'] else 'no cargado'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""
+load_test.py
+------------
+Prueba de carga: N analistas simultáneos contra un servidor local.
+
+Estándares: Google Python Style Guide.
+
+Cada usuario virtual tiene su propia sesión (cookies) y repite el guion de
+un analista hasta agotar el tiempo o las iteraciones:
+
+    subir archivo (o conectarse al dataset compartido con --shared)
+    → filtrar → editar una celda → actualización masiva → agrupar
+    → deshacer → exportar a Excel (cada --export-every iteraciones)
+
+Al terminar se informa, por endpoint, el número de peticiones, los errores,
+el rendimiento (peticiones/s) y la latencia p50/p95/p99/máx. Con --json se
+guarda el mismo informe para compararlo entre versiones, y --max-p95 hace
+que el proceso termine con código 1 si algún endpoint supera ese p95 (para
+usarlo antes de desplegar).
+
+Por defecto se arranca la aplicación en un proceso aparte (servidor de
+desarrollo con hilos, en un directorio temporal para no tocar los datos
+reales); con --url se ataca un servidor ya levantado.
+
+Uso (desde la raíz del repositorio):
+    python tools/load_test.py [--users 8] [--duration 30] [--backend sqlite]
+    python tools/load_test.py --url http://127.0.0.1:5000 --file extracto.xlsx --shared
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Servidor que se lanza en el proceso hijo (con el directorio temporal como cwd).
+_SERVER = """
+import sys
+sys.path.insert(0, {root!r})
+import app as appmod
+flask_app = appmod.create_app({{
+    'STAGING_BACKEND': {backend!r}, 'STAGING_RESTORE': 0, 'JANITOR_INTERVAL_MIN': 0,
+}})
+flask_app.run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)
+"""
+
+# Orden del informe.
+ENDPOINTS = ('upload', 'attach', 'filter', 'update_cell', 'bulk_update', 'group_by', 'undo_change', 'download_excel')
+
+
+# ==============================================================================
+# DATOS Y SERVIDOR
+# ==============================================================================
+
+def make_workbook(path: str, rows: int, seed: int = 0) -> None:
+    """Genera un extracto sintético con las columnas habituales del reporte."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'Invoice #': [f"INV{i:07d}" for i in range(rows)],
+        'Vendor Name': rng.choice(['ACME Corp', 'Bimbo Foods', 'Global Logistics', 'Tech Supplies', 'Rentas SA'], rows),
+        'Pay group': rng.choice(['SCF', 'INTERCOMPANY', 'PAY GROUP 1', 'DIST', 'RENTS'], rows),
+        'Total': [f"{x:.2f}" for x in rng.uniform(10, 5000, rows)],
+        'Status': rng.choice(['Open', 'Closed', 'Hold'], rows),
+        'Assignee': rng.choice(['ana.lopez', 'daniela.vasquez', 'na_ap_user', 'jorge.ruiz'], rows),
+        'Currency Code': rng.choice(['USD', 'CAD', 'EUR'], rows),
+        'Invoice Date': pd.date_range('2024-01-01', periods=rows, freq='h').strftime('%Y-%m-%d %H:%M:%S'),
+        'Invoice Date Age': rng.integers(0, 120, rows).astype(str),
+    }).to_excel(path, index=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, backend: str, timeout: float = 60) -> tuple[subprocess.Popen, str]:
+    """Arranca la aplicación en un proceso hijo y espera a que responda."""
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, '-c', _SERVER.format(root=ROOT, backend=backend, port=port)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al arrancar (código {proc.returncode})")
+        try:
+            urllib.request.urlopen(url + '/api/get_translations', timeout=2).read()
+            return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+# ==============================================================================
+# USUARIO VIRTUAL
+# ==============================================================================
+
+class Recorder:
+    """Latencias (ms) y errores por endpoint, compartidos entre hilos."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.conflicts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, ms: float, status: int | None) -> None:
+        """Registra una petición; `status` None = sin respuesta (timeout, conexión)."""
+        with self._lock:
+            self.latencies[endpoint].append(ms)
+            if status == 409:
+                self.conflicts[endpoint] += 1  # Edición concurrente rechazada: respuesta válida
+            elif status is None or status >= 400:
+                self.errors[endpoint] += 1
+
+
+class VirtualUser:
+    """Un analista con su propia sesión (cookie) que ejecuta el guion."""
+
+    def __init__(self, url: str, recorder: Recorder, args, rng: random.Random):
+        self.url = url
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.file_id = None
+        self.version = None
+        self.row_ids = []
+        self.values = {}
+
+    def _request(self, endpoint: str, body: bytes, content_type: str, path: str | None = None):
+        """POST cronometrado. Devuelve el JSON (o los bytes) de la respuesta; None si falló."""
+        req = urllib.request.Request(
+            self.url + (path or f"/api/{endpoint}"), data=body, headers={'Content-Type': content_type}
+        )
+        t0 = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as resp:
+                payload, status = resp.read(), resp.status
+        except urllib.error.HTTPError as e:
+            payload, status = None, e.code
+            e.close()
+        except OSError:
+            payload, status = None, None
+        self.recorder.add(endpoint, (time.perf_counter() - t0) * 1000, status)
+        if not payload:
+            return None
+        if resp.headers.get_content_type() == 'application/json':
+            return json.loads(payload)
+        return payload
+
+    def post(self, endpoint: str, data: dict, path: str | None = None):
+        return self._request(endpoint, json.dumps({'file_id': self.file_id, **data}).encode(), 'application/json', path)
+
+    def upload(self, workbook: bytes, filename: str) -> str | None:
+        """Sube el extracto como multipart/form-data (igual que el navegador)."""
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            "Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n"
+        ).encode() + workbook + f"\r\n--{boundary}--\r\n".encode()
+        res = self._request('upload', body, f"multipart/form-data; boundary={boundary}")
+        if res and 'file_id' in res:
+            self.file_id = res['file_id']
+        return self.file_id
+
+    def attach(self, file_id: str) -> None:
+        self.file_id = file_id
+        self.post('attach', {}, path='/api/dataset/attach')
+
+    def _load_rows(self) -> None:
+        """Primer filtro sin condiciones: ids de fila y valores de las columnas del guion."""
+        res = self.post('filter', {'filtros_activos': []})
+        if not res or 'data' not in res:
+            return
+        rows = res['data']
+        self.version = res.get('version')
+        self.row_ids = [r['_row_id'] for r in rows]
+        for col in (self.args.edit_column, self.args.group_column):
+            self.values[col] = sorted({str(r.get(col, '')) for r in rows} - {''}) or ['X']
+
+    def _track(self, res) -> None:
+        if isinstance(res, dict) and res.get('version') is not None:
+            self.version = res['version']
+
+    def iteration(self, n: int) -> None:
+        """Una vuelta del guion."""
+        a, rng = self.args, self.rng
+        group_value = rng.choice(self.values[a.group_column])
+        res = self.post('filter', {'filtros_activos': [{'columna': a.group_column, 'valor': group_value}]})
+        self._track(res)
+
+        res = self.post('update_cell', {
+            'row_id': rng.choice(self.row_ids), 'columna': a.edit_column,
+            'valor': rng.choice(self.values[a.edit_column]), 'base_version': self.version,
+        })
+        self._track(res)
+
+        res = self.post('bulk_update', {
+            'row_ids': rng.sample(self.row_ids, min(a.bulk_rows, len(self.row_ids))),
+            'column': a.edit_column, 'new_value': rng.choice(self.values[a.edit_column]),
+            'base_version': self.version,
+        })
+        self._track(res)
+
+        self.post('group_by', {'columna_agrupar': a.group_column, 'filtros_activos': []})
+        self._track(self.post('undo_change', {}))
+
+        if a.export_every and n % a.export_every == 0:
+            self.post('download_excel', {
+                'filtros_activos': [{'columna': a.group_column, 'valor': group_value}],
+                'columnas_visibles': [a.group_column, a.edit_column],
+            })
+
+    def run(self, workbook: bytes, filename: str, shared_id: str | None, deadline: float, delay: float) -> int:
+        """Guion completo. Devuelve las iteraciones realizadas."""
+        time.sleep(delay)
+        if shared_id:
+            self.attach(shared_id)
+        elif not self.upload(workbook, filename):
+            return 0
+        self._load_rows()
+        if not self.row_ids:
+            return 0
+
+        done = 0
+        while (self.args.iterations and done < self.args.iterations) or \
+                (not self.args.iterations and time.monotonic() < deadline):
+            done += 1
+            self.iteration(done)
+            if self.args.think_ms:
+                time.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+        return done
+
+
+# ==============================================================================
+# INFORME
+# ==============================================================================
+
+def percentile(values: list, p: float) -> float:
+    """Percentil `p` (0-100) por interpolación lineal sobre los valores ordenados."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def build_report(recorder: Recorder, elapsed: float, users: int, iterations: int) -> dict:
+    """Resumen por endpoint y total (latencias en ms)."""
+    def stats(lat, errors, conflicts):
+        return {
+            'requests': len(lat), 'errors': errors, 'conflicts': conflicts,
+            'rps': round(len(lat) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(lat, 50), 1), 'p95_ms': round(percentile(lat, 95), 1),
+            'p99_ms': round(percentile(lat, 99), 1), 'max_ms': round(max(lat), 1) if lat else 0.0,
+        }
+
+    names = [e for e in ENDPOINTS if e in recorder.latencies] + \
+            sorted(e for e in recorder.latencies if e not in ENDPOINTS)
+    every = [ms for e in names for ms in recorder.latencies[e]]
+    return {
+        'users': users, 'elapsed_s': round(elapsed, 2), 'iterations': iterations,
+        'endpoints': {e: stats(recorder.latencies[e], recorder.errors[e], recorder.conflicts[e]) for e in names},
+        'total': stats(every, sum(recorder.errors.values()), sum(recorder.conflicts.values())),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['users']} usuarios, {report['iterations']} iteraciones en {report['elapsed_s']:.1f}s\n")
+    print(f"{'endpoint':<15} {'peticiones':>10} {'errores':>8} {'conflictos':>10} {'req/s':>8} "
+          f"{'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}")
+    rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for name, s in rows:
+        print(f"{name:<15} {s['requests']:>10} {s['errors']:>8} {s['conflicts']:>10} {s['rps']:>8.1f} "
+              f"{s['p50_ms']:>7.0f}ms {s['p95_ms']:>7.0f}ms {s['p99_ms']:>7.0f}ms {s['max_ms']:>7.0f}ms")
+
+
+# ==============================================================================
+# MAIN
+# ==============================================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=8, help='Usuarios virtuales simultáneos.')
+    parser.add_argument('--duration', type=float, default=30, help='Segundos de prueba (si no se da --iterations).')
+    parser.add_argument('--iterations', type=int, default=0, help='Vueltas del guion por usuario (0 = por tiempo).')
+    parser.add_argument('--ramp', type=float, default=2, help='Segundos en los que se van incorporando los usuarios.')
+    parser.add_argument('--think-ms', type=float, default=100, help='Pausa media entre vueltas de un usuario.')
+    parser.add_argument('--url', help='Servidor ya levantado (por defecto se arranca uno local).')
+    parser.add_argument('--backend', default='sqlite', choices=('sqlite', 'snapshot', 'memory'),
+                        help='STAGING_BACKEND del servidor local.')
+    parser.add_argument('--file', help='Extracto .xlsx a subir (por defecto uno sintético).')
+    parser.add_argument('--rows', type=int, default=2000, help='Filas del extracto sintético.')
+    parser.add_argument('--shared', action='store_true',
+                        help='Un solo dataset compartido (el primer usuario lo sube, el resto se conecta).')
+    parser.add_argument('--edit-column', default='Status', help='Columna que se edita.')
+    parser.add_argument('--group-column', default='Assignee', help='Columna para filtrar y agrupar.')
+    parser.add_argument('--bulk-rows', type=int, default=25, help='Filas por actualización masiva.')
+    parser.add_argument('--export-every', type=int, default=5, help='Exportar cada N vueltas (0 = nunca).')
+    parser.add_argument('--timeout', type=float, default=120, help='Timeout por petición (s).')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Guardar el informe en este archivo.')
+    parser.add_argument('--max-p95', type=float, help='Salir con código 1 si algún endpoint supera este p95 (ms).')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='load_test_')
+    proc = None
+    try:
+        if args.file:
+            filename = os.path.basename(args.file)
+            with open(args.file, 'rb') as f:
+                workbook = f.read()
+        else:
+            filename = 'load_test.xlsx'
+            make_workbook(os.path.join(workdir, filename), args.rows, args.seed)
+            with open(os.path.join(workdir, filename), 'rb') as f:
+                workbook = f.read()
+
+        url = args.url.rstrip('/') if args.url else None
+        if not url:
+            proc, url = start_server(workdir, args.backend)
+            print(f"Servidor local en {url} (backend {args.backend})")
+
+        recorder = Recorder()
+        shared_id = None
+        if args.shared:
+            owner = VirtualUser(url, recorder, args, random.Random(args.seed))
+            shared_id = owner.upload(workbook, filename)
+            if not shared_id:
+                print("No se pudo subir el dataset compartido", file=sys.stderr)
+                return 1
+
+        users = [VirtualUser(url, recorder, args, random.Random(args.seed + i + 1)) for i in range(args.users)]
+        t0 = time.monotonic()
+        deadline = t0 + args.ramp + args.duration
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            futures = [
+                pool.submit(u.run, workbook, filename, shared_id, deadline, args.ramp * i / max(args.users, 1))
+                for i, u in enumerate(users)
+            ]
+            iterations = sum(f.result() for f in futures)
+        elapsed = time.monotonic() - t0
+
+        report = build_report(recorder, elapsed, args.users, iterations)
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+        if args.max_p95 is not None:
+            slow = [e for e, s in report['endpoints'].items() if s['p95_ms'] > args.max_p95]
+            if slow:
+                print(f"\np95 por encima de {args.max_p95:.0f}ms: {', '.join(slow)}", file=sys.stderr)
+                return 1
+        return 0
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())